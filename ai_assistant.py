@@ -12,7 +12,7 @@ from ai_core.query_parser import QueryParser
 from ai_core.query_parser_complex import ComplexQueryParser
 from ai_core.response_handler import ResponseHandler
 from ai_core.empty_response_handler import EmptyResponseHandler
-from ai_core.prompts import SYSTEM_PROMPT
+from ai_core.prompts import system_prompt
 
 class AIAssistant:
     def __init__(self, db_path: str):
@@ -21,7 +21,7 @@ class AIAssistant:
         self.tools = AgentTools(db_path)
         self.complex_tools = ComplexAgentTools(db_path)
         self.parser = QueryParser()
-        self.complex_parser = ComplexQueryParser()
+        self.complex_parser = ComplexQueryParser(self.tools.normalizer.resolver)
         self.handler = ResponseHandler()
         self.empty_handler = EmptyResponseHandler()
         self.model_name = "yandexgpt-lite"
@@ -45,7 +45,7 @@ class AIAssistant:
             "messages": [
                 {
                     "role": "system",
-                    "text": SYSTEM_PROMPT
+                    "text": system_prompt(await self.tools.calendar.current_async())
                 },
                 {
                     "role": "user", 
@@ -281,6 +281,13 @@ class AIAssistant:
             print(f"❌ Command execution error: {e}")
             return f"❌ Ошибка выполнения команды: {str(e)}"
 
+    async def warm_up(self) -> None:
+        """Заранее загрузить календарь срезов, индекс названий и снимок отчетной даты, чтобы первый вопрос не ждал загрузки"""
+        calendar = await self.tools.calendar.current_async()
+        await self.tools.normalizer.resolver.current_async()
+        if self.tools.snapshot is not None and calendar.reporting_date:
+            await self.tools.snapshot.preload(calendar.reporting_date)
+
     async def test_connection(self) -> bool:
         try:
             test_response = await self._call_yandex_gpt("Тестовый запрос")
@@ -1,12 +1,18 @@
 #agent_tools.py:
+import logging
 import pandas as pd
 from typing import Dict, List, Optional
 from database import DatabaseManager
+from storage.schema import union_partitions
+from storage.reporting_calendar import ReportingCalendar
 from .query_builder import QueryBuilder
 from .data_normalizer import DataNormalizer
 from .response_formatter import ResponseFormatter
 from .constants import SUPPORTED_METRICS, TIME_SERIES_METRICS
 from .agent_tools_complex import ComplexAgentTools
+from .snapshot_engine import SnapshotEngine, METRIC_ROWS
+
+logger = logging.getLogger(__name__)
 
 class AgentTools:
     def __init__(self, db_path: str):
@@ -14,6 +20,8 @@ class AgentTools:
         self.normalizer = DataNormalizer(self.db)
         self.query_builder = QueryBuilder()
         self.formatter = ResponseFormatter()
+        self.snapshot = SnapshotEngine.for_database(self.db)
+        self.calendar = ReportingCalendar.for_database(self.db)
     
     async def get_column_statistics(self, column_name: str, filters: Optional[Dict] = None, user_query: str = "") -> str:
         try:
@@ -23,8 +31,9 @@ class AgentTools:
             
             normalized_filters = await self.normalizer.normalize_filters(filters) if filters else {}
             
-            where_conditions = ["report_date = '2025-08-31'"]
-            params = []
+            report_date = await self._report_date()
+            where_conditions = ["report_date = ?"]
+            params = [report_date]
             
             for column, value in normalized_filters.items():
                 if isinstance(value, str) and any(op in value for op in ['>', '<', '>=', '<=']):
@@ -51,7 +60,7 @@ class AgentTools:
                 FROM hr_data_clean 
                 {where_clause}
                 """
-                result = self.db.execute_query(query, params)
+                result = await self.db.fetch(query, params)
                 return self.formatter.format_numeric_statistics(result, column_name, user_query)
             else:
                 query = f"""
@@ -61,10 +70,10 @@ class AgentTools:
                 FROM hr_data_clean 
                 {where_clause}
                 GROUP BY {column_name}
-                ORDER BY count DESC
+                ORDER BY count DESC, {column_name}
                 LIMIT 20
                 """
-                result = self.db.execute_query(query, params)
+                result = await self.db.fetch(query, params)
                 return self.formatter.format_categorical_statistics(result, column_name)
             
         except Exception as e:
@@ -93,10 +102,20 @@ class AgentTools:
                     if key == 'location_name' and '%' in str(value):
                         normalized_filters[key] = value
             
+            report_date = await self._report_date()
+            if self.snapshot is not None and metric in METRIC_ROWS:
+                row = await self.snapshot.metric(
+                    report_date, metric, normalized_filters,
+                    active_only=metric in ['average_experience', 'average_age', 'average_fte']
+                )
+                if row is not None:
+                    return self._format_metric_result(metric, row)
+            
             where_conditions = []
             params = []
             
-            where_conditions.append("report_date = '2025-08-31'")
+            where_conditions.append("report_date = ?")
+            params.append(report_date)
             
             for column, value in normalized_filters.items():
                 if isinstance(value, str) and any(op in value for op in ['>', '<', '>=', '<=']):
@@ -127,8 +146,8 @@ class AgentTools:
                 FROM hr_data_clean 
                 {where_clause}
                 """
-                print(f"🔍 TURNOVER SQL: {query}")
-                print(f"🔍 TURNOVER PARAMS: {params}")
+                logger.debug(f"TURNOVER SQL: {query}")
+                logger.debug(f"TURNOVER PARAMS: {params}")
             elif metric == 'average_experience':
                 query = f"SELECT AVG(experience) as avg_exp FROM hr_data_clean {where_clause}"
             elif metric == 'average_age':
@@ -144,20 +163,23 @@ class AgentTools:
             elif metric == 'remote_workers':
                 return await self._calculate_remote_workers(normalized_filters)
             
-            result = self.db.execute_query(query, params)
-            return self._format_metric_result(metric, result)
+            row = await self.db.fetch_one(query, params, named=True)
+            return self._format_metric_result(metric, row)
                 
         except Exception as e:
             return f"❌ Ошибка при расчете метрики '{metric}': {str(e)}"
     
     async def _calculate_full_time_ratio(self, filters: Optional[Dict] = None) -> str:
         try:
-            where_conditions = ["report_date = '2025-08-31'"]
-            params = []
+            report_date = await self._report_date()
+            where_conditions = ["report_date = ?"]
+            params = [report_date]
             
             if filters:
                 for column, value in filters.items():
-                    if column == 'location_name' and '%' in str(value):
+                    if isinstance(value, str) and any(op in value for op in ['>', '<', '>=', '<=']):
+                        where_conditions.append(f"{column} {value}")
+                    elif column == 'location_name' and '%' in str(value):
                         where_conditions.append(f"{column} LIKE ?")
                         params.append(value)
                     else:
@@ -167,12 +189,10 @@ class AgentTools:
             where_clause = "WHERE " + " AND ".join(where_conditions) if where_conditions else ""
             
             total_query = f"SELECT COUNT(*) as total FROM hr_data_clean {where_clause}"
-            total_result = self.db.execute_query(total_query, params)
-            total_count = total_result['total'].iloc[0] if len(total_result) > 0 else 0
+            total_count = await self.db.fetch_scalar(total_query, params, default=0)
             
             full_time_query = f"SELECT COUNT(*) as full_time FROM hr_data_clean {where_clause} AND fte = 1.0"
-            full_time_result = self.db.execute_query(full_time_query, params)
-            full_time_count = full_time_result['full_time'].iloc[0] if len(full_time_result) > 0 else 0
+            full_time_count = await self.db.fetch_scalar(full_time_query, params, default=0)
             
             if total_count == 0:
                 return "❌ Нет данных для расчета доли полных ставок"
@@ -186,11 +206,14 @@ class AgentTools:
     
     async def _calculate_fte_distribution(self, filters: Dict) -> str:
         try:
-            where_conditions = ["report_date = '2025-08-31'"]
-            params = []
+            report_date = await self._report_date()
+            where_conditions = ["report_date = ?"]
+            params = [report_date]
             
             for column, value in filters.items():
-                if column == 'location_name' and '%' in str(value):
+                if isinstance(value, str) and any(op in value for op in ['>', '<', '>=', '<=']):
+                    where_conditions.append(f"{column} {value}")
+                elif column == 'location_name' and '%' in str(value):
                     where_conditions.append(f"{column} LIKE ?")
                     params.append(value)
                 else:
@@ -209,7 +232,7 @@ class AgentTools:
             ORDER BY fte
             """
             
-            result = self.db.execute_query(query, params)
+            result = await self.db.fetch(query, params)
             return self._format_fte_distribution_result(result)
             
         except Exception as e:
@@ -217,15 +240,18 @@ class AgentTools:
     
     async def _calculate_remote_workers(self, filters: Dict) -> str:
         try:
+            report_date = await self._report_date()
             where_conditions = [
-                "report_date = '2025-08-31'",
+                "report_date = ?",
                 "location_name LIKE '%Дистанционщик%'"
             ]
-            params = []
+            params = [report_date]
             
             for column, value in filters.items():
                 if column != 'location_name':
-                    if column == 'location_name' and '%' in str(value):
+                    if isinstance(value, str) and any(op in value for op in ['>', '<', '>=', '<=']):
+                        where_conditions.append(f"{column} {value}")
+                    elif column == 'location_name' and '%' in str(value):
                         where_conditions.append(f"{column} LIKE ?")
                         params.append(value)
                     else:
@@ -235,13 +261,10 @@ class AgentTools:
             where_clause = "WHERE " + " AND ".join(where_conditions) if where_conditions else ""
             
             query = f"SELECT COUNT(*) as count FROM hr_data_clean {where_clause}"
-            result = self.db.execute_query(query, params)
-            
-            total_query = "SELECT COUNT(*) as total FROM hr_data_clean WHERE report_date = '2025-08-31'"
-            total_result = self.db.execute_query(total_query)
+            remote_count = await self.db.fetch_scalar(query, params, default=0)
             
-            remote_count = result['count'].iloc[0] if len(result) > 0 else 0
-            total_count = total_result['total'].iloc[0] if len(total_result) > 0 else 0
+            total_query = "SELECT COUNT(*) as total FROM hr_data_clean WHERE report_date = ?"
+            total_count = await self.db.fetch_scalar(total_query, (report_date,), default=0)
             percentage = (remote_count / total_count * 100) if total_count > 0 else 0
             
             return f"👨‍💻 Удаленных сотрудников: {remote_count:,} ({percentage:.1f}% от общей численности)".replace(',', ' ')
@@ -261,11 +284,12 @@ class AgentTools:
             
             query = self.query_builder.build_time_series_query(metric, None, normalized_filters)
             params = self.query_builder.build_params(normalized_filters)
+            query, params = union_partitions(query, params, self.db.partitions())
             
-            print(f"🔍 TIME SERIES SQL: {query}")
-            print(f"🔍 TIME SERIES PARAMS: {params}")
+            logger.debug(f"TIME SERIES SQL: {query}")
+            logger.debug(f"TIME SERIES PARAMS: {params}")
             
-            result = self.db.execute_query(query, params)
+            result = await self.db.fetch(query, params)
             return self.formatter.format_time_series(result, metric, None)
             
         except Exception as e:
@@ -278,7 +302,8 @@ class AgentTools:
                 return f"❌ Колонка '{column_name}' не найдена. Доступные: {', '.join(valid_columns)}"
             
             query = f"SELECT DISTINCT {column_name} FROM hr_data_clean WHERE {column_name} IS NOT NULL ORDER BY {column_name} LIMIT 20"
-            result = self.db.execute_query(query)
+            query, params = union_partitions(query, (), self.db.partitions(), 'UNION')
+            result = await self.db.fetch(query, params)
             
             return self.formatter.format_unique_values(result, column_name)
                 
@@ -293,8 +318,15 @@ class AgentTools:
             
             normalized_filters = await self.normalizer.normalize_filters(filters) if filters else {}
             
-            where_conditions = ["report_date = '2025-08-31'"]
-            params = []
+            report_date = await self._report_date()
+            if self.snapshot is not None and isinstance(n, int):
+                snapshot_filters = {c: v for c, v in normalized_filters.items() if c != column_name}
+                result = await self.snapshot.top_values(report_date, column_name, snapshot_filters, n)
+                if result is not None:
+                    return self._format_top_values_result(result, column_name, n, filters)
+            
+            where_conditions = ["report_date = ?"]
+            params = [report_date]
             
             for filter_column, value in normalized_filters.items():
                 if filter_column != column_name:
@@ -316,11 +348,11 @@ class AgentTools:
             FROM hr_data_clean 
             {where_clause}
             GROUP BY {column_name}
-            ORDER BY count DESC
+            ORDER BY count DESC, {column_name}
             LIMIT {n}
             """
             
-            result = self.db.execute_query(query, params)
+            result = await self.db.fetch(query, params)
             return self._format_top_values_result(result, column_name, n, filters)
             
         except Exception as e:
@@ -329,7 +361,7 @@ class AgentTools:
     async def get_data_sample(self, limit: int = 5) -> str:
         try:
             query = f"SELECT * FROM hr_data_clean LIMIT {limit}"
-            result = self.db.execute_query(query)
+            result = await self.db.fetch(query)
             return f"Пример данных ({limit} записей):\n{result.to_string(index=False)}"
         except Exception as e:
             return f"❌ Ошибка при получении sample данных: {str(e)}"
@@ -337,7 +369,7 @@ class AgentTools:
     async def get_column_info(self) -> str:
         try:
             query = "PRAGMA table_info(hr_data_clean)"
-            result = self.db.execute_query(query)
+            result = await self.db.fetch(query)
             
             response = "📋 Структура таблица hr_data_clean:\n\n"
             for _, row in result.iterrows():
@@ -374,21 +406,21 @@ class AgentTools:
         
         return response
 
-    def _format_metric_result(self, metric: str, result: pd.DataFrame) -> str:
-        if len(result) == 0:
+    def _format_metric_result(self, metric: str, row: Optional[tuple]) -> str:
+        if row is None:
             return f"❌ Нет данных для метрики '{metric}'"
         
         formats = {
-            'headcount': lambda r: f"Численность: {r['count'].iloc[0]:,.0f} сотрудников".replace(',', ' '),
-            'turnover_rate': lambda r: f"Текучесть: {r['turnover_rate'].iloc[0]:.1f}% ({r['fired'].iloc[0]:,.0f} уволенных из {r['total'].iloc[0]:,.0f})".replace(',', ' '),
-            'average_experience': lambda r: f"Средний опыт: {r['avg_exp'].iloc[0]:.1f} месяцев",
-            'average_age': lambda r: f"Средний возраст: {r['avg_age'].iloc[0]:.1f} лет",
-            'average_fte': lambda r: f"Средняя ставка: {r['avg_fte'].iloc[0]:.2f}",
-            'total_fired': lambda r: f"Всего уволено: {r['total_fired'].iloc[0]:,.0f} сотрудников".replace(',', ' '),
-            'total_hired': lambda r: f"Всего нанято: {r['total_hired'].iloc[0]:,.0f} сотрудников".replace(',', ' ')
+            'headcount': lambda r: f"Численность: {r.count:,.0f} сотрудников".replace(',', ' '),
+            'turnover_rate': lambda r: f"Текучесть: {r.turnover_rate:.1f}% ({r.fired:,.0f} уволенных из {r.total:,.0f})".replace(',', ' '),
+            'average_experience': lambda r: f"Средний опыт: {r.avg_exp:.1f} месяцев",
+            'average_age': lambda r: f"Средний возраст: {r.avg_age:.1f} лет",
+            'average_fte': lambda r: f"Средняя ставка: {r.avg_fte:.2f}",
+            'total_fired': lambda r: f"Всего уволено: {r.total_fired:,.0f} сотрудников".replace(',', ' '),
+            'total_hired': lambda r: f"Всего нанято: {r.total_hired:,.0f} сотрудников".replace(',', ' ')
         }
         
-        return formats.get(metric, lambda r: f"Результат: {r.iloc[0,0]}")(result)
+        return formats.get(metric, lambda r: f"Результат: {r[0]}")(row)
     
     def _format_top_values_result(self, result: pd.DataFrame, column_name: str, n: int, filters: Optional[Dict] = None) -> str:
         if len(result) == 0:
@@ -419,16 +451,19 @@ class AgentTools:
         
         return response
 
+    async def _report_date(self) -> Optional[str]:
+        """Отчетная дата (последний полный месяц) из календаря срезов"""
+        return (await self.calendar.current_async()).reporting_date
+
     async def _get_table_columns(self) -> List[str]:
         query = "PRAGMA table_info(hr_data_clean)"
-        result = self.db.execute_query(query)
-        return result['name'].tolist()
+        rows = await self.db.fetch_rows(query, named=True)
+        return [row.name for row in rows]
     
     async def _get_column_type(self, column_name: str) -> str:
         query = "PRAGMA table_info(hr_data_clean)"
-        result = self.db.execute_query(query)
-        column_info = result[result['name'] == column_name]
-        return column_info['type'].iloc[0] if not column_info.empty else 'TEXT'
+        rows = await self.db.fetch_rows(query, named=True)
+        return next((row.type for row in rows if row.name == column_name), 'TEXT')
 
     def _get_column_display_name(self, column_name: str) -> str:
         column_names = {
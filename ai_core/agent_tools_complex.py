@@ -2,10 +2,13 @@
 import pandas as pd
 from typing import Dict, List, Optional
 from database import DatabaseManager
+from storage.schema import union_partitions
+from storage.reporting_calendar import ReportingCalendar
 from .query_builder import QueryBuilder
 from .data_normalizer import DataNormalizer
 from .response_formatter import ResponseFormatter
 from .constants import SUPPORTED_METRICS, EXPERIENCE_THRESHOLDS, AGE_THRESHOLDS
+from .snapshot_engine import SnapshotEngine
 
 class ComplexAgentTools:
     def __init__(self, db_path: str):
@@ -13,6 +16,12 @@ class ComplexAgentTools:
         self.normalizer = DataNormalizer(self.db)
         self.query_builder = QueryBuilder()
         self.formatter = ResponseFormatter()
+        self.snapshot = SnapshotEngine.for_database(self.db)
+        self.calendar = ReportingCalendar.for_database(self.db)
+
+    async def _report_date(self) -> Optional[str]:
+        """Отчетная дата (последний полный месяц) из календаря срезов"""
+        return (await self.calendar.current_async()).reporting_date
     
     async def compare_metrics(self, metric: str, dimension: str, filters: Optional[Dict] = None) -> str:
         try:
@@ -22,10 +31,20 @@ class ComplexAgentTools:
             
             normalized_filters = await self.normalizer.normalize_filters(filters) if filters else {}
             
+            report_date = await self._report_date()
+            if self.snapshot is not None:
+                result = await self.snapshot.compare(
+                    report_date, metric, dimension, normalized_filters,
+                    active_only=metric in ['headcount', 'average_experience', 'average_age', 'average_fte'],
+                    descending=True
+                )
+                if result is not None:
+                    return self._format_comparison_result(result, metric, dimension)
+            
             metric_calculation = self._get_metric_calculation(metric)
             
-            where_conditions = ["report_date = '2025-08-31'"]
-            params = []
+            where_conditions = ["report_date = ?"]
+            params = [report_date]
             
             for column, value in normalized_filters.items():
                 if isinstance(value, str) and any(op in value for op in ['>', '<', '>=', '<=']):
@@ -49,11 +68,11 @@ class ComplexAgentTools:
             FROM hr_data_clean 
             {where_clause}
             GROUP BY {dimension}
-            ORDER BY value DESC
+            ORDER BY value DESC, {dimension}
             LIMIT 20
             """
             
-            result = self.db.execute_query(query, params)
+            result = await self.db.fetch(query, params)
             return self._format_comparison_result(result, metric, dimension)
             
         except Exception as e:
@@ -67,10 +86,20 @@ class ComplexAgentTools:
             
             normalized_filters = await self.normalizer.normalize_filters(filters) if filters else {}
             
+            report_date = await self._report_date()
+            if self.snapshot is not None:
+                result = await self.snapshot.compare(
+                    report_date, metric, dimension, normalized_filters,
+                    active_only=metric in ['headcount', 'average_experience', 'average_age', 'average_fte'],
+                    descending=False
+                )
+                if result is not None:
+                    return self._format_comparison_result(result, metric, dimension)
+            
             metric_calculation = self._get_metric_calculation(metric)
             
-            where_conditions = ["report_date = '2025-08-31'"]
-            params = []
+            where_conditions = ["report_date = ?"]
+            params = [report_date]
             
             for column, value in normalized_filters.items():
                 if isinstance(value, str) and any(op in value for op in ['>', '<', '>=', '<=']):
@@ -94,11 +123,11 @@ class ComplexAgentTools:
             FROM hr_data_clean 
             {where_clause}
             GROUP BY {dimension}
-            ORDER BY value ASC
+            ORDER BY value ASC, {dimension}
             LIMIT 20
             """
             
-            result = self.db.execute_query(query, params)
+            result = await self.db.fetch(query, params)
             return self._format_comparison_result(result, metric, dimension)
             
         except Exception as e:
@@ -137,8 +166,9 @@ class ComplexAgentTools:
             GROUP BY report_date
             ORDER BY report_date
             """
+            query, params = union_partitions(query, params, self.db.partitions())
             
-            result = self.db.execute_query(query, params)
+            result = await self.db.fetch(query, params)
             return self._format_trend_result(result, metric, period)
             
         except Exception as e:
@@ -162,7 +192,8 @@ class ComplexAgentTools:
             where_conditions = []
             params = []
             
-            where_conditions.append("report_date = '2025-08-31'")
+            where_conditions.append("report_date = ?")
+            params.append(await self._report_date())
             
             for column, value in normalized_filters.items():
                 if isinstance(value, str) and any(op in value for op in ['>', '<', '>=', '<=']):
@@ -191,12 +222,13 @@ class ComplexAgentTools:
 
     async def _calculate_young_workers(self, filters: Dict) -> str:
         try:
+            report_date = await self._report_date()
             where_conditions = [
-                "report_date = '2025-08-31'", 
+                "report_date = ?", 
                 "fire_from_company = '1970-01-01'",
                 "fullyears < 25"
             ]
-            params = []
+            params = [report_date]
             
             for column, value in filters.items():
                 if isinstance(value, str) and any(op in value for op in ['>', '<', '>=', '<=']):
@@ -211,13 +243,10 @@ class ComplexAgentTools:
             where_clause = "WHERE " + " AND ".join(where_conditions) if where_conditions else ""
             
             query = f"SELECT COUNT(*) as count FROM hr_data_clean {where_clause}"
-            result = self.db.execute_query(query, params)
+            young_count = await self.db.fetch_scalar(query, params, default=0)
             
-            total_query = "SELECT COUNT(*) as total FROM hr_data_clean WHERE report_date = '2025-08-31' AND fire_from_company = '1970-01-01'"
-            total_result = self.db.execute_query(total_query)
-            
-            young_count = result['count'].iloc[0] if len(result) > 0 else 0
-            total_count = total_result['total'].iloc[0] if len(total_result) > 0 else 0
+            total_query = "SELECT COUNT(*) as total FROM hr_data_clean WHERE report_date = ? AND fire_from_company = '1970-01-01'"
+            total_count = await self.db.fetch_scalar(total_query, (report_date,), default=0)
             percentage = (young_count / total_count * 100) if total_count > 0 else 0
             
             return f"👦 Молодых сотрудников (<25 лет): {young_count:,} ({percentage:.1f}% от общей численности)".replace(',', ' ')
@@ -227,12 +256,13 @@ class ComplexAgentTools:
 
     async def _calculate_experienced_workers(self, filters: Dict) -> str:
         try:
+            report_date = await self._report_date()
             where_conditions = [
-                "report_date = '2025-08-31'", 
+                "report_date = ?", 
                 "fire_from_company = '1970-01-01'",
                 "experience > 60"
             ]
-            params = []
+            params = [report_date]
             
             for column, value in filters.items():
                 if isinstance(value, str) and any(op in value for op in ['>', '<', '>=', '<=']):
@@ -247,13 +277,10 @@ class ComplexAgentTools:
             where_clause = "WHERE " + " AND ".join(where_conditions) if where_conditions else ""
             
             query = f"SELECT COUNT(*) as count FROM hr_data_clean {where_clause}"
-            result = self.db.execute_query(query, params)
+            exp_count = await self.db.fetch_scalar(query, params, default=0)
             
-            total_query = "SELECT COUNT(*) as total FROM hr_data_clean WHERE report_date = '2025-08-31' AND fire_from_company = '1970-01-01'"
-            total_result = self.db.execute_query(total_query)
-            
-            exp_count = result['count'].iloc[0] if len(result) > 0 else 0
-            total_count = total_result['total'].iloc[0] if len(total_result) > 0 else 0
+            total_query = "SELECT COUNT(*) as total FROM hr_data_clean WHERE report_date = ? AND fire_from_company = '1970-01-01'"
+            total_count = await self.db.fetch_scalar(total_query, (report_date,), default=0)
             percentage = (exp_count / total_count * 100) if total_count > 0 else 0
             
             return f"👴 Опытных сотрудников (>5 лет): {exp_count:,} ({percentage:.1f}% от общей численности)".replace(',', ' ')
@@ -289,8 +316,8 @@ class ComplexAgentTools:
         else:
             return f"❌ Метрика {metric} не поддерживается в сложном модуле"
         
-        result = self.db.execute_query(query, params)
-        return self._format_metric_result(metric, result)
+        row = await self.db.fetch_one(query, params, named=True)
+        return self._format_metric_result(metric, row)
 
     async def analyze_attrition_by_demography(self, service: str, dimension: str, filters: Optional[Dict] = None) -> str:
         try:
@@ -301,8 +328,9 @@ class ComplexAgentTools:
             normalized_filters = await self.normalizer.normalize_filters(filters) if filters else {}
             normalized_filters['service'] = service
             
-            where_conditions = ["report_date = '2025-08-31'"]
-            params = []
+            report_date = await self._report_date()
+            where_conditions = ["report_date = ?"]
+            params = [report_date]
             
             for column, value in normalized_filters.items():
                 if isinstance(value, str) and any(op in value for op in ['>', '<', '>=', '<=']):
@@ -328,10 +356,10 @@ class ComplexAgentTools:
             FROM hr_data_clean 
             {where_clause}
             GROUP BY {dimension}
-            ORDER BY attrition_rate DESC
+            ORDER BY attrition_rate DESC, {dimension}
             """
             
-            result = self.db.execute_query(query, params)
+            result = await self.db.fetch(query, params)
             return self._format_attrition_by_demography_result(result, service, dimension)
             
         except Exception as e:
@@ -347,8 +375,14 @@ class ComplexAgentTools:
             
             normalized_filters = await self.normalizer.normalize_filters(filters) if filters else {}
             
-            where_conditions = ["report_date = '2025-08-31'"]
-            params = []
+            report_date = await self._report_date()
+            if self.snapshot is not None:
+                result = await self.snapshot.segmentation(report_date, segment_by, metrics, normalized_filters)
+                if result is not None:
+                    return self._format_deep_segmentation_result(result, segment_by, metrics)
+            
+            where_conditions = ["report_date = ?"]
+            params = [report_date]
             
             for column, value in normalized_filters.items():
                 if isinstance(value, str) and any(op in value for op in ['>', '<', '>=', '<=']):
@@ -389,7 +423,7 @@ class ComplexAgentTools:
             LIMIT 50
             """
             
-            result = self.db.execute_query(query, params)
+            result = await self.db.fetch(query, params)
             return self._format_deep_segmentation_result(result, segment_by, metrics)
             
         except Exception as e:
@@ -401,8 +435,9 @@ class ComplexAgentTools:
             if service:
                 normalized_filters['service'] = service
             
-            where_conditions = ["report_date = '2025-08-31'"]
-            params = []
+            report_date = await self._report_date()
+            where_conditions = ["report_date = ?"]
+            params = [report_date]
             
             for column, value in normalized_filters.items():
                 if isinstance(value, str) and any(op in value for op in ['>', '<', '>=', '<=']):
@@ -434,11 +469,11 @@ class ComplexAgentTools:
                 {where_clause}
                 GROUP BY {dimension}
                 HAVING COUNT(*) >= 10
-                ORDER BY attrition_rate DESC
+                ORDER BY attrition_rate DESC, {dimension}
                 LIMIT 10
                 """
                 
-                result = self.db.execute_query(query, params)
+                result = await self.db.fetch(query, params)
                 all_results[dimension] = result
             
             return self._format_risk_analysis_result(all_results, service)
@@ -453,32 +488,32 @@ class ComplexAgentTools:
             
             normalized_filters = await self.normalizer.normalize_filters(filters) if filters else {}
             normalized_filters['service'] = service
+            report_date = await self._report_date()
             
             attrition_query = """
             SELECT 
                 SUM(firecount) as monthly_attrition,
                 COUNT(*) as total_employees
             FROM hr_data_clean 
-            WHERE service = ? AND report_date = '2025-08-31'
+            WHERE service = ? AND report_date = ?
             """
             
-            result = self.db.execute_query(attrition_query, [service])
+            row = await self.db.fetch_one(attrition_query, [service, report_date], named=True)
             
-            if len(result) == 0 or result['total_employees'].iloc[0] == 0:
+            if row is None or row.total_employees == 0:
                 return f"❌ Нет данных для сервиса {service}"
             
-            monthly_attrition = result['monthly_attrition'].iloc[0]
-            total_employees = result['total_employees'].iloc[0]
+            monthly_attrition = row.monthly_attrition
+            total_employees = row.total_employees
             attrition_rate = (monthly_attrition / total_employees * 100) if total_employees > 0 else 0
             
             hiring_query = """
             SELECT SUM(hirecount) as monthly_hiring
             FROM hr_data_clean 
-            WHERE service = ? AND report_date = '2025-08-31'
+            WHERE service = ? AND report_date = ?
             """
             
-            hiring_result = self.db.execute_query(hiring_query, [service])
-            monthly_hiring = hiring_result['monthly_hiring'].iloc[0] if len(hiring_result) > 0 else 0
+            monthly_hiring = await self.db.fetch_scalar(hiring_query, [service, report_date], default=0)
             
             hiring_gap = monthly_attrition - monthly_hiring
             needed_hiring = max(0, hiring_gap)
@@ -495,8 +530,9 @@ class ComplexAgentTools:
         try:
             normalized_filters = await self.normalizer.normalize_filters(filters) if filters else {}
             
-            where_conditions = ["report_date = '2025-08-31'"]
-            params = []
+            report_date = await self._report_date()
+            where_conditions = ["report_date = ?"]
+            params = [report_date]
             
             for column, value in normalized_filters.items():
                 if isinstance(value, str) and any(op in value for op in ['>', '<', '>=', '<=']):
@@ -518,13 +554,13 @@ class ComplexAgentTools:
             {where_clause}
             """
             
-            result = self.db.execute_query(attrition_query, params)
+            row = await self.db.fetch_one(attrition_query, params, named=True)
             
-            if len(result) == 0 or result['total_employees'].iloc[0] == 0:
+            if row is None or row.total_employees == 0:
                 return "❌ Нет данных для анализа по компании"
             
-            monthly_attrition = result['monthly_attrition'].iloc[0]
-            total_employees = result['total_employees'].iloc[0]
+            monthly_attrition = row.monthly_attrition
+            total_employees = row.total_employees
             attrition_rate = (monthly_attrition / total_employees * 100) if total_employees > 0 else 0
             
             hiring_query = f"""
@@ -533,8 +569,7 @@ class ComplexAgentTools:
             {where_clause}
             """
             
-            hiring_result = self.db.execute_query(hiring_query, params)
-            monthly_hiring = hiring_result['monthly_hiring'].iloc[0] if len(hiring_result) > 0 else 0
+            monthly_hiring = await self.db.fetch_scalar(hiring_query, params, default=0)
             
             hiring_gap = monthly_attrition - monthly_hiring
             needed_hiring = max(0, hiring_gap)
@@ -862,18 +897,18 @@ class ComplexAgentTools:
         
         return response
 
-    def _format_metric_result(self, metric: str, result: pd.DataFrame) -> str:
-        if len(result) == 0:
+    def _format_metric_result(self, metric: str, row: Optional[tuple]) -> str:
+        if row is None:
             return f"❌ Нет данных для метрики {metric}"
         
         formats = {
-            'headcount': lambda r: f"Численность: {r['count'].iloc[0]:,.0f} сотрудников".replace(',', ' '),
-            'turnover_rate': lambda r: f"Текучесть: {r['turnover_rate'].iloc[0]:.1f}% ({r['fired'].iloc[0]:,.0f} уволенных из {r['total'].iloc[0]:,.0f})".replace(',', ' '),
-            'average_experience': lambda r: f"Средний опыт: {r['avg_exp'].iloc[0]:.1f} месяцев",
-            'average_age': lambda r: f"Средний возраст: {r['avg_age'].iloc[0]:.1f} лет",
-            'average_fte': lambda r: f"Средняя ставка: {r['avg_fte'].iloc[0]:.2f}",
-            'total_fired': lambda r: f"Всего уволено: {r['total_fired'].iloc[0]:,.0f} сотрудников".replace(',', ' '),
-            'total_hired': lambda r: f"Всего нанято: {r['total_hired'].iloc[0]:,.0f} сотрудников".replace(',', ' ')
+            'headcount': lambda r: f"Численность: {r.count:,.0f} сотрудников".replace(',', ' '),
+            'turnover_rate': lambda r: f"Текучесть: {r.turnover_rate:.1f}% ({r.fired:,.0f} уволенных из {r.total:,.0f})".replace(',', ' '),
+            'average_experience': lambda r: f"Средний опыт: {r.avg_exp:.1f} месяцев",
+            'average_age': lambda r: f"Средний возраст: {r.avg_age:.1f} лет",
+            'average_fte': lambda r: f"Средняя ставка: {r.avg_fte:.2f}",
+            'total_fired': lambda r: f"Всего уволено: {r.total_fired:,.0f} сотрудников".replace(',', ' '),
+            'total_hired': lambda r: f"Всего нанято: {r.total_hired:,.0f} сотрудников".replace(',', ' ')
         }
         
-        return formats.get(metric, lambda r: f"Результат: {r.iloc[0,0]}")(result)
\ No newline at end of file
+        return formats.get(metric, lambda r: f"Результат: {r[0]}")(row)
\ No newline at end of file
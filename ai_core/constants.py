@@ -66,4 +66,4 @@ EXPERIENCE_CATEGORIES = {
     '1-3 года': '1-3 года',
     '3-5 лет': '3-5 лет', 
     'более 5 лет': 'более 5 лет'
-}
\ No newline at end of file
+}
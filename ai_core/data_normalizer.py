@@ -1,12 +1,23 @@
 #data_normalizer.py:
+import re
 from typing import Dict
 from database import DatabaseManager
+from storage.schema import union_partitions
+from storage.reporting_calendar import CalendarState, ReportingCalendar
+from storage.value_resolver import REMOTE_LOCATION, ValueResolver
+
+# Основы названий месяцев в любом падеже: "август", "августа", "в мае"
+MONTH_STEMS = {
+    '01': ('январ',), '02': ('феврал',), '03': ('март',), '04': ('апрел',), '05': ('май', 'мая', 'мае'),
+    '06': ('июн',), '07': ('июл',), '08': ('август',), '09': ('сентябр',), '10': ('октябр',),
+    '11': ('ноябр',), '12': ('декабр',),
+}
 
 class DataNormalizer:
     def __init__(self, db: DatabaseManager):
         self.db = db
-        self._location_cache = None
-        self._service_cache = None
+        self.calendar = ReportingCalendar.for_database(db)
+        self.resolver = ValueResolver.for_database(db)
     
     async def normalize_filters(self, filters: Dict) -> Dict:
         normalized = {}
@@ -14,7 +25,7 @@ class DataNormalizer:
         for column, value in filters.items():
             if isinstance(value, str):
                 if column == 'report_date':
-                    normalized[column] = self._normalize_report_date(value)
+                    normalized[column] = self._normalize_report_date(value, await self.calendar.current_async())
                 elif column == 'fullyears' and value.replace('.', '').isdigit():
                     normalized[column] = float(value)
                 elif column == 'sex':
@@ -38,153 +49,36 @@ class DataNormalizer:
         
         return normalized
     
-    def _normalize_report_date(self, date_str: str) -> str:
-        """Нормализация дат отчета к реальным значениям из БД"""
+    def _normalize_report_date(self, date_str: str, calendar: CalendarState) -> str:
+        """Нормализация дат отчета к реальным значениям из БД: месяц -> последний срез месяца"""
         date_lower = date_str.lower()
         
-        if 'август' in date_lower and '2025' in date_lower:
-            return '2025-08-31'
-        elif 'сентябрь' in date_lower and '2025' in date_lower:
-            return '2025-09-03'
-        elif 'июль' in date_lower and '2025' in date_lower:
-            return '2025-07-31'
-        elif len(date_str) == 7:  # '2025-08'
-            if date_str == '2025-08':
-                return '2025-08-31'
-            elif date_str == '2025-09':
-                return '2025-09-03'
-            elif date_str == '2025-07':
-                return '2025-07-31'
+        year = re.search(r'\b(\d{4})\b', date_lower)
+        if year:
+            for month, stems in MONTH_STEMS.items():
+                if any(stem in date_lower for stem in stems):
+                    return calendar.month_date(f"{year.group(1)}-{month}") or date_str
+        if len(date_str) == 7:  # '2025-08'
+            return calendar.month_date(date_str) or date_str
         
         return date_str
     
     async def _find_location_match(self, location_query: str) -> str:
         try:
-            if self._location_cache is None:
-                await self._load_location_cache()
-            
-            location_lower = location_query.lower()
-            
-            if '%' in location_query:
-                return location_query
-            
-            if any(keyword in location_lower for keyword in ['дистан', 'удален', 'remote']):
-                remote_location = await self._find_remote_location()
-                if remote_location:
-                    return remote_location
-            
-            if 'москв' in location_lower:
-                moscow_location = await self._find_moscow_location()
-                if moscow_location:
-                    return moscow_location
-            
-            if any(keyword in location_lower for keyword in ['питер', 'петербург', 'спб']):
-                spb_location = await self._find_spb_location()
-                if spb_location:
-                    return spb_location
-            
-            for location in self._location_cache:
-                if location and location_lower == str(location).lower():
-                    return location
-            
-            for location in self._location_cache:
-                if location and location_lower in str(location).lower():
-                    return location
-            
-            return location_query
-            
+            return (await self.resolver.current_async()).locations.match(location_query)
         except Exception:
             return location_query
     
     async def _normalize_service_name(self, service_name: str) -> str:
         try:
-            if self._service_cache is None:
-                await self._load_service_cache()
-            
-            service_lower = service_name.lower()
-            
-            for service in self._service_cache:
-                if service and service_lower == str(service).lower():
-                    return service
-            
-            for service in self._service_cache:
-                if service and service_lower in str(service).lower():
-                    return service
-            
-            service_mapping = {
-                'облако': 'Облако',
-                'облаке': 'Облако',
-                'cloud': 'Облако',
-                'такси': 'Такси',
-                'маркет': 'Маркет',
-                'лавка': 'Лавка',
-                'крауд': 'Крауд',
-                'финтех': 'Финтех',
-                'еда': 'Еда',
-                'доставка': 'Доставка',
-                'коммерческий': 'Коммерческий департамент',
-                'коммерческий департамент': 'Коммерческий департамент',
-                'общие': 'Общие подразделения',
-                'общие подразделения': 'Общие подразделения'
-            }
-            
-            for key, value in service_mapping.items():
-                if key in service_lower:
-                    return value
-            
-            return service_name
-            
+            resolved = (await self.resolver.current_async()).services.resolve(service_name)
+            return resolved or service_name
         except Exception:
             return service_name
     
-    async def _load_location_cache(self) -> None:
-        try:
-            query = "SELECT DISTINCT location_name FROM hr_data_clean WHERE location_name IS NOT NULL"
-            result = self.db.execute_query(query)
-            self._location_cache = result['location_name'].tolist()
-        except Exception:
-            self._location_cache = []
-    
-    async def _load_service_cache(self) -> None:
-        try:
-            query = "SELECT DISTINCT service FROM hr_data_clean WHERE service IS NOT NULL"
-            result = self.db.execute_query(query)
-            self._service_cache = result['service'].tolist()
-        except Exception:
-            self._service_cache = []
-    
     async def _find_remote_location(self) -> str:
         """Поиск локации для удаленных сотрудников"""
-        try:
-            if self._location_cache is None:
-                await self._load_location_cache()
-            
-            return "%Дистанционщик%"
-            
-        except Exception:
-            return "%Дистанционщик%"
-    
-    async def _find_moscow_location(self) -> str:
-        """Поиск локации для Москвы"""
-        try:
-            if self._location_cache is None:
-                await self._load_location_cache()
-            
-            return "%Москва%"
-            
-        except Exception:
-            return "%Москва%"
-    
-    async def _find_spb_location(self) -> str:
-        """Поиск локации для Санкт-Петербурга"""
-        try:
-            if self._location_cache is None:
-                await self._load_location_cache()
-            
-            return "%Санкт-Петербург%"
-            
-        except Exception:
-            return "%Санкт-Петербург%"
+        return REMOTE_LOCATION
     
     async def find_remote_workers_location(self) -> str:
         """Метод для использования в других классах"""
@@ -277,7 +171,8 @@ class DataNormalizer:
         """Получение уникальных значений колонки"""
         try:
             query = f"SELECT DISTINCT {column_name} FROM hr_data_clean WHERE {column_name} IS NOT NULL ORDER BY {column_name}"
-            result = self.db.execute_query(query)
+            query, params = union_partitions(query, (), self.db.partitions(), 'UNION')
+            result = await self.db.fetch(query, params)
             return result[column_name].tolist()
         except Exception:
             return []
@@ -286,9 +181,8 @@ class DataNormalizer:
         """Проверка существования колонки в таблице"""
         try:
             query = "PRAGMA table_info(hr_data_clean)"
-            result = self.db.execute_query(query)
-            columns = result['name'].tolist()
-            return column_name in columns
+            rows = await self.db.fetch_rows(query, named=True)
+            return any(row.name == column_name for row in rows)
         except Exception:
             return False
     
@@ -296,8 +190,7 @@ class DataNormalizer:
         """Получение типа колонки"""
         try:
             query = "PRAGMA table_info(hr_data_clean)"
-            result = self.db.execute_query(query)
-            column_info = result[result['name'] == column_name]
-            return column_info['type'].iloc[0] if not column_info.empty else 'TEXT'
+            rows = await self.db.fetch_rows(query, named=True)
+            return next((row.type for row in rows if row.name == column_name), 'TEXT')
         except Exception:
             return 'TEXT'
\ No newline at end of file
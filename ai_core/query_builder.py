@@ -3,12 +3,14 @@ from typing import Dict, List, Optional
 
 class QueryBuilder:
     @staticmethod
-    def build_where_clause(filters: Optional[Dict], use_last_date: bool = True) -> str:
-        """Построение WHERE условия с безопасной обработкой дат"""
+    def build_where_clause(filters: Optional[Dict], report_date: Optional[str] = None) -> str:
+        """Построение WHERE условия; report_date - срез (ReportingCalendar), None - все срезы.
+
+        Месяцы в фильтре report_date ('2025-08') к дате среза приводит DataNormalizer"""
         conditions = []
         
-        if use_last_date:
-            conditions.append("report_date = '2025-08-31'")
+        if report_date is not None:
+            conditions.append("report_date = ?")
         
         if filters:
             for column, value in filters.items():
@@ -17,42 +19,30 @@ class QueryBuilder:
                         conditions.append(f"{column} {value}")
                     elif column == 'location_name' and isinstance(value, str) and '%' in value:
                         conditions.append(f"{column} LIKE ?")
-                    elif column == 'report_date' and isinstance(value, str):
-                        if value == '2025-08-31' or value == '2025-09-03' or value == '2025-07-31':
-                            conditions.append(f"{column} = ?")
-                        elif value == '2025-08':
-                            conditions.append("report_date = '2025-08-31'")
-                        elif value == '2025-09':
-                            conditions.append("report_date = '2025-09-03'")
-                        elif value == '2025-07':
-                            conditions.append("report_date = '2025-07-31'")
-                        else:
-                            conditions.append(f"{column} = ?")
                     else:
                         conditions.append(f"{column} = ?")
         
         return "WHERE " + " AND ".join(conditions) if conditions else ""
 
     @staticmethod
-    def build_params(filters: Optional[Dict]) -> List:
-        """Построение списка параметров для SQL запроса"""
+    def build_params(filters: Optional[Dict], report_date: Optional[str] = None) -> List:
+        """Построение списка параметров для SQL запроса (в порядке условий build_where_clause)"""
+        params = [report_date] if report_date is not None else []
         if not filters:
-            return []
-        params = []
+            return params
         for value in filters.values():
             if value is not None:
                 if (isinstance(value, str) and 
-                    (len(value) == 7 and value in ['2025-08', '2025-09', '2025-07'] or
-                     any(op in value for op in ['>', '<', '>=', '<=']) or
+                    (any(op in value for op in ['>', '<', '>=', '<=']) or
                      '%' in value)):
                     continue
                 params.append(value)
         return params
 
     @staticmethod
-    def build_headcount_query(filters: Optional[Dict]) -> str:
+    def build_headcount_query(filters: Optional[Dict], report_date: Optional[str] = None) -> str:
         """Построение запроса для численности сотрудников"""
-        where_clause = QueryBuilder.build_where_clause(filters)
+        where_clause = QueryBuilder.build_where_clause(filters, report_date)
         return f"""
         SELECT COUNT(*) as count 
         FROM hr_data_clean 
@@ -61,9 +51,9 @@ class QueryBuilder:
         """
 
     @staticmethod
-    def build_turnover_rate_query(filters: Optional[Dict]) -> str:
+    def build_turnover_rate_query(filters: Optional[Dict], report_date: Optional[str] = None) -> str:
         """Построение запроса для текучести кадров"""
-        where_clause = QueryBuilder.build_where_clause(filters)
+        where_clause = QueryBuilder.build_where_clause(filters, report_date)
         return f"""
         SELECT 
             COUNT(*) as total,
@@ -77,9 +67,9 @@ class QueryBuilder:
         """
 
     @staticmethod
-    def build_numeric_stats_query(column_name: str, filters: Optional[Dict]) -> str:
+    def build_numeric_stats_query(column_name: str, filters: Optional[Dict], report_date: Optional[str] = None) -> str:
         """Построение запроса для числовой статистики"""
-        where_clause = QueryBuilder.build_where_clause(filters)
+        where_clause = QueryBuilder.build_where_clause(filters, report_date)
         return f"""
         SELECT 
             COUNT({column_name}) as count,
@@ -92,9 +82,9 @@ class QueryBuilder:
         """
 
     @staticmethod
-    def build_categorical_stats_query(column_name: str, filters: Optional[Dict]) -> str:
+    def build_categorical_stats_query(column_name: str, filters: Optional[Dict], report_date: Optional[str] = None) -> str:
         """Построение запроса для категориальной статистики"""
-        where_clause = QueryBuilder.build_where_clause(filters)
+        where_clause = QueryBuilder.build_where_clause(filters, report_date)
         return f"""
         SELECT 
             {column_name},
@@ -102,14 +92,14 @@ class QueryBuilder:
         FROM hr_data_clean 
         {where_clause}
         GROUP BY {column_name}
-        ORDER BY count DESC
+        ORDER BY count DESC, {column_name}
         LIMIT 20
         """
 
     @staticmethod
     def build_time_series_query(metric: str, group_by: Optional[str], filters: Optional[Dict]) -> str:
         """Построение запроса для временных рядов"""
-        where_clause = QueryBuilder.build_where_clause(filters, use_last_date=False)
+        where_clause = QueryBuilder.build_where_clause(filters)
         
         metric_selects = {
             'headcount': "report_date, COUNT(*) as value",
@@ -136,9 +126,9 @@ class QueryBuilder:
         """
 
     @staticmethod
-    def build_service_comparison_query(metric: str, filters: Optional[Dict] = None) -> str:
+    def build_service_comparison_query(metric: str, filters: Optional[Dict] = None, report_date: Optional[str] = None) -> str:
         """Построение запроса для сравнения сервисов"""
-        where_clause = QueryBuilder.build_where_clause(filters)
+        where_clause = QueryBuilder.build_where_clause(filters, report_date)
         
         metric_calculations = {
             'headcount': "COUNT(*)",
@@ -156,13 +146,13 @@ class QueryBuilder:
         FROM hr_data_clean 
         {where_clause}
         GROUP BY service
-        ORDER BY value DESC
+        ORDER BY value DESC, service
         """
 
     @staticmethod
-    def build_demographic_query(demographic_field: str, filters: Optional[Dict] = None) -> str:
+    def build_demographic_query(demographic_field: str, filters: Optional[Dict] = None, report_date: Optional[str] = None) -> str:
         """Построение запроса для демографического анализа"""
-        where_clause = QueryBuilder.build_where_clause(filters)
+        where_clause = QueryBuilder.build_where_clause(filters, report_date)
         
         return f"""
         SELECT 
@@ -172,14 +162,14 @@ class QueryBuilder:
         {where_clause}
         AND fire_from_company = '1970-01-01'
         GROUP BY {demographic_field}
-        ORDER BY count DESC
+        ORDER BY count DESC, {demographic_field}
         """
 
     
     @staticmethod
-    def build_fte_distribution_query(filters: Optional[Dict] = None) -> str:
+    def build_fte_distribution_query(filters: Optional[Dict] = None, report_date: Optional[str] = None) -> str:
         """Построение запроса для распределения ставок"""
-        where_clause = QueryBuilder.build_where_clause(filters)
+        where_clause = QueryBuilder.build_where_clause(filters, report_date)
         return f"""
         SELECT 
             fte,
@@ -192,9 +182,9 @@ class QueryBuilder:
         """
 
     @staticmethod
-    def build_remote_workers_query(filters: Optional[Dict] = None) -> str:
+    def build_remote_workers_query(filters: Optional[Dict] = None, report_date: Optional[str] = None) -> str:
         """Построение запроса для удаленных сотрудников"""
-        where_clause = QueryBuilder.build_where_clause(filters)
+        where_clause = QueryBuilder.build_where_clause(filters, report_date)
         remote_condition = "AND location_name LIKE '%Дистанционщик%'"
         return f"""
         SELECT COUNT(*) as count
@@ -205,9 +195,9 @@ class QueryBuilder:
         """
 
     @staticmethod
-    def build_age_filter_query(age_condition: str, filters: Optional[Dict] = None) -> str:
+    def build_age_filter_query(age_condition: str, filters: Optional[Dict] = None, report_date: Optional[str] = None) -> str:
         """Построение запроса для фильтрации по возрасту"""
-        where_clause = QueryBuilder.build_where_clause(filters)
+        where_clause = QueryBuilder.build_where_clause(filters, report_date)
         age_filter = f"AND fullyears {age_condition}"
         return f"""
         SELECT COUNT(*) as count
@@ -218,9 +208,9 @@ class QueryBuilder:
         """
 
     @staticmethod
-    def build_experience_filter_query(experience_condition: str, filters: Optional[Dict] = None) -> str:
+    def build_experience_filter_query(experience_condition: str, filters: Optional[Dict] = None, report_date: Optional[str] = None) -> str:
         """Построение запроса для фильтрации по опыту"""
-        where_clause = QueryBuilder.build_where_clause(filters)
+        where_clause = QueryBuilder.build_where_clause(filters, report_date)
         experience_filter = f"AND experience {experience_condition}"
         return f"""
         SELECT COUNT(*) as count
@@ -231,9 +221,9 @@ class QueryBuilder:
         """
 
     @staticmethod
-    def build_location_like_query(location_pattern: str, filters: Optional[Dict] = None) -> str:
+    def build_location_like_query(location_pattern: str, filters: Optional[Dict] = None, report_date: Optional[str] = None) -> str:
         """Построение запроса для поиска локаций по шаблону"""
-        where_clause = QueryBuilder.build_where_clause(filters)
+        where_clause = QueryBuilder.build_where_clause(filters, report_date)
         location_condition = f"AND location_name LIKE '{location_pattern}'"
         return f"""
         SELECT COUNT(*) as count
@@ -1,8 +1,13 @@
 # query_parser_complex.py
 import re
-from typing import Dict, Any
+from typing import Dict, Any, Optional
+from storage.value_resolver import DEFAULT_SERVICE_INDEX, ValueResolver
 
 class ComplexQueryParser:
+    def __init__(self, resolver: Optional[ValueResolver] = None):
+        # без индекса по базе сервисы ищутся по общему списку псевдонимов
+        self.resolver = resolver
+
     def parse_complex_query(self, text: str) -> Dict[str, Any]:
         text_lower = text.lower()
         
@@ -390,33 +395,17 @@ class ComplexQueryParser:
         
         return None
 
-    def _extract_service(self, text_lower: str) -> str:
-        service_mapping = {
-            'такси': 'Такси',
-            'маркет': 'Маркет', 
-            'крауд': 'Крауд',
-            'лавка': 'Лавка',
-            'финтех': 'Финтех',
-            'еда': 'Еда',
-            'доставка': 'Доставка',
-            'облако': 'Облако',
-            'коммерческий': 'Коммерческий департамент',
-            'общие': 'Общие подразделения'
-        }
-        
-        for key, value in service_mapping.items():
-            if key in text_lower:
-                return value
-        
-        return None
+    def _extract_service(self, text_lower: str) -> Optional[str]:
+        """Сервис, упомянутый в тексте в любой словоформе ("в облаке", "по такси")"""
+        index = self.resolver.current().services if self.resolver is not None else DEFAULT_SERVICE_INDEX
+        return index.find_in_text(text_lower)
 
     def _build_filters_from_text(self, text_lower: str) -> Dict[str, Any]:
         filters = {}
         
-        for service in ['такси', 'маркет', 'крауд', 'лавка', 'финтех', 'еда', 'доставка', 'облако']:
-            if service in text_lower:
-                filters['service'] = service.capitalize()
-                break
+        service = self._extract_service(text_lower)
+        if service:
+            filters['service'] = service
         
         if 'москв' in text_lower:
             filters['location_name'] = '%Москва%'
@@ -0,0 +1,481 @@
+# snapshot_engine.py
+import os
+import json
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+import numpy as np
+import pandas as pd
+from collections import namedtuple
+from typing import Dict, List, Optional, Tuple
+from database import DatabaseManager
+from storage.snapshot_cache import SnapshotCache
+from config import SNAPSHOT_ENGINE_ENABLED, SNAPSHOT_CACHE_ENABLED
+
+logger = logging.getLogger(__name__)
+
+CATEGORICAL_COLUMNS = ('service', 'location_name', 'cluster', 'sex', 'age_category',
+                       'experience_category', 'fire_from_company')
+NUMERIC_COLUMNS = ('fullyears', 'experience', 'fte', 'hirecount', 'firecount')
+
+ACTIVE_FIRE_DATE = '1970-01-01'
+
+# Поля результата calculate_metric - те же имена, что у колонок SQL-запроса
+METRIC_ROWS = {
+    'headcount': namedtuple('Row', ['count']),
+    'turnover_rate': namedtuple('Row', ['total', 'fired', 'turnover_rate']),
+    'average_experience': namedtuple('Row', ['avg_exp']),
+    'average_age': namedtuple('Row', ['avg_age']),
+    'average_fte': namedtuple('Row', ['avg_fte']),
+    'total_fired': namedtuple('Row', ['total_fired']),
+    'total_hired': namedtuple('Row', ['total_hired']),
+}
+
+_OPERATORS = ('>=', '<=', '>', '<', '=')
+
+# Метаданные файла снимка: какие числовые колонки целочисленные в SQLite
+_INTEGER_KEY = b'hr_snapshot_integer'
+
+
+class _Unsupported(Exception):
+    """Запрос нельзя посчитать по снимку - уходим в SQL"""
+
+
+def _single_chunk(column):
+    """Массив колонки без склейки: в файлах снимков одна порция строк"""
+    return column.chunk(0) if column.num_chunks == 1 else column.combine_chunks()
+
+
+class _Snapshot:
+    """Колонки одной report_date: категориальные закодированы словарем, числовые - float64"""
+
+    def __init__(self, report_date: str, version, size: int):
+        self.report_date = report_date
+        self.version = version
+        self.size = size
+        # labels[0] = None: NULL-группа, как в SQLite, идет первой; остальные метки по возрастанию
+        self.labels: Dict[str, list] = {}
+        self.codes: Dict[str, np.ndarray] = {}
+        self.lookup: Dict[str, Dict[str, int]] = {}
+        self.numeric: Dict[str, np.ndarray] = {}
+        self.integer: Dict[str, bool] = {}
+
+    @classmethod
+    def from_rows(cls, report_date: str, version, rows: List[tuple], columns: Tuple[str, ...]) -> '_Snapshot':
+        snapshot = cls(report_date, version, len(rows))
+        values = list(zip(*rows)) if rows else [()] * len(columns)
+        by_name = dict(zip(columns, values))
+        for name in CATEGORICAL_COLUMNS:
+            column = by_name[name]
+            labels = [None] + sorted({value for value in column if value is not None})
+            snapshot._set_labels(name, labels)
+            lookup = snapshot.lookup[name]
+            snapshot.codes[name] = np.fromiter(
+                (0 if value is None else lookup[value] for value in column), dtype=np.int32, count=snapshot.size
+            )
+        for name in NUMERIC_COLUMNS:
+            column = by_name[name]
+            snapshot.numeric[name] = np.array(column, dtype=np.float64)
+            snapshot.integer[name] = all(isinstance(value, int) for value in column if value is not None)
+        return snapshot
+
+    @classmethod
+    def from_arrow(cls, report_date: str, version, table) -> '_Snapshot':
+        """Снимок из файла to_arrow; коды и числа остаются в отображенном в память буфере без копирования"""
+        snapshot = cls(report_date, version, table.num_rows)
+        integer = set(json.loads(table.schema.metadata[_INTEGER_KEY]))
+        for name in CATEGORICAL_COLUMNS:
+            column = _single_chunk(table.column(name))
+            snapshot._set_labels(name, column.dictionary.to_pylist())
+            snapshot.codes[name] = column.indices.to_numpy(zero_copy_only=True)
+        for name in NUMERIC_COLUMNS:
+            snapshot.numeric[name] = _single_chunk(table.column(name)).to_numpy(zero_copy_only=True)
+            snapshot.integer[name] = name in integer
+        return snapshot
+
+    def to_arrow(self):
+        """Таблица pyarrow: категориальные колонки - словарь с NULL под кодом 0, числовые - float64 с NaN"""
+        import pyarrow as pa
+
+        arrays = [
+            pa.DictionaryArray.from_arrays(pa.array(self.codes[name], type=pa.int32()),
+                                           pa.array(self.labels[name], type=pa.string()))
+            for name in CATEGORICAL_COLUMNS
+        ]
+        arrays += [pa.array(self.numeric[name], type=pa.float64()) for name in NUMERIC_COLUMNS]
+        metadata = {_INTEGER_KEY: json.dumps([name for name in NUMERIC_COLUMNS if self.integer[name]])}
+        return pa.Table.from_arrays(arrays, names=list(CATEGORICAL_COLUMNS + NUMERIC_COLUMNS), metadata=metadata)
+
+    def _set_labels(self, name: str, labels: list):
+        self.labels[name] = labels
+        self.lookup[name] = {label: code for code, label in enumerate(labels) if label is not None}
+
+    # --- фильтры ---
+
+    def mask(self, filters: Dict, active_only: bool = False) -> np.ndarray:
+        mask = np.ones(self.size, dtype=bool)
+        for column, value in filters.items():
+            mask &= self._condition(column, value)
+        if active_only:
+            mask &= self._equals('fire_from_company', ACTIVE_FIRE_DATE)
+        return mask
+
+    def _condition(self, column, value) -> np.ndarray:
+        if column == 'report_date':
+            if value != self.report_date:
+                raise _Unsupported(f"фильтр по другой дате {value}")
+            return np.ones(self.size, dtype=bool)
+        if isinstance(value, str) and any(op in value for op in ['>', '<', '>=', '<=']):
+            return self._compare(column, value)
+        if column == 'location_name' and '%' in str(value):
+            raise _Unsupported("LIKE")
+        return self._equals(column, value)
+
+    def _equals(self, column, value) -> np.ndarray:
+        if column in self.codes:
+            if not isinstance(value, str):
+                raise _Unsupported(f"нестроковое значение для {column}")
+            code = self.lookup[column].get(value)
+            if code is None:
+                return np.zeros(self.size, dtype=bool)
+            return self.codes[column] == code
+        if column in self.numeric:
+            if isinstance(value, str):
+                try:
+                    value = float(value)
+                except ValueError:
+                    # SQLite: текст никогда не равен числу из REAL-колонки
+                    return np.zeros(self.size, dtype=bool)
+            if not isinstance(value, (int, float)):
+                raise _Unsupported(f"значение {value!r} для {column}")
+            return self.numeric[column] == value
+        raise _Unsupported(f"колонка {column}")
+
+    def _compare(self, column, expression: str) -> np.ndarray:
+        """Условия вида '> 30' (в SQL подставляются как есть) - только для числовых колонок"""
+        if column not in self.numeric:
+            raise _Unsupported(f"сравнение по {column}")
+        expression = expression.strip()
+        for operator in _OPERATORS:
+            if expression.startswith(operator):
+                try:
+                    threshold = float(expression[len(operator):].strip())
+                except ValueError:
+                    raise _Unsupported(f"условие {expression}")
+                values = self.numeric[column]
+                with np.errstate(invalid='ignore'):
+                    if operator == '>=':
+                        return values >= threshold
+                    if operator == '<=':
+                        return values <= threshold
+                    if operator == '>':
+                        return values > threshold
+                    if operator == '<':
+                        return values < threshold
+                    return values == threshold
+        raise _Unsupported(f"условие {expression}")
+
+    # --- группировки ---
+
+    def groups(self, column) -> Tuple[list, np.ndarray]:
+        """Метки групп в порядке GROUP BY SQLite (NULL первой) и код группы каждой строки"""
+        if column in self.codes:
+            return self.labels[column], self.codes[column]
+        if column in self.numeric:
+            values = self.numeric[column]
+            present = ~np.isnan(values)
+            unique, inverse = np.unique(values[present], return_inverse=True)
+            codes = np.zeros(self.size, dtype=np.int64)
+            codes[present] = inverse + 1
+            labels = [None] + [int(v) if self.integer[column] else float(v) for v in unique]
+            return labels, codes
+        raise _Unsupported(f"группировка по {column}")
+
+
+class _Aggregator:
+    """Агрегаты SQL (COUNT/SUM/AVG) по группам через bincount с семантикой NULL как в SQLite"""
+
+    def __init__(self, snapshot: _Snapshot, mask: np.ndarray, codes: np.ndarray, size: int):
+        self.snapshot = snapshot
+        self.mask = mask
+        self.codes = codes[mask]
+        self.size = size
+        self.count = np.bincount(self.codes, minlength=size)
+
+    def _sums(self, column):
+        values = self.snapshot.numeric[column][self.mask]
+        present = ~np.isnan(values)
+        sums = np.bincount(self.codes, weights=np.where(present, values, 0.0), minlength=self.size)
+        counts = np.bincount(self.codes, weights=present, minlength=self.size)
+        return sums, counts
+
+    def total(self, column) -> list:
+        sums, counts = self._sums(column)
+        integer = self.snapshot.integer[column]
+        return [None if n == 0 else (int(s) if integer else float(s)) for s, n in zip(sums, counts)]
+
+    def average(self, column) -> list:
+        sums, counts = self._sums(column)
+        return [None if n == 0 else float(s / n) for s, n in zip(sums, counts)]
+
+    def rate(self) -> list:
+        """CASE WHEN COUNT(*) > 0 THEN ROUND(CAST(SUM(firecount) AS FLOAT) / COUNT(*) * 100, 2) ELSE 0 END"""
+        fired = self.total('firecount')
+        raw = [None if f is None else float(f) / int(c) * 100 for f, c in zip(fired, self.count) if c > 0]
+        rounded = iter(_sqlite_round(raw, 2))
+        return [next(rounded) if c > 0 else 0 for c in self.count]
+
+    def metric(self, metric: str) -> list:
+        if metric == 'headcount':
+            return [int(c) for c in self.count]
+        if metric in ('turnover_rate', 'attrition_rate'):
+            return self.rate()
+        if metric in ('average_experience', 'avg_experience'):
+            return self.average('experience')
+        if metric in ('average_age', 'avg_age'):
+            return self.average('fullyears')
+        if metric in ('average_fte', 'avg_fte'):
+            return self.average('fte')
+        if metric == 'total_fired':
+            return self.total('firecount')
+        if metric == 'total_hired':
+            return self.total('hirecount')
+        raise _Unsupported(f"метрика {metric}")
+
+
+_round_conn = None
+_round_lock = threading.Lock()
+
+
+def _sqlite_round(values: list, digits: int) -> list:
+    """ROUND считаем самим SQLite: его правила округления не совпадают с round() в Python"""
+    global _round_conn
+    if not values:
+        return []
+    with _round_lock:
+        if _round_conn is None:
+            _round_conn = sqlite3.connect(':memory:', check_same_thread=False)
+        rows = _round_conn.execute(
+            "SELECT ROUND(value, ?) FROM json_each(?) ORDER BY key", (digits, json.dumps(values))
+        ).fetchall()
+    return [row[0] for row in rows]
+
+
+def _sql_order(labels: list, values: list, descending: bool) -> List[int]:
+    """Индексы групп в порядке ORDER BY value: NULL меньше любого числа.
+
+    Порядок равных значений в SQL не определен; берем порядок GROUP BY - так же их отдает
+    SQLite, когда группировка идет по индексу (все категориальные измерения)"""
+    present = [i for i, v in enumerate(values) if v is not None]
+    missing = [i for i, v in enumerate(values) if v is None]
+    present.sort(key=lambda i: values[i], reverse=descending)
+    return present + missing if descending else missing + present
+
+
+class SnapshotEngine:
+    """Колоночный снимок hr_data_clean за одну дату в памяти.
+
+    Отвечает на простые агрегаты инструментов масками и bincount; все, что не умеет
+    (LIKE, неизвестные колонки, другие даты), возвращает None - вызывающий код идет в SQL.
+    Снимок перечитывается при смене версии данных DatabaseManager. Построенный снимок
+    сохраняется в файл (storage.snapshot_cache), и после перезапуска загружается оттуда."""
+
+    _engines: Dict[str, 'SnapshotEngine'] = {}
+    _engines_lock = threading.Lock()
+
+    def __init__(self, db: DatabaseManager):
+        self.db = db
+        self._snapshots: Dict[str, _Snapshot] = {}
+        self._load_lock = threading.Lock()
+        self.files = SnapshotCache.for_database(db.db_path) if SNAPSHOT_CACHE_ENABLED else None
+        self.hits = 0
+        self.fallbacks = 0
+        self.file_loads = 0
+        self.sql_loads = 0
+
+    @classmethod
+    def for_database(cls, db: DatabaseManager) -> Optional['SnapshotEngine']:
+        """Общий движок на файл базы; None, если движок выключен или не может следить за версией данных"""
+        if not SNAPSHOT_ENGINE_ENABLED or db.cache is None:
+            return None
+        key = os.path.abspath(db.db_path)
+        with cls._engines_lock:
+            engine = cls._engines.get(key)
+            if engine is None:
+                engine = cls(db)
+                cls._engines[key] = engine
+            return engine
+
+    # --- загрузка ---
+
+    def _load(self, report_date: str) -> Optional[_Snapshot]:
+        with self._load_lock:
+            version = self.db.data_version()
+            snapshot = self._snapshots.get(report_date)
+            if snapshot is not None and snapshot.version == version:
+                return snapshot
+            started = time.perf_counter()
+            fingerprint = self._fingerprint(report_date)
+            snapshot = self._read_file(report_date, version, fingerprint)
+            if snapshot is not None:
+                self.file_loads += 1
+                source = 'из файла'
+            else:
+                columns = CATEGORICAL_COLUMNS + NUMERIC_COLUMNS
+                rows = self.db.execute_rows(
+                    f"SELECT {', '.join(columns)} FROM hr_data_clean WHERE report_date = ?",
+                    (report_date,), use_cache=False
+                )
+                if not rows:
+                    self._snapshots.pop(report_date, None)
+                    return None
+                snapshot = _Snapshot.from_rows(report_date, version, rows, columns)
+                self.sql_loads += 1
+                source = 'из базы'
+                self._write_file(snapshot, fingerprint)
+            # Старые версии и другие даты не держим: память под один снимок
+            self._snapshots = {report_date: snapshot}
+            logger.info(f"Снимок {report_date} загружен в память {source}: {snapshot.size} строк "
+                        f"за {(time.perf_counter() - started) * 1000:.0f} мс")
+            return snapshot
+
+    def _fingerprint(self, report_date: str) -> Optional[Dict]:
+        if self.files is None:
+            return None
+        try:
+            return self.files.fingerprint(self.db.db_path, report_date)
+        except sqlite3.Error as e:
+            logger.warning(f"Не удалось получить отпечаток среза {report_date}, файл снимка не используется: {e}")
+            return None
+
+    def _read_file(self, report_date: str, version, fingerprint) -> Optional[_Snapshot]:
+        if fingerprint is None or not fingerprint['rows']:
+            return None
+        try:
+            table = self.files.read(report_date, fingerprint)
+            return _Snapshot.from_arrow(report_date, version, table) if table is not None else None
+        except Exception as e:
+            logger.warning(f"Не удалось прочитать файл снимка {report_date}, читаем базу: {e}")
+            return None
+
+    def _write_file(self, snapshot: _Snapshot, fingerprint):
+        if fingerprint is None:
+            return
+        try:
+            self.files.write(snapshot.report_date, snapshot.to_arrow(), fingerprint)
+        except Exception as e:
+            logger.warning(f"Не удалось сохранить файл снимка {snapshot.report_date}: {e}")
+
+    async def snapshot(self, report_date: str) -> Optional[_Snapshot]:
+        snapshot = self._snapshots.get(report_date)
+        if snapshot is not None and snapshot.version == self.db.data_version():
+            return snapshot
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, self._load, report_date)
+        except Exception as e:
+            logger.warning(f"Не удалось загрузить снимок {report_date}, используем SQL: {e}")
+            return None
+
+    async def preload(self, report_date: str) -> bool:
+        return await self.snapshot(report_date) is not None
+
+    async def _answer(self, report_date: str, compute):
+        snapshot = await self.snapshot(report_date)
+        if snapshot is None:
+            self.fallbacks += 1
+            return None
+        try:
+            result = compute(snapshot)
+        except _Unsupported as e:
+            logger.debug(f"Снимок не поддерживает запрос ({e}), используем SQL")
+            self.fallbacks += 1
+            return None
+        self.hits += 1
+        return result
+
+    def stats(self) -> Dict:
+        return {
+            'hits': self.hits,
+            'fallbacks': self.fallbacks,
+            'file_loads': self.file_loads,
+            'sql_loads': self.sql_loads,
+            'snapshots': {date: snapshot.size for date, snapshot in self._snapshots.items()}
+        }
+
+    # --- запросы инструментов ---
+
+    async def metric(self, report_date: str, metric: str, filters: Dict, active_only: bool = False):
+        """Строка calculate_metric (namedtuple с именами колонок SQL) или None"""
+        def compute(snapshot: _Snapshot):
+            row_class = METRIC_ROWS.get(metric)
+            if row_class is None:
+                raise _Unsupported(f"метрика {metric}")
+            mask = snapshot.mask(filters, active_only)
+            aggregator = _Aggregator(snapshot, mask, np.zeros(snapshot.size, dtype=np.int64), 1)
+            if metric == 'turnover_rate':
+                return row_class(int(aggregator.count[0]), aggregator.total('firecount')[0], aggregator.rate()[0])
+            return row_class(aggregator.metric(metric)[0])
+        return await self._answer(report_date, compute)
+
+    async def compare(self, report_date: str, metric: str, dimension: str, filters: Dict,
+                      active_only: bool = False, descending: bool = True, limit: int = 20) -> Optional[pd.DataFrame]:
+        """SELECT dimension, metric as value ... GROUP BY dimension ORDER BY value LIMIT limit"""
+        def compute(snapshot: _Snapshot):
+            labels, codes = snapshot.groups(dimension)
+            mask = snapshot.mask(filters, active_only)
+            aggregator = _Aggregator(snapshot, mask, codes, len(labels))
+            present = np.flatnonzero(aggregator.count)
+            values = aggregator.metric(metric)
+            group_labels = [labels[i] for i in present]
+            group_values = [values[i] for i in present]
+            order = _sql_order(group_labels, group_values, descending)[:limit]
+            return pd.DataFrame.from_records(
+                [(group_labels[i], group_values[i]) for i in order], columns=[dimension, 'value'], coerce_float=True
+            )
+        return await self._answer(report_date, compute)
+
+    async def top_values(self, report_date: str, column: str, filters: Dict, n: int = 20) -> Optional[pd.DataFrame]:
+        """SELECT column, COUNT(*) as count ... GROUP BY column ORDER BY count DESC LIMIT n"""
+        def compute(snapshot: _Snapshot):
+            labels, codes = snapshot.groups(column)
+            mask = snapshot.mask(filters)
+            counts = np.bincount(codes[mask], minlength=len(labels))
+            present = np.flatnonzero(counts)
+            group_labels = [labels[i] for i in present]
+            group_counts = [int(counts[i]) for i in present]
+            order = _sql_order(group_labels, group_counts, descending=True)[:max(int(n), 0)]
+            return pd.DataFrame.from_records(
+                [(group_labels[i], group_counts[i]) for i in order], columns=[column, 'count'], coerce_float=True
+            )
+        return await self._answer(report_date, compute)
+
+    async def segmentation(self, report_date: str, segment_by: List[str], metrics: List[str],
+                           filters: Dict, limit: int = 50) -> Optional[pd.DataFrame]:
+        """GROUP BY одно-два измерения ORDER BY этим же измерениям LIMIT limit"""
+        def compute(snapshot: _Snapshot):
+            supported = [m for m in metrics if m in ('headcount', 'attrition_rate', 'avg_experience', 'avg_age', 'avg_fte')]
+            if len(set(supported)) != len(supported):
+                raise _Unsupported("повторяющиеся метрики")
+            first_labels, first_codes = snapshot.groups(segment_by[0])
+            if len(segment_by) > 1:
+                second_labels, second_codes = snapshot.groups(segment_by[1])
+            else:
+                second_labels, second_codes = [None], np.zeros(snapshot.size, dtype=np.int64)
+            width = len(second_labels)
+            codes = first_codes.astype(np.int64) * width + second_codes
+            mask = snapshot.mask(filters)
+            aggregator = _Aggregator(snapshot, mask, codes, len(first_labels) * width)
+            # Коды растут в порядке (первое измерение, второе) - это и есть ORDER BY
+            present = np.flatnonzero(aggregator.count)[:limit]
+            values = {metric: aggregator.metric(metric) for metric in supported}
+            records = []
+            for group in present:
+                keys = [first_labels[group // width]]
+                if len(segment_by) > 1:
+                    keys.append(second_labels[group % width])
+                records.append(tuple(keys) + tuple(values[metric][group] for metric in supported))
+            return pd.DataFrame.from_records(records, columns=list(segment_by) + supported, coerce_float=True)
+        return await self._answer(report_date, compute)
@@ -0,0 +1,128 @@
+# backends.py
+"""SQLite против DuckDB (storage.backends) на многолетней истории: динамика компании и тренды
+
+Копия базы дополняется историей: самый ранний срез повторяется за N предыдущих месяцев.
+DuckDB проверяется с обоими источниками: копия таблиц SQLite в памяти и Parquet-выгрузка.
+Кэш запросов отключен, чтобы сравнивать именно выполнение SQL.
+
+Запуск: python benchmarks/backends.py [путь к базе] [месяцев истории] [повторы]
+"""
+import asyncio
+import shutil
+import sqlite3
+import statistics
+import tempfile
+import time
+import sys
+import os
+from datetime import date, timedelta
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database import DatabaseManager
+from storage import backends
+from storage.schema import SchemaManager, create_indexes, create_write_triggers, ensure_partition, rebuild_view, analyze
+from menu.data_repository import HRDataRepository
+from ai_core.agent_tools_complex import ComplexAgentTools
+
+
+def month_ends(last, months):
+    """Концы месяцев перед last (YYYY-MM-DD), от старых к новым"""
+    year, month = int(last[:4]), int(last[5:7])
+    result = []
+    for _ in range(months):
+        month -= 1
+        if month == 0:
+            year, month = year - 1, 12
+        following = date(year + month // 12, month % 12 + 1, 1)
+        result.append((following - timedelta(days=1)).isoformat())
+    return result[::-1]
+
+
+def build_history(source, target, months):
+    shutil.copyfile(source, target)
+    SchemaManager(target).migrate()
+    conn = sqlite3.connect(target)
+    try:
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(hr_data_clean)") if row[1] != 'report_date']
+        earliest = conn.execute("SELECT MIN(report_date) FROM hr_data_clean").fetchone()[0]
+        with conn:
+            partitions = []
+            for report_date in month_ends(earliest, months):
+                partition, _ = ensure_partition(conn, report_date)
+                partitions.append(partition)
+                conn.execute(
+                    f"INSERT INTO {partition} (report_date, {', '.join(columns)}) "
+                    f"SELECT ?, {', '.join(columns)} FROM hr_data_clean WHERE report_date = ?",
+                    (report_date, earliest)
+                )
+            create_indexes(conn, partitions)
+            create_write_triggers(conn, partitions)
+            rebuild_view(conn)
+            analyze(conn)
+        return conn.execute("SELECT COUNT(*), COUNT(DISTINCT report_date) FROM hr_data_clean").fetchone()
+    finally:
+        conn.close()
+
+
+def measure(call, repeats):
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        call()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+
+def run(db_path, parquet_dir, repeats):
+    workloads = {}
+    for title, backend, source in (('SQLite', 'sqlite', None), ('DuckDB', 'duckdb', 'sqlite'),
+                                   ('DuckDB/Parquet', 'duckdb', 'parquet')):
+        DatabaseManager.close_all()
+        DatabaseManager.default_backend = backend
+        backends.DUCKDB_SOURCE = source
+        backends.DUCKDB_PARQUET_DIR = parquet_dir
+        repo = HRDataRepository(db_path)
+        tools = ComplexAgentTools(db_path)
+        # сравниваем выполнение SQL, а не кэш и не снимок в памяти
+        repo.db.cache = tools.db.cache = None
+        tools.snapshot = None
+
+        started = time.perf_counter()
+        repo.get_last_report_date()
+        first = time.perf_counter() - started
+
+        workloads[title] = {
+            'первый запрос (загрузка)': first,
+            'get_company_dynamics': measure(repo.get_company_dynamics, repeats),
+            'trend_analysis headcount': measure(
+                lambda: asyncio.run(tools.trend_analysis('headcount', '3month', None)), repeats),
+            'trend_analysis turnover': measure(
+                lambda: asyncio.run(tools.trend_analysis('turnover_rate', '3month', {'sex': 'F'})), repeats),
+            'compare_metrics age/service': measure(
+                lambda: asyncio.run(tools.compare_metrics('average_age', 'service', None)), repeats),
+        }
+
+    print(f"Медиана из {repeats} повторов, мс:")
+    print(f"  {'запрос':<30}" + ''.join(f"{title:>16}" for title in workloads))
+    for name in workloads['SQLite']:
+        print(f"  {name:<30}" + ''.join(f"{timings[name] * 1000:>16.1f}" for timings in workloads.values()))
+
+
+def main(db_path, months=36, repeats=5):
+    with tempfile.TemporaryDirectory() as tmp:
+        history_path = os.path.join(tmp, 'history.db')
+        rows, dates = build_history(db_path, history_path, months)
+        print(f"История: {rows} строк, {dates} срезов")
+        parquet_dir = os.path.join(tmp, 'parquet')
+        started = time.perf_counter()
+        backends.DuckDBPool(history_path, source='sqlite').export_parquet(parquet_dir)
+        print(f"Parquet-выгрузка: {time.perf_counter() - started:.1f} с")
+        run(history_path, parquet_dir, repeats)
+        DatabaseManager.close_all()
+
+
+if __name__ == "__main__":
+    from config import DB_PATH
+    db_path = sys.argv[1] if len(sys.argv) > 1 else DB_PATH
+    months = int(sys.argv[2]) if len(sys.argv) > 2 else 36
+    repeats = int(sys.argv[3]) if len(sys.argv) > 3 else 5
+    main(db_path, months, repeats)
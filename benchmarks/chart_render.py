@@ -0,0 +1,170 @@
+# chart_render.py
+"""Пропускная способность рендеринга графиков: графиков в секунду и p95 времени набора графиков отчета
+
+Сравниваются прежний рендеринг (pyplot, 300 dpi, bbox_inches='tight', холодный пул процессов)
+и ChartRenderer (прогретые процессы, Figure/Agg, переиспользуемые макеты) с заданными DPI и форматом.
+Описания графиков - три отчета меню (динамика, демография, сервисы) по базе.
+
+Запуск: python benchmarks/chart_render.py [путь к базе] [--rounds 10] [--workers 2] [--dpi 200]
+        [--format png] [--concurrency 4] [--skip-legacy]
+"""
+import argparse
+import asyncio
+import io
+import multiprocessing
+import statistics
+import time
+import sys
+import os
+from concurrent.futures import ProcessPoolExecutor
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from menu.advanced_core import AdvancedHRAnalyzer
+from menu.chart_renderer import ChartRenderer
+from menu.plotting import PLOT_FORMATS
+
+
+def legacy_plot(data, x_col, y_col, title, plot_type='bar', x_label=None, y_label=None, hue=None):
+    """menu.plotting.create_plot до перехода на Figure/Agg"""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    import numpy as np
+
+    plt.figure(figsize=(12, 8))
+    colors = sns.color_palette("husl", len(data))
+    if plot_type == 'bar':
+        if hue:
+            bar_width = 0.35
+            x_pos = np.arange(len(data[x_col].unique()))
+            for i, category in enumerate(data[hue].unique()):
+                category_data = data[data[hue] == category]
+                bars = plt.bar(x_pos + i * bar_width, category_data[y_col], bar_width, label=category, alpha=0.8)
+                plt.bar_label(bars, fmt='%.0f', padding=3)
+            plt.xticks(x_pos + bar_width/2, data[x_col].unique())
+            plt.legend()
+        else:
+            bars = plt.bar(data[x_col], data[y_col], color=colors, alpha=0.8)
+            plt.bar_label(bars, fmt='%.1f', padding=3)
+    elif plot_type == 'pie':
+        filtered_data = data[data[y_col] > 0]
+        plt.pie(filtered_data[y_col], labels=filtered_data[x_col], autopct='%1.1f%%', colors=colors, startangle=90)
+        plt.axis('equal')
+    plt.title(title, fontsize=16, fontweight='bold', pad=20)
+    if x_label:
+        plt.xlabel(x_label, fontsize=12)
+    if y_label:
+        plt.ylabel(y_label, fontsize=12)
+    plt.grid(True, alpha=0.3)
+    plt.xticks(rotation=45, ha='right')
+    plt.tight_layout()
+    buffer = io.BytesIO()
+    plt.savefig(buffer, format='png', dpi=300, bbox_inches='tight')
+    plt.close()
+    return buffer.getvalue()
+
+
+def legacy_render(spec):
+    """Те же графики, что строят menu.plotting.create_*_plots, прежним способом"""
+    data = spec['data']
+    if spec['kind'] == 'dynamics':
+        return [legacy_plot(data, 'month', 'value', 'Динамика наймов и увольнений', 'bar', 'Месяц', 'Количество', 'type')]
+    if spec['kind'] == 'services':
+        large = data[data['employees'] > 100]
+        return [legacy_plot(large, 'service', 'employees', 'Количество сотрудников по сервисам', 'bar',
+                            'Сервис', 'Количество сотрудников'),
+                legacy_plot(large, 'service', 'attrition_rate', 'Текучесть кадров по сервисам', 'bar',
+                            'Сервис', 'Текучесть (%)')]
+    order = spec['options']['experience_order']
+    exp_data = data['exp_data'].copy()
+    exp_data['order'] = exp_data['experience_category'].apply(lambda x: order.index(x) if x in order else len(order))
+    return [legacy_plot(data['age_data'], 'age_category', 'count', 'Распределение по возрастным группам', 'bar',
+                        'Возрастная группа', 'Количество сотрудников'),
+            legacy_plot(data['gender_data'], 'sex', 'count', 'Гендерное распределение', 'pie'),
+            legacy_plot(exp_data.sort_values('order'), 'experience_category', 'count', 'Распределение по опыту работы',
+                        'bar', 'Опыт работы', 'Количество сотрудников')]
+
+
+def load_specs(db_path):
+    analyzer = AdvancedHRAnalyzer(db_path)
+    specs = [analyzer.company_dynamics(False)[1], analyzer.demographic_dashboard(False)[1],
+             analyzer.service_analysis(False)[1]]
+    return [spec for spec in specs if spec is not None]
+
+
+async def run(render, specs, rounds, concurrency):
+    """(графиков, секунд всего, время рендеринга каждого набора графиков)"""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    charts = 0
+
+    async def one(spec):
+        nonlocal charts
+        async with semaphore:
+            started = time.perf_counter()
+            plots = await render(spec)
+            latencies.append(time.perf_counter() - started)
+            charts += len(plots)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(spec) for _ in range(rounds) for spec in specs))
+    return charts, time.perf_counter() - started, latencies
+
+
+def report(name, first, charts, elapsed, latencies, sizes):
+    latencies = sorted(latencies)
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    print(f"  {name:<34} {first:>8.2f} {charts / elapsed:>10.2f} {statistics.median(latencies):>8.2f} "
+          f"{p95:>8.2f} {sizes:>10.0f}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Рендеринг графиков: графиков в секунду и p95")
+    parser.add_argument('db', nargs='?', default=None)
+    parser.add_argument('--rounds', type=int, default=10, help="повторов каждого отчета")
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--dpi', type=int, default=200)
+    parser.add_argument('--format', choices=PLOT_FORMATS, default='png')
+    parser.add_argument('--concurrency', type=int, default=4, help="одновременных запросов графиков")
+    parser.add_argument('--skip-legacy', action='store_true')
+    args = parser.parse_args()
+    if args.db is None:
+        from config import DB_PATH
+        args.db = DB_PATH
+
+    specs = load_specs(args.db)
+    print(f"Отчетов: {len(specs)}, повторов: {args.rounds}, процессов: {args.workers}, "
+          f"одновременно: {args.concurrency}, CPU: {os.cpu_count()}")
+    print(f"  {'':<34} {'1-й, с':>8} {'граф./с':>10} {'p50, с':>8} {'p95, с':>8} {'КБ/граф.':>10}")
+
+    if not args.skip_legacy:
+        pool = ProcessPoolExecutor(max_workers=args.workers, mp_context=multiprocessing.get_context('spawn'))
+        loop = asyncio.get_running_loop()
+
+        async def legacy(spec):
+            return await loop.run_in_executor(pool, legacy_render, spec)
+
+        started = time.perf_counter()
+        plots = await legacy(specs[0])
+        first = time.perf_counter() - started
+        charts, elapsed, latencies = await run(legacy, specs, args.rounds, args.concurrency)
+        report("pyplot, 300 dpi, tight, png", first, charts, elapsed, latencies,
+               sum(len(plot) for plot in plots) / len(plots) / 1024)
+        pool.shutdown()
+
+    renderer = ChartRenderer(workers=args.workers, dpi=args.dpi, image_format=args.format)
+    warm_started = time.perf_counter()
+    await renderer.start()
+    warm = time.perf_counter() - warm_started
+    started = time.perf_counter()
+    plots = await renderer.render(specs[0])
+    first = time.perf_counter() - started
+    charts, elapsed, latencies = await run(renderer.render, specs, args.rounds, args.concurrency)
+    report(f"ChartRenderer, {args.dpi} dpi, {args.format}", first, charts, elapsed, latencies,
+           sum(len(plot) for plot in plots) / len(plots) / 1024)
+    print(f"Прогрев пула при старте бота: {warm:.2f} с")
+    renderer.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,86 @@
+# cold_start.py
+"""Время до первого ответа ИИ-инструментов после перезапуска: снимок из SQLite против файла снимка
+
+Каждый замер - отдельный процесс (как перезапуск бота): прогрев снимка последнего среза
+(AIAssistant.warm_up) и первые вопросы. Кэш страниц ОС при этом остается теплым.
+
+Запуск: python benchmarks/cold_start.py [путь к базе] [перезапусков]
+"""
+import asyncio
+import json
+import statistics
+import subprocess
+import tempfile
+import time
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+STARTED = time.perf_counter()
+
+
+def child(db_path, use_files, cache_root):
+    from ai_core import snapshot_engine
+    from ai_core.agent_tools import AgentTools
+    from ai_core.agent_tools_complex import ComplexAgentTools
+    from storage import snapshot_cache
+
+    snapshot_engine.SNAPSHOT_CACHE_ENABLED = use_files
+    snapshot_cache.SNAPSHOT_CACHE_DIR = cache_root
+    imported = time.perf_counter()
+
+    tools = AgentTools(db_path)
+    complex_tools = ComplexAgentTools(db_path)
+
+    async def first_answers():
+        await tools.snapshot.preload((await tools.calendar.current_async()).reporting_date)
+        warmed = time.perf_counter()
+        await tools.calculate_metric('headcount', {'service': 'Такси'})
+        await complex_tools.compare_metrics('average_age', 'service', None)
+        return warmed
+
+    warmed = asyncio.run(first_answers())
+    answered = time.perf_counter()
+    print(json.dumps({
+        'импорт': imported - STARTED,
+        'прогрев снимка': warmed - imported,
+        'первые ответы': answered - warmed,
+        'до первого ответа': answered - STARTED,
+        'stats': tools.snapshot.stats(),
+    }))
+
+
+def restart(db_path, use_files, cache_root):
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--child', db_path, '1' if use_files else '0', cache_root],
+        capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main(db_path, restarts=5):
+    with tempfile.TemporaryDirectory() as cache_root:
+        results = {}
+        for title, use_files in (('SQLite', False), ('файл снимка', True)):
+            if use_files:
+                restart(db_path, True, cache_root)  # первый запуск строит файл
+            runs = [restart(db_path, use_files, cache_root) for _ in range(restarts)]
+            loads = runs[-1]['stats']
+            print(f"{title}: загрузок из файла {loads['file_loads']}, из базы {loads['sql_loads']}")
+            results[title] = {name: statistics.median(run[name] for run in runs)
+                              for name in runs[0] if name != 'stats'}
+
+    print(f"Медиана из {restarts} перезапусков, мс:")
+    print(f"  {'этап':<20}" + ''.join(f"{title:>16}" for title in results))
+    for name in results['SQLite']:
+        print(f"  {name:<20}" + ''.join(f"{timings[name] * 1000:>16.1f}" for timings in results.values()))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == '--child':
+        child(sys.argv[2], sys.argv[3] == '1', sys.argv[4])
+    else:
+        from config import DB_PATH
+        db_path = sys.argv[1] if len(sys.argv) > 1 else DB_PATH
+        restarts = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+        main(db_path, restarts)
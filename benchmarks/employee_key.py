@@ -0,0 +1,52 @@
+# employee_key.py
+"""Сравнение COUNT(DISTINCT <строковый ключ>) и COUNT(DISTINCT employee_key)
+
+Запуск: python benchmarks/employee_key.py [путь к базе] [повторы]
+"""
+import sqlite3
+import statistics
+import time
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from storage.schema import EMPLOYEE_NATURAL_KEY_SQL, SchemaManager
+
+QUERY_TEMPLATE = """
+SELECT age_category, sex, experience_category, COUNT(DISTINCT {key}) as count
+FROM hr_data_clean
+WHERE report_date = ?
+GROUP BY age_category, sex, experience_category
+"""
+
+
+def measure(conn, query, params, repeats):
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        conn.execute(query, params).fetchall()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+
+def main(db_path, repeats=5):
+    SchemaManager(db_path).migrate()
+    conn = sqlite3.connect(db_path)
+    try:
+        report_date = conn.execute("SELECT MAX(report_date) FROM hr_data_clean").fetchone()[0]
+        params = (report_date,)
+        old = measure(conn, QUERY_TEMPLATE.format(key=EMPLOYEE_NATURAL_KEY_SQL), params, repeats)
+        new = measure(conn, QUERY_TEMPLATE.format(key='employee_key'), params, repeats)
+    finally:
+        conn.close()
+
+    print(f"Снимок {report_date}, медиана из {repeats} запусков:")
+    print(f"  строковый ключ: {old * 1000:.1f} мс")
+    print(f"  employee_key:   {new * 1000:.1f} мс")
+    print(f"  ускорение:      x{old / new:.1f}")
+
+
+if __name__ == "__main__":
+    from config import DB_PATH
+    db_path = sys.argv[1] if len(sys.argv) > 1 else DB_PATH
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    main(db_path, repeats)
@@ -0,0 +1,102 @@
+# location_match.py
+"""Сопоставление location_name: прежний линейный проход по списку локаций против LocationIndex
+
+К локациям из базы можно добавить синтетические ("Офис N, улица M"), чтобы посмотреть на
+тысячах значений. Запросы - точные, в другом регистре, подстроки, словоформы, опечатки и
+нераспознанные.
+
+Запуск: python benchmarks/location_match.py [путь к базе] [--extra 5000] [--repeats 200]
+"""
+import argparse
+import statistics
+import time
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database import DatabaseManager
+from storage.schema import union_partitions
+from storage.value_resolver import LocationIndex
+
+
+def linear_match(locations, location_query):
+    """Прежний DataNormalizer._find_location_match без загрузки кэша"""
+    location_lower = location_query.lower()
+    if '%' in location_query:
+        return location_query
+    if any(keyword in location_lower for keyword in ['дистан', 'удален', 'remote']):
+        return "%Дистанционщик%"
+    if 'москв' in location_lower:
+        return "%Москва%"
+    if any(keyword in location_lower for keyword in ['питер', 'петербург', 'спб']):
+        return "%Санкт-Петербург%"
+    for location in locations:
+        if location and location_lower == str(location).lower():
+            return location
+    for location in locations:
+        if location and location_lower in str(location).lower():
+            return location
+    return location_query
+
+
+def load_locations(db_path, extra):
+    db = DatabaseManager(db_path)
+    query, params = union_partitions(
+        "SELECT DISTINCT location_name FROM hr_data_clean WHERE location_name IS NOT NULL",
+        (), db.partitions(), 'UNION'
+    )
+    locations = [row[0] for row in db.execute_rows(query, params, use_cache=False)]
+    streets = ['Ленина', 'Садовая', 'Лесная', 'Новая', 'Заречная', 'Школьная', 'Полевая']
+    locations += [f"Офис {i}, улица {streets[i % len(streets)]}" for i in range(extra)]
+    DatabaseManager.close_all()
+    return locations
+
+
+def sample_queries(locations):
+    first, middle, last = locations[0], locations[len(locations) // 2], locations[-1]
+    return [
+        ('точное (начало списка)', first),
+        ('точное (конец списка)', last),
+        ('другой регистр', middle.upper()),
+        ('подстрока', last[len(last) // 3:]),
+        ('удаленка', 'удаленно'),
+        ('Москва', 'в Москве'),
+        ('опечатка', last[:-2] + last[-1] + last[-2] if len(last) > 3 else last),
+        ('не найдено', 'Тмутаракань'),
+    ]
+
+
+def measure(call, repeats):
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        call()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Линейный поиск локации против индекса")
+    parser.add_argument('db', nargs='?', default=None)
+    parser.add_argument('--extra', type=int, default=5000, help="синтетических локаций сверх базы")
+    parser.add_argument('--repeats', type=int, default=200)
+    args = parser.parse_args()
+    if args.db is None:
+        from config import DB_PATH
+        args.db = DB_PATH
+
+    locations = load_locations(args.db, args.extra)
+    started = time.perf_counter()
+    index = LocationIndex(locations)
+    print(f"Локаций: {len(locations)}, индекс построен за {(time.perf_counter() - started) * 1000:.1f} мс")
+
+    print(f"Медиана из {args.repeats} вызовов, мкс:")
+    print(f"  {'запрос':<24} {'линейно':>10} {'индекс':>10}  результат (линейно / индекс)")
+    for name, text in sample_queries(locations):
+        linear = measure(lambda: linear_match(locations, text), args.repeats)
+        indexed = measure(lambda: index.match(text), args.repeats)
+        print(f"  {name:<24} {linear * 1e6:>10.1f} {indexed * 1e6:>10.1f}  "
+              f"{linear_match(locations, text)!r} / {index.match(text)!r}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+# scalar_api.py
+"""Накладные расходы на вызов: fetch + DataFrame.iloc против fetch_scalar / fetch_one
+
+Кэш запросов отключен (use_cache=False), чтобы сравнивать именно путь чтения.
+
+Запуск: python benchmarks/scalar_api.py [путь к базе] [повторы]
+"""
+import asyncio
+import statistics
+import time
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database import DatabaseManager
+
+# (название, SQL); типичные запросы инструментов с одним числом в ответе
+QUERIES = [
+    ('SELECT 1', "SELECT 1 as value", ()),
+    ('COUNT(*) сервиса', "SELECT COUNT(*) as count FROM hr_data_clean WHERE report_date = ? AND service = ?",
+     ('report_date', 'service')),
+    ('AVG(fte) по полу', "SELECT AVG(fte) as avg_fte FROM hr_data_clean WHERE report_date = ? AND sex = ?",
+     ('report_date', 'sex')),
+]
+
+
+async def measure(call, repeats):
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        await call()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+
+async def run(db_path, repeats):
+    db = DatabaseManager(db_path)
+    sample = db.execute_one(
+        "SELECT report_date, service, sex FROM hr_data_clean "
+        "WHERE report_date = (SELECT MAX(report_date) FROM hr_data_clean) LIMIT 1",
+        named=True, use_cache=False
+    )
+    values = sample._asdict()
+
+    print(f"Медиана из {repeats} вызовов, мкс:")
+    print(f"  {'запрос':<20} {'fetch+iloc':>12} {'fetch_one':>12} {'fetch_scalar':>12}")
+    for name, query, param_names in QUERIES:
+        params = tuple(values[param] for param in param_names)
+
+        async def via_frame():
+            return (await db.fetch(query, params, use_cache=False)).iloc[0, 0]
+
+        async def via_one():
+            return (await db.fetch_one(query, params, named=True, use_cache=False))[0]
+
+        async def via_scalar():
+            return await db.fetch_scalar(query, params, use_cache=False)
+
+        frame = await measure(via_frame, repeats)
+        one = await measure(via_one, repeats)
+        scalar = await measure(via_scalar, repeats)
+        print(f"  {name:<20} {frame * 1e6:>12.0f} {one * 1e6:>12.0f} {scalar * 1e6:>12.0f}"
+              f"   x{frame / scalar:.1f}")
+
+
+def main(db_path, repeats=200):
+    asyncio.run(run(db_path, repeats))
+    DatabaseManager.close_all()
+
+
+if __name__ == "__main__":
+    from config import DB_PATH
+    db_path = sys.argv[1] if len(sys.argv) > 1 else DB_PATH
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    main(db_path, repeats)
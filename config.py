@@ -7,8 +7,6 @@ load_dotenv()
 
 BASE_DIR = Path(__file__).parent
 DB_PATH = os.path.join(BASE_DIR, "hr_metrics.db")
-PLOT_DIR = os.path.join(BASE_DIR, "plots")
-os.makedirs(PLOT_DIR, exist_ok=True)
 
 BOT_TOKEN = os.getenv('BOT_TOKEN')
 if not BOT_TOKEN:
@@ -44,3 +42,83 @@ EXPERIENCE_ORDER = [
 LOG_LEVEL = "INFO"
 LOG_FILE = os.path.join(BASE_DIR, "logs", "hr_bot.log")
 os.makedirs(os.path.dirname(LOG_FILE), exist_ok=True)
+
+
+# Пул соединений SQLite (database.DatabaseManager)
+DB_POOL_SIZE = 8
+DB_POOL_TIMEOUT = 10
+DB_HEALTHCHECK_INTERVAL = 60
+DB_PRAGMAS = {
+    'cache_size': -65536,      # 64 МБ страничного кэша на соединение
+    'mmap_size': 268435456,    # 256 МБ memory-mapped I/O
+    'temp_store': 'MEMORY'
+}
+
+# Асинхронные запросы из ai_core (DatabaseManager.fetch)
+DB_EXECUTOR_WORKERS = 8
+DB_QUERY_TIMEOUT = 20
+
+# Выполнение отчетов меню вне event loop (menu.report_executor.ReportExecutor)
+REPORT_MAX_CONCURRENT = 4
+REPORT_QUERY_WORKERS = 4
+REPORT_JOB_TIMEOUT = 60
+
+# Рендеринг графиков (menu.chart_renderer.ChartRenderer): пул процессов с прогретыми matplotlib и шрифтами
+PLOT_WORKERS = 2
+# Telegram уменьшает фото до 2560 точек по длинной стороне: 12 дюймов * 200 dpi = 2400 - без потерь
+PLOT_DPI = 200
+PLOT_FORMAT = 'png'        # 'png', 'webp' или 'jpeg'
+PLOT_FIGSIZE = (12, 8)
+
+# Графики отчетов в памяти до нажатия "Показать графики" (menu.plot_store.PlotStore)
+PLOT_STORE_TTL = 900                        # секунд
+PLOT_STORE_MAX_BYTES = 64 * 1024 * 1024     # самые старые графики вытесняются сверх лимита
+# Графики отчета строятся в фоне через столько секунд после отчета, если пользователь еще в нем
+# (menu.lazy_plots.LazyPlotRenderer); None - только по кнопке
+PLOT_PREFETCH_DELAY = 3.0
+# file_id загруженных графиков по отпечатку данных (menu.chart_cache.ChartCache); сбрасывается
+# при изменении базы
+CHART_CACHE_SIZE = 512
+# Лимиты отправки в Telegram (menu.telegram_sender.TelegramSender)
+TELEGRAM_CHAT_INTERVAL = 1.0   # секунд на сообщение в одном чате
+TELEGRAM_GLOBAL_RATE = 25      # запросов в секунду на бота
+TELEGRAM_SEND_RETRIES = 3      # повторов после RetryAfter
+
+# Кэш результатов запросов (database.QueryCache); сбрасывается при изменении базы
+DB_CACHE_ENABLED = True
+DB_CACHE_SIZE = 256        # записей в LRU
+DB_CACHE_TTL = 300         # секунд
+DB_CACHE_MAX_ROWS = 50000  # большие выборки не кэшируются
+
+# Колоночный снимок последнего среза в памяти для инструментов ИИ (ai_core.snapshot_engine);
+# требует включенного кэша запросов - по нему отслеживается версия данных
+SNAPSHOT_ENGINE_ENABLED = True
+# Снимки сохраняются в файлы Arrow (storage.snapshot_cache) и после перезапуска читаются через memory map;
+# файл пересобирается, когда меняются данные его среза
+SNAPSHOT_CACHE_ENABLED = True
+SNAPSHOT_CACHE_DIR = os.path.join(BASE_DIR, "snapshots")
+
+# Загрузка месячных выгрузок (storage.ingest)
+INGEST_CHUNK_SIZE = 50000
+# (верхняя граница не включительно, категория); старше последней границы - последняя категория
+AGE_CATEGORY_BOUNDS = [(25, '18-25 лет'), (40, '25-40 лет'), (60, '40-60 лет'), (None, '60+ лет')]
+# Стаж в месяцах, категории в порядке EXPERIENCE_ORDER
+EXPERIENCE_CATEGORY_BOUNDS = [
+    (2, '1 мес'), (3, '2 мес'), (4, '3 мес'), (12, 'до 1 года'),
+    (24, '1-2 года'), (36, '2-3 года'), (60, '3-5 лет'), (None, 'более 5 лет')
+]
+
+# Статистика запросов (database.QueryStats): время выполнения последних запросов и журнал медленных
+DB_QUERY_STATS_ENABLED = True
+DB_QUERY_STATS_SIZE = 10000            # запросов в кольцевом буфере
+DB_SLOW_QUERY_MS = 200                 # порог медленного запроса, мс
+DB_SLOW_QUERY_LOG = os.path.join(BASE_DIR, "logs", "slow_queries.log")
+DB_QUERY_STATS_FILE = os.path.join(BASE_DIR, "logs", "query_stats.json")
+DB_QUERY_STATS_SAVE_INTERVAL = 60      # секунд между сохранениями буфера для python database.py stats
+
+# Движок чтения (database.DatabaseManager): 'sqlite' или 'duckdb' - колоночный, для длинной истории
+# (storage.backends); запись, миграции и загрузка всегда идут в файл SQLite
+DB_BACKEND = 'sqlite'
+DUCKDB_SOURCE = 'sqlite'   # 'sqlite' - таблицы файла базы копируются в память; 'parquet' - выгрузка в DUCKDB_PARQUET_DIR
+DUCKDB_PARQUET_DIR = os.path.join(BASE_DIR, "parquet")
+DUCKDB_THREADS = 4
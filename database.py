@@ -1,25 +1,761 @@
 # database.py
+import os
+import re
+import json
+import math
+import asyncio
 import sqlite3
+import threading
+import time
+import logging
+from collections import OrderedDict, deque, namedtuple
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from queue import LifoQueue, Empty
 import pandas as pd
+from config import (DB_POOL_SIZE, DB_POOL_TIMEOUT, DB_HEALTHCHECK_INTERVAL, DB_PRAGMAS,
+                    DB_EXECUTOR_WORKERS, DB_QUERY_TIMEOUT,
+                    DB_CACHE_ENABLED, DB_CACHE_SIZE, DB_CACHE_TTL, DB_CACHE_MAX_ROWS,
+                    DB_QUERY_STATS_ENABLED, DB_QUERY_STATS_SIZE, DB_SLOW_QUERY_MS, DB_SLOW_QUERY_LOG,
+                    DB_QUERY_STATS_FILE, DB_QUERY_STATS_SAVE_INTERVAL, DB_BACKEND)
+
+logger = logging.getLogger(__name__)
+slow_logger = logging.getLogger(__name__ + '.slow')
+
+
+class QueryTimeoutError(TimeoutError):
+    pass
+
+
+class _QueryJob:
+    """Запрос, выполняемый в пуле потоков; позволяет прервать его из event loop"""
+
+    def __init__(self):
+        self.conn = None
+        self.cancelled = False
+        self._lock = threading.Lock()
+
+    def attach(self, conn):
+        with self._lock:
+            if self.cancelled:
+                raise asyncio.CancelledError()
+            self.conn = conn
+
+    def detach(self):
+        with self._lock:
+            self.conn = None
+
+    def cancel(self):
+        with self._lock:
+            self.cancelled = True
+            if self.conn is not None:
+                self.conn.interrupt()
+
+
+def _format_plan(plan):
+    """EXPLAIN QUERY PLAN деревом, как в sqlite3 .eqp"""
+    depth = {0: -1}
+    lines = []
+    for node_id, parent, _, detail in plan:
+        depth[node_id] = depth.get(parent, -1) + 1
+        lines.append('  ' * depth[node_id] + detail)
+    return '\n'.join(lines)
+
+
+class ConnectionPool:
+    """Ограниченный пул read-only соединений SQLite для одного файла базы"""
+
+    def __init__(self, db_path, max_size=DB_POOL_SIZE, timeout=DB_POOL_TIMEOUT,
+                 pragmas=None, healthcheck_interval=DB_HEALTHCHECK_INTERVAL):
+        self.db_path = db_path
+        self.max_size = max_size
+        self.timeout = timeout
+        self.pragmas = dict(DB_PRAGMAS if pragmas is None else pragmas)
+        self.healthcheck_interval = healthcheck_interval
+        self._idle = LifoQueue()
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._local = threading.local()
+        self._size = 0
+        self._generation = 0
+        self._born = {}
+        self._enable_wal()
+
+    def _enable_wal(self):
+        """WAL хранится в самом файле базы, поэтому включаем его один раз через запись"""
+        if self.db_path == ':memory:' or not os.path.exists(self.db_path):
+            return
+        try:
+            conn = sqlite3.connect(self.db_path)
+            try:
+                mode = conn.execute("PRAGMA journal_mode=WAL").fetchone()[0]
+                if str(mode).lower() != 'wal':
+                    logger.warning(f"Не удалось включить WAL для {self.db_path}: journal_mode={mode}")
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            logger.warning(f"Не удалось включить WAL для {self.db_path}: {e}")
+
+    def _open(self):
+        if self.db_path == ':memory:':
+            conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        else:
+            uri = Path(self.db_path).resolve().as_uri() + '?mode=ro'
+            conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name}={value}")
+        conn.execute("PRAGMA query_only=1")
+        with self._lock:
+            self._size += 1
+            self._born[id(conn)] = self._generation
+        return conn
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+        with self._lock:
+            self._size -= 1
+            self._born.pop(id(conn), None)
+
+    def _is_healthy(self, conn):
+        try:
+            conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error as e:
+            logger.warning(f"Соединение из пула не прошло проверку и будет пересоздано: {e}")
+            return False
+
+    def _take(self):
+        if not self._slots.acquire(timeout=self.timeout):
+            raise TimeoutError(f"Пул соединений исчерпан ({self.max_size}), ожидание {self.timeout} с")
+        try:
+            while True:
+                try:
+                    conn, released_at = self._idle.get_nowait()
+                except Empty:
+                    return self._open()
+                if time.monotonic() - released_at < self.healthcheck_interval or self._is_healthy(conn):
+                    return conn
+                self._discard(conn)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def _give_back(self, conn, broken=False):
+        if broken or self._born.get(id(conn)) != self._generation:
+            self._discard(conn)
+        else:
+            self._idle.put((conn, time.monotonic()))
+        self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        """Выдать соединение; вложенные вызовы в том же потоке получают то же соединение"""
+        held = getattr(self._local, 'conn', None)
+        if held is not None:
+            yield held
+            return
+        conn = self._take()
+        self._local.conn = conn
+        broken = False
+        try:
+            yield conn
+        except Exception:
+            broken = not self._is_healthy(conn)
+            raise
+        finally:
+            self._local.conn = None
+            self._give_back(conn, broken)
+
+    @staticmethod
+    def read_frame(conn, query, params):
+        if params:
+            return pd.read_sql_query(query, conn, params=params)
+        return pd.read_sql_query(query, conn)
+
+    @staticmethod
+    def read_rows(conn, query, params):
+        """(имена колонок, кортеж строк) курсором, без pandas"""
+        cursor = conn.execute(query, params or ())
+        rows = tuple(cursor.fetchall())
+        return tuple(column[0] for column in cursor.description or ()), rows
+
+    @staticmethod
+    def explain(conn, query, params):
+        return _format_plan(conn.execute(f"EXPLAIN QUERY PLAN {query}", params or ()).fetchall())
+
+    def recycle(self):
+        """Файл базы подменили: закрыть простаивающие соединения, выданные закрыть по возврату"""
+        with self._lock:
+            self._generation += 1
+        self.close()
+
+    def close(self):
+        while True:
+            try:
+                conn, _ = self._idle.get_nowait()
+            except Empty:
+                break
+            self._discard(conn)
+
+    def stats(self):
+        return {
+            'size': self._size,
+            'idle': self._idle.qsize(),
+            'max_size': self.max_size
+        }
+
+
+# Результаты таких запросов зависят не только от данных, кэшировать их нельзя
+_NON_DETERMINISTIC = re.compile(r"random\s*\(|'now'|current_(date|time|timestamp)", re.IGNORECASE)
+
+
+def _copy_result(result):
+    """DataFrame изменяем, его отдаем копией; строки хранятся кортежем (колонки, строки) и не копируются"""
+    return result.copy() if isinstance(result, pd.DataFrame) else result
+
+
+def _result_size(result):
+    return len(result) if isinstance(result, pd.DataFrame) else len(result[1])
+
+
+@lru_cache(maxsize=256)
+def _row_class(columns):
+    return namedtuple('Row', columns, rename=True)
+
+
+def _as_rows(columns, rows, named):
+    if not named:
+        return list(rows)
+    row_class = _row_class(columns)
+    return [row_class(*row) for row in rows]
+
+
+class QueryCache:
+    """LRU-кэш результатов запросов с TTL, привязанный к версии данных файла базы.
+
+    Версия = PRAGMA data_version отдельного соединения-наблюдателя (меняется при любом
+    коммите из других соединений и процессов) + идентичность и mtime файла (ловит подмену
+    файла новой выгрузкой)."""
+
+    def __init__(self, db_path, max_size=DB_CACHE_SIZE, ttl=DB_CACHE_TTL, max_rows=DB_CACHE_MAX_ROWS,
+                 on_file_replaced=None):
+        self.db_path = db_path
+        self.max_size = max_size
+        self.ttl = ttl
+        self.max_rows = max_rows
+        self.on_file_replaced = on_file_replaced
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._watcher = None
+        self._file_id = None
+        self._version = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def make_key(query, params, kind='frame'):
+        """Ключ кэша: вид результата + SQL без лишних пробелов + параметры; None, если кэшировать нельзя"""
+        normalized = ' '.join(query.split())
+        if _NON_DETERMINISTIC.search(normalized):
+            return None
+        key = (kind, normalized, tuple(params) if params else ())
+        try:
+            hash(key)
+        except TypeError:
+            return None
+        return key
+
+    def _file_identity(self):
+        try:
+            st = os.stat(self.db_path)
+        except OSError:
+            return None
+        return st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns
+
+    def _open_watcher(self):
+        if self._watcher is not None:
+            try:
+                self._watcher.close()
+            except sqlite3.Error:
+                pass
+        uri = Path(self.db_path).resolve().as_uri() + '?mode=ro'
+        self._watcher = sqlite3.connect(uri, uri=True, check_same_thread=False)
+
+    def _check_version(self):
+        """Сбросить кэш, если данные изменились; вызывается под self._lock"""
+        identity = self._file_identity()
+        replaced = self._file_id is not None and (identity is None or identity[:2] != self._file_id[:2])
+        try:
+            if self._watcher is None or replaced:
+                self._open_watcher()
+            data_version = self._watcher.execute("PRAGMA data_version").fetchone()[0]
+        except sqlite3.Error as e:
+            logger.warning(f"Не удалось проверить версию данных {self.db_path}: {e}")
+            data_version = None
+        self._file_id = identity
+        version = (identity, data_version)
+        if version != self._version:
+            if self._version is not None:
+                self.invalidations += 1
+                logger.info(f"Данные {self.db_path} изменились, кэш запросов сброшен ({len(self._entries)} записей)")
+            self._entries.clear()
+            self._version = version
+            if replaced and self.on_file_replaced is not None:
+                self.on_file_replaced()
+        return version
+
+    def version(self):
+        """Текущая версия данных файла; меняется при любой записи в базу или подмене файла"""
+        with self._lock:
+            return self._check_version()
+
+    def lookup(self, key):
+        """(копия результата или None, версия данных на момент проверки)"""
+        with self._lock:
+            version = self._check_version()
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None, version
+            stored_at, result = entry
+            if time.monotonic() - stored_at > self.ttl:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None, version
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return _copy_result(result), version
+
+    def store(self, key, result, version):
+        """Сохранить результат, если за время запроса данные не поменялись"""
+        if _result_size(result) > self.max_rows:
+            return
+        with self._lock:
+            if version != self._version:
+                return
+            self._entries[key] = (time.monotonic(), _copy_result(result))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def close(self):
+        with self._lock:
+            self._entries.clear()
+            if self._watcher is not None:
+                self._watcher.close()
+                self._watcher = None
+
+    def stats(self):
+        requests = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / requests, 3) if requests else 0.0,
+            'entries': len(self._entries),
+            'max_size': self.max_size,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'invalidations': self.invalidations
+        }
+
+
+# Литералы заменяются на ?, списки IN (?, ?, ...) сворачиваются: одинаковые по форме запросы
+# из f-строк с разными значениями попадают в один отпечаток
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?(?![\w.])")
+_PLACEHOLDER_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+
+
+@lru_cache(maxsize=4096)
+def query_fingerprint(query):
+    """Нормализованный вид запроса для группировки статистики"""
+    text = ' '.join(query.split())
+    text = _STRING_LITERAL.sub('?', text)
+    text = _NUMBER_LITERAL.sub('?', text)
+    return _PLACEHOLDER_LIST.sub('(?, ...)', text)
+
+
+def _percentile(ordered, fraction):
+    """Перцентиль методом ближайшего ранга по отсортированному списку"""
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def summarize_timings(samples, top=None):
+    """p50/p95/p99 по отпечаткам из записей (время, отпечаток, секунды, строки); сортировка по суммарному времени"""
+    grouped = {}
+    for _, fingerprint, seconds, rows in samples:
+        grouped.setdefault(fingerprint, []).append((seconds, rows))
+    summary = []
+    for fingerprint, calls in grouped.items():
+        durations = sorted(seconds for seconds, _ in calls)
+        counted = [rows for _, rows in calls if rows is not None]
+        summary.append({
+            'fingerprint': fingerprint,
+            'count': len(durations),
+            'p50_ms': round(_percentile(durations, 0.50) * 1000, 2),
+            'p95_ms': round(_percentile(durations, 0.95) * 1000, 2),
+            'p99_ms': round(_percentile(durations, 0.99) * 1000, 2),
+            'max_ms': round(durations[-1] * 1000, 2),
+            'total_ms': round(sum(durations) * 1000, 2),
+            'avg_rows': round(sum(counted) / len(counted), 1) if counted else None,
+            'errors': len(calls) - len(counted)
+        })
+    summary.sort(key=lambda item: item['total_ms'], reverse=True)
+    return summary[:top] if top else summary
+
+
+class QueryStats:
+    """Время выполнения запросов к одному файлу базы: кольцевой буфер последних запросов
+    и журнал медленных запросов с планом выполнения. Ответы из кэша не учитываются."""
+
+    def __init__(self, db_path, size=DB_QUERY_STATS_SIZE, slow_ms=DB_SLOW_QUERY_MS,
+                 stats_file=DB_QUERY_STATS_FILE, save_interval=DB_QUERY_STATS_SAVE_INTERVAL):
+        self.db_path = db_path
+        self.slow_seconds = slow_ms / 1000
+        self.stats_file = stats_file
+        self.save_interval = save_interval
+        self._samples = deque(maxlen=size)
+        self._saved_at = time.monotonic()
+        self._save_lock = threading.Lock()
+        self.slow_count = 0
+
+    def record(self, query, params, seconds, rows, explain=None):
+        """Учесть выполненный запрос; rows=None - запрос завершился ошибкой, explain() - план для журнала"""
+        fingerprint = query_fingerprint(query)
+        self._samples.append((time.time(), fingerprint, seconds, rows))
+        if seconds >= self.slow_seconds:
+            self.slow_count += 1
+            self._log_slow(query, params, seconds, rows, explain)
+        if self.stats_file and time.monotonic() - self._saved_at > self.save_interval:
+            self.save()
+
+    def _log_slow(self, query, params, seconds, rows, explain):
+        try:
+            plan = explain() if explain is not None else ''
+        except Exception as e:
+            plan = f"план недоступен: {e}"
+        outcome = 'ошибка' if rows is None else f"{rows} строк"
+        slow_logger.warning(
+            f"Медленный запрос {seconds * 1000:.0f} мс ({outcome}), база {self.db_path}\n"
+            f"{' '.join(query.split())}\nПараметры: {params!r:.500}\n{plan}"
+        )
+
+    def samples(self):
+        return list(self._samples)
+
+    def summary(self, top=None):
+        return summarize_timings(self.samples(), top)
+
+    def save(self, path=None):
+        """Сохранить буфер в JSON, чтобы статистику работающего бота можно было посмотреть из консоли"""
+        path = path or self.stats_file
+        if not path or not self._save_lock.acquire(blocking=False):
+            return
+        try:
+            self._saved_at = time.monotonic()
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'db_path': self.db_path, 'samples': self.samples()}, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Не удалось сохранить статистику запросов в {path}: {e}")
+        finally:
+            self._save_lock.release()
+
+    def clear(self):
+        self._samples.clear()
+        self.slow_count = 0
+
+
+def _setup_slow_log():
+    """Медленные запросы дополнительно пишутся в отдельный файл"""
+    if not DB_SLOW_QUERY_LOG or slow_logger.handlers:
+        return
+    os.makedirs(os.path.dirname(DB_SLOW_QUERY_LOG), exist_ok=True)
+    handler = logging.FileHandler(DB_SLOW_QUERY_LOG, encoding='utf-8')
+    handler.setFormatter(logging.Formatter('%(asctime)s - %(message)s'))
+    slow_logger.addHandler(handler)
+
 
 class DatabaseManager:
-    def __init__(self, db_path):
+    # 'sqlite' или 'duckdb'; запись (get_connection) всегда идет в файл SQLite
+    default_backend = DB_BACKEND
+    _pools = {}
+    _caches = {}
+    _stats = {}
+    _pools_lock = threading.Lock()
+    _executor = None
+
+    def __init__(self, db_path, backend=None):
         self.db_path = db_path
-    
+        self.backend = backend or self.default_backend
+        self.pool = self._get_pool(db_path, self.backend)
+        self.cache = self._get_cache(db_path, self.backend)
+        self.stats = self._get_stats(db_path, self.backend)
+
+    @staticmethod
+    def _registry_key(db_path, backend):
+        return backend, db_path if db_path == ':memory:' else os.path.abspath(db_path)
+
+    @classmethod
+    def _get_pool(cls, db_path, backend='sqlite'):
+        key = cls._registry_key(db_path, backend)
+        with cls._pools_lock:
+            pool = cls._pools.get(key)
+            if pool is None:
+                if backend == 'duckdb':
+                    from storage.backends import DuckDBPool
+                    pool = DuckDBPool(db_path)
+                elif backend == 'sqlite':
+                    pool = ConnectionPool(db_path)
+                else:
+                    raise ValueError(f"Неизвестный движок базы данных: {backend}")
+                cls._pools[key] = pool
+            return pool
+
+    @classmethod
+    def _get_cache(cls, db_path, backend='sqlite'):
+        if not DB_CACHE_ENABLED or db_path == ':memory:':
+            return None
+        pool = cls._get_pool(db_path, backend)
+        key = cls._registry_key(db_path, backend)
+        with cls._pools_lock:
+            cache = cls._caches.get(key)
+            if cache is None:
+                cache = QueryCache(db_path, on_file_replaced=pool.recycle)
+                cls._caches[key] = cache
+            return cache
+
+    @classmethod
+    def _get_stats(cls, db_path, backend='sqlite'):
+        if not DB_QUERY_STATS_ENABLED:
+            return None
+        key = cls._registry_key(db_path, backend)
+        with cls._pools_lock:
+            stats = cls._stats.get(key)
+            if stats is None:
+                _setup_slow_log()
+                stats = QueryStats(db_path if backend == 'sqlite' else f"{db_path} ({backend})")
+                cls._stats[key] = stats
+            return stats
+
+    @classmethod
+    def _get_executor(cls):
+        with cls._pools_lock:
+            if cls._executor is None:
+                cls._executor = ThreadPoolExecutor(max_workers=DB_EXECUTOR_WORKERS,
+                                                   thread_name_prefix='db-query')
+            return cls._executor
+
+    @classmethod
+    def close_all(cls):
+        with cls._pools_lock:
+            for pool in cls._pools.values():
+                pool.close()
+            cls._pools.clear()
+            for cache in cls._caches.values():
+                cache.close()
+            cls._caches.clear()
+            for stats in cls._stats.values():
+                stats.save()
+            cls._stats.clear()
+            if cls._executor is not None:
+                cls._executor.shutdown(wait=False, cancel_futures=True)
+                cls._executor = None
+
     def get_connection(self):
+        """Отдельное соединение на запись (миграции, загрузка данных), не из пула"""
         return sqlite3.connect(self.db_path)
-    
-    def execute_query(self, query, params=None):
-        with self.get_connection() as conn:
-            if params:
-                if isinstance(params, dict):
-                    params = tuple(params.values())
-                elif not isinstance(params, (tuple, list)):
-                    params = (params,)
-                
-                if isinstance(params, list):
-                    params = tuple(params)
-                    
-                return pd.read_sql_query(query, conn, params=params)
-            else:
-                return pd.read_sql_query(query, conn)
\ No newline at end of file
+
+    def data_version(self):
+        """Версия данных для внешних кэшей (снимки в памяти); None, если кэш запросов выключен"""
+        return self.cache.version() if self.cache is not None else None
+
+    def cache_stats(self):
+        return self.cache.stats() if self.cache is not None else {}
+
+    def query_stats(self, top=None):
+        """p50/p95/p99 времени выполнения по отпечаткам запросов, самые затратные первыми"""
+        return self.stats.summary(top) if self.stats is not None else []
+
+    def partitions(self):
+        """Помесячные партиции hr_data_clean по порядку месяцев; пустой список - читать само hr_data_clean.
+
+        DuckDB хранит hr_data_clean одной колоночной таблицей, база до миграции 4 - тоже"""
+        if self.backend != 'sqlite':
+            return []
+        from storage.schema import PARTITION_PATTERN, PARTITION_TEMPLATE
+        try:
+            rows = self.execute_rows(
+                "SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE ? ESCAPE '\\' "
+                "AND name != ? ORDER BY name", (PARTITION_PATTERN, PARTITION_TEMPLATE)
+            )
+        except Exception as e:
+            logger.debug(f"Список партиций недоступен, читаем hr_data_clean: {e}")
+            return []
+        return [row[0] for row in rows]
+
+    def _timed(self, conn, query, params, execute):
+        """Выполнить запрос, учитывая время и число строк в статистике"""
+        if self.stats is None:
+            return execute(conn, query, params)
+        started = time.perf_counter()
+        result = None
+        try:
+            result = execute(conn, query, params)
+            return result
+        finally:
+            rows = None if result is None else _result_size(result)
+            self.stats.record(query, params, time.perf_counter() - started, rows,
+                              lambda: self.pool.explain(conn, query, params))
+
+    @staticmethod
+    def _normalize_params(params):
+        if params:
+            if isinstance(params, dict):
+                params = tuple(params.values())
+            elif not isinstance(params, (tuple, list)):
+                params = (params,)
+
+            if isinstance(params, list):
+                params = tuple(params)
+        return params
+
+    def _cached(self, query, params, use_cache, kind='frame'):
+        """(ключ, версия данных, результат из кэша); ключ None - запрос идет мимо кэша"""
+        if not use_cache or self.cache is None:
+            return None, None, None
+        key = self.cache.make_key(query, params, kind)
+        if key is None:
+            return None, None, None
+        result, version = self.cache.lookup(key)
+        return key, version, result
+
+    def _read(self, query, params, key=None, version=None):
+        with self.pool.connection() as conn:
+            result = self._timed(conn, query, params, self.pool.read_frame)
+        if key is not None:
+            self.cache.store(key, result, version)
+        return result
+
+    def _read_rows(self, query, params, key=None, version=None):
+        """Прочитать строки курсором, без pandas: (имена колонок, кортеж строк)"""
+        with self.pool.connection() as conn:
+            result = self._timed(conn, query, params, self.pool.read_rows)
+        if key is not None:
+            self.cache.store(key, result, version)
+        return result
+
+    def _rows(self, query, params, use_cache):
+        params = self._normalize_params(params)
+        key, version, cached = self._cached(query, params, use_cache, 'rows')
+        if cached is not None:
+            return cached
+        return self._read_rows(query, params, key, version)
+
+    async def _rows_async(self, query, params, use_cache, timeout):
+        params = self._normalize_params(params)
+        key, version, cached = self._cached(query, params, use_cache, 'rows')
+        if cached is not None:
+            return cached
+        return await self._run_async(self._read_rows, query, params, key, version, timeout=timeout)
+
+    def execute_rows(self, query, params=None, named=False, use_cache=True):
+        """Строки результата кортежами (named=True - namedtuple с именами колонок)"""
+        columns, rows = self._rows(query, params, use_cache)
+        return _as_rows(columns, rows, named)
+
+    def execute_one(self, query, params=None, named=False, use_cache=True):
+        """Первая строка результата или None"""
+        columns, rows = self._rows(query, params, use_cache)
+        return _as_rows(columns, rows[:1], named)[0] if rows else None
+
+    def execute_scalar(self, query, params=None, default=None, use_cache=True):
+        """Первое значение первой строки; default, если строк нет"""
+        _, rows = self._rows(query, params, use_cache)
+        return rows[0][0] if rows else default
+
+    async def fetch_rows(self, query, params=None, named=False, timeout=DB_QUERY_TIMEOUT, use_cache=True):
+        columns, rows = await self._rows_async(query, params, use_cache, timeout)
+        return _as_rows(columns, rows, named)
+
+    async def fetch_one(self, query, params=None, named=False, timeout=DB_QUERY_TIMEOUT, use_cache=True):
+        columns, rows = await self._rows_async(query, params, use_cache, timeout)
+        return _as_rows(columns, rows[:1], named)[0] if rows else None
+
+    async def fetch_scalar(self, query, params=None, default=None, timeout=DB_QUERY_TIMEOUT, use_cache=True):
+        _, rows = await self._rows_async(query, params, use_cache, timeout)
+        return rows[0][0] if rows else default
+
+    def execute_query(self, query, params=None, use_cache=True):
+        params = self._normalize_params(params)
+        key, version, cached = self._cached(query, params, use_cache)
+        if cached is not None:
+            return cached
+        return self._read(query, params, key, version)
+
+    async def fetch(self, query, params=None, timeout=DB_QUERY_TIMEOUT, use_cache=True):
+        """Асинхронный execute_query: выполняется в пуле потоков и не блокирует event loop"""
+        params = self._normalize_params(params)
+        key, version, cached = self._cached(query, params, use_cache)
+        if cached is not None:
+            return cached
+        return await self._run_async(self._read, query, params, key, version, timeout=timeout)
+
+    async def _run_async(self, func, *args, timeout=DB_QUERY_TIMEOUT):
+        loop = asyncio.get_running_loop()
+        job = _QueryJob()
+        future = loop.run_in_executor(self._get_executor(), self._run_job, job, func, args)
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            job.cancel()
+            raise QueryTimeoutError(f"Запрос к базе данных превысил таймаут {timeout} с")
+        except asyncio.CancelledError:
+            job.cancel()
+            raise
+
+    def _run_job(self, job, func, args):
+        with self.pool.connection() as conn:
+            job.attach(conn)
+            try:
+                return func(*args)
+            finally:
+                job.detach()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Статистика времени выполнения запросов работающего бота")
+    parser.add_argument('command', nargs='?', default='stats', choices=['stats'])
+    parser.add_argument('--file', default=DB_QUERY_STATS_FILE, help="буфер, сохраненный QueryStats.save")
+    parser.add_argument('--top', type=int, default=20)
+    parser.add_argument('--match', help="показать только отпечатки, содержащие строку")
+    args = parser.parse_args()
+
+    with open(args.file, encoding='utf-8') as f:
+        saved = json.load(f)
+    samples = saved['samples']
+    if args.match:
+        samples = [sample for sample in samples if args.match.lower() in sample[1].lower()]
+    print(f"База {saved['db_path']}: {len(samples)} запросов")
+    for item in summarize_timings(samples, args.top):
+        print(f"\n{item['count']:>6} вызовов  p50 {item['p50_ms']:>8.1f}  p95 {item['p95_ms']:>8.1f}  "
+              f"p99 {item['p99_ms']:>8.1f}  max {item['max_ms']:>8.1f}  всего {item['total_ms']:>9.0f} мс  "
+              f"строк {item['avg_rows']}, ошибок {item['errors']}")
+        print(f"  {item['fingerprint'][:300]}")
@@ -0,0 +1,98 @@
+# chart_cache.py
+import hashlib
+import logging
+import os
+import sys
+import threading
+from collections import OrderedDict
+import pandas as pd
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import CHART_CACHE_SIZE
+
+logger = logging.getLogger(__name__)
+
+
+def _feed(digest, value):
+    """Отпечаток данных графика: таблицы - по значениям, индексу, колонкам и типам"""
+    if isinstance(value, pd.DataFrame):
+        digest.update(repr((list(value.columns), [str(dtype) for dtype in value.dtypes])).encode('utf-8'))
+        digest.update(pd.util.hash_pandas_object(value, index=True).values.tobytes())
+    elif isinstance(value, dict):
+        for key in sorted(value, key=str):
+            digest.update(repr(key).encode('utf-8'))
+            _feed(digest, value[key])
+    elif isinstance(value, (list, tuple)):
+        digest.update(f"[{len(value)}".encode('utf-8'))
+        for item in value:
+            _feed(digest, item)
+    else:
+        digest.update(repr(value).encode('utf-8'))
+
+
+def spec_fingerprint(spec):
+    """Хэш описания графиков (menu.plotting.plot_spec): тип, параметры и данные"""
+    digest = hashlib.blake2b(digest_size=16)
+    _feed(digest, {'kind': spec['kind'], 'options': spec['options'], 'data': spec['data']})
+    return digest.hexdigest()
+
+
+class ChartCache:
+    """file_id уже загруженных в Telegram графиков по отпечатку их описания.
+
+    Одинаковые графики (демография на одну отчетную дату) второй раз не рендерятся и не
+    загружаются: Telegram принимает file_id вместо файла. Кэш на файл базы; очищается, когда
+    меняется версия данных (DatabaseManager.data_version). Без версии данных не кэширует"""
+    _caches = {}
+    _caches_lock = threading.Lock()
+
+    def __init__(self, db, size=CHART_CACHE_SIZE):
+        self.db = db
+        self.size = size
+        self._entries = OrderedDict()   # отпечаток -> [file_id]
+        self._version = None
+        self.metrics = {'hits': 0, 'misses': 0, 'invalidations': 0}
+
+    @classmethod
+    def for_database(cls, db):
+        key = (db.backend, os.path.abspath(db.db_path))
+        with cls._caches_lock:
+            cache = cls._caches.get(key)
+            if cache is None:
+                cache = cls(db)
+                cls._caches[key] = cache
+            return cache
+
+    def _current_version(self):
+        version = self.db.data_version()
+        if version != self._version:
+            if self._entries:
+                self.metrics['invalidations'] += 1
+                logger.info(f"Данные изменились: сброшено {len(self._entries)} графиков из кэша file_id")
+            self._entries.clear()
+            self._version = version
+        return version
+
+    def get(self, spec):
+        """file_id графиков описания или None"""
+        if spec is None or self._current_version() is None:
+            return None
+        fingerprint = spec_fingerprint(spec)
+        file_ids = self._entries.get(fingerprint)
+        if file_ids is None:
+            self.metrics['misses'] += 1
+            return None
+        self._entries.move_to_end(fingerprint)
+        self.metrics['hits'] += 1
+        return file_ids
+
+    def put(self, spec, file_ids):
+        if spec is None or not file_ids or None in file_ids or self._current_version() is None:
+            return
+        fingerprint = spec_fingerprint(spec)
+        self._entries[fingerprint] = list(file_ids)
+        self._entries.move_to_end(fingerprint)
+        while len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+
+    def stats(self):
+        return dict(self.metrics, entries=len(self._entries), version=self._version)
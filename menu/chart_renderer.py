@@ -0,0 +1,89 @@
+# chart_renderer.py
+import asyncio
+import logging
+import multiprocessing
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import PLOT_WORKERS, PLOT_DPI, PLOT_FORMAT, REPORT_JOB_TIMEOUT
+from menu.plotting import PLOT_FORMATS, render_plot_spec, warm_up
+from menu.report_executor import ReportTimeoutError
+
+logger = logging.getLogger(__name__)
+
+
+def _ready():
+    """Пустая задача: процесс пула запущен и прогрет"""
+    return os.getpid()
+
+
+class ChartRenderer:
+    """Рендеринг графиков в пуле процессов.
+
+    Каждый процесс при запуске загружает matplotlib, seaborn и шрифты и строит макеты всех шаблонов
+    (menu.plotting.warm_up); дальше графики рисуются через Figure/Agg на переиспользуемых фигурах.
+    DPI и формат (png, webp, jpeg) задаются на пул"""
+
+    def __init__(self, workers=PLOT_WORKERS, dpi=PLOT_DPI, image_format=PLOT_FORMAT, timeout=REPORT_JOB_TIMEOUT):
+        if image_format not in PLOT_FORMATS:
+            raise ValueError(f"Формат графиков {image_format!r} не поддерживается: {', '.join(PLOT_FORMATS)}")
+        self.workers = workers
+        self.dpi = dpi
+        self.image_format = image_format
+        self.timeout = timeout
+        self._pool = None
+        self._latencies = deque(maxlen=1000)
+        self.metrics = {'specs': 0, 'charts': 0, 'failed': 0, 'timed_out': 0}
+
+    def _get_pool(self):
+        # spawn: fork процесса с потоками бота и пулом соединений небезопасен
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=warm_up,
+                initargs=(self.dpi, self.image_format)
+            )
+        return self._pool
+
+    async def start(self):
+        """Запустить и прогреть все процессы до первого запроса (при старте бота)"""
+        started = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        pool = self._get_pool()
+        pids = await asyncio.gather(*(loop.run_in_executor(pool, _ready) for _ in range(self.workers)))
+        logger.info(f"Рендеринг графиков: {len(set(pids))} процессов прогреты за "
+                    f"{time.perf_counter() - started:.1f} с ({self.image_format}, {self.dpi} dpi)")
+
+    async def render(self, spec):
+        """Графики описания (menu.plotting.plot_spec) - список байтов изображений"""
+        started = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        try:
+            plots = await asyncio.wait_for(loop.run_in_executor(self._get_pool(), render_plot_spec, spec), self.timeout)
+        except asyncio.TimeoutError:
+            self.metrics['timed_out'] += 1
+            logger.error(f"Графики {spec['kind']} рендерятся дольше {self.timeout} с")
+            raise ReportTimeoutError(f"Графики строятся дольше {self.timeout} с, попробуйте позже")
+        except Exception:
+            self.metrics['failed'] += 1
+            raise
+        elapsed = time.perf_counter() - started
+        self._latencies.append(elapsed)
+        self.metrics['specs'] += 1
+        self.metrics['charts'] += len(plots)
+        logger.info(f"Графики {spec['kind']}: {len(plots)} шт. за {elapsed:.2f} с")
+        return plots
+
+    def stats(self):
+        latencies = sorted(self._latencies)
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] if latencies else None
+        return dict(self.metrics, workers=self.workers, dpi=self.dpi, format=self.image_format, p95=p95)
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
@@ -1,8 +1,9 @@
 # context.py
 class AnalysisContext:
     def __init__(self, analyzer, menu_commands, show_main_menu_func, 
-                 select_detailed_const, select_hiring_const, end_const):
+                 select_detailed_const, select_hiring_const, end_const, executor):
         self.analyzer = analyzer
+        self.executor = executor
         self.menu_commands = menu_commands
         self.show_main_menu_func = show_main_menu_func
         self.select_detailed_const = select_detailed_const
@@ -1,10 +1,10 @@
 # core_handlers.py
 import asyncio
-import os
 import logging
 from telegram import Update, ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.constants import ChatAction
 from telegram.ext import ContextTypes
+from menu.telegram_sender import TelegramSender
 
 MAIN_MENU_TEXT = "📈 HR Бот запущен\n\nВыберите тип анализа или задайте вопрос Эйчарику💡:"
 CHOOSE_SERVICE_TEXT = "Выберите сервис для детального анализа:"
@@ -14,8 +14,14 @@ RETURN_TO_MENU_TEXT = "Возврат в главное меню"
 CHOOSE_FROM_MENU_TEXT = "Выберите действие из меню:"
 LOADING_TEXT = "⏳ Загружаю данные... Это может занять несколько секунд"
 
+# Состояния ConversationHandler (telegram_bot импортирует их отсюда)
+SELECT_ACTION, SELECT_DETAILED, SELECT_HIRING_SERVICE, AI_ASSISTANT = range(4)
+
 logger = logging.getLogger(__name__)
 
+# Один на бота: лимиты Telegram общие для всех чатов
+chart_sender = TelegramSender()
+
 async def show_typing(update: Update):
     try:
         if hasattr(update, 'message'):
@@ -46,7 +52,12 @@ async def delete_message(update: Update, message_id: int):
     except Exception as e:
         logger.error(f"Ошибка удаления сообщения: {e}")
 
-async def send_analysis_result(update: Update, result: str, plot_path=None, loading_message_id=None):
+async def send_plots(update: Update, plots):
+    """Отправить графики (байты PNG или file_id уже загруженных) одним альбомом; file_id отправленных"""
+    await show_typing(update)
+    return await chart_sender.send_photos(update.message, list(plots))
+
+async def send_analysis_result(update: Update, result: str, plots=None, loading_message_id=None):
     if loading_message_id:
         await delete_message(update, loading_message_id)
     
@@ -58,23 +69,11 @@ async def send_analysis_result(update: Update, result: str, plot_path=None, load
     else:
         await update.message.reply_text(result)
     
-    if plot_path:
+    if plots:
         try:
-            if isinstance(plot_path, list):
-                for path in plot_path:
-                    if path and os.path.exists(path):
-                        await show_typing(update)
-                        with open(path, 'rb') as photo:
-                            await update.message.reply_photo(photo=photo)
-                        os.remove(path)
-                        await asyncio.sleep(0.5)
-            elif plot_path and os.path.exists(plot_path):
-                await show_typing(update)
-                with open(plot_path, 'rb') as photo:
-                    await update.message.reply_photo(photo=photo)
-                os.remove(plot_path)
+            await send_plots(update, plots)
         except Exception as e:
-            logger.error(f"Ошибка при отправке/удалении графиков: {e}")
+            logger.error(f"Ошибка при отправке графиков: {e}")
 
 def create_main_keyboard():
     keyboard = [
@@ -146,7 +145,9 @@ async def handle_detailed_analysis(update: Update, context: ContextTypes.DEFAULT
         loading_message_id = await send_loading_message(update)
         await show_typing(update)
         
-        result, plot_path = analysis_ctx.analyzer.detailed_analysis("service", user_text)
+        result, plot_path = await analysis_ctx.executor.run_query(
+            analysis_ctx.analyzer.detailed_analysis, "service", user_text
+        )
         
         if result.startswith("❌ Сервис"):
             if loading_message_id:
@@ -154,7 +155,8 @@ async def handle_detailed_analysis(update: Update, context: ContextTypes.DEFAULT
             await update.message.reply_text(result)
             return analysis_ctx.select_detailed_const
         
-        context.user_data['plot_path'] = plot_path
+        context.user_data.pop('plot_key', None)
+        context.user_data.pop('plot_spec', None)
         context.user_data['last_analysis_type'] = 'detailed'
         
         await send_analysis_result(update, result, None, loading_message_id)
@@ -191,7 +193,9 @@ async def handle_hiring_service_analysis(update: Update, context: ContextTypes.D
         loading_message_id = await send_loading_message(update)
         await show_typing(update)
         
-        result, plot_path = analysis_ctx.analyzer.hiring_service_analysis(user_text)
+        result, plot_path = await analysis_ctx.executor.run_query(
+            analysis_ctx.analyzer.hiring_service_analysis, user_text
+        )
         
         if result.startswith("❌ Сервис"):
             if loading_message_id:
@@ -199,7 +203,8 @@ async def handle_hiring_service_analysis(update: Update, context: ContextTypes.D
             await update.message.reply_text(result)
             return analysis_ctx.select_hiring_const
         
-        context.user_data['plot_path'] = plot_path
+        context.user_data.pop('plot_key', None)
+        context.user_data.pop('plot_spec', None)
         context.user_data['last_analysis_type'] = 'hiring'
         
         await send_analysis_result(update, result, None, loading_message_id)
@@ -218,7 +223,7 @@ async def handle_hiring_service_analysis(update: Update, context: ContextTypes.D
         await update.message.reply_text(f"❌ Ошибка анализа найма: {str(e)}")
         return analysis_ctx.select_hiring_const
 
-async def handle_callback_service_selection(query, context, analyzer, end_const):
+async def handle_callback_service_selection(query, context, analyzer, executor, end_const):
     service_name = query.data.replace('service_', '')
     
     loading_message_id = None
@@ -231,11 +236,11 @@ async def handle_callback_service_selection(query, context, analyzer, end_const)
         plot_path = None
         
         if context.user_data.get('conversation_state') == 'awaiting_service':
-            result, plot_path = analyzer.detailed_analysis("service", service_name)
+            result, plot_path = await executor.run_query(analyzer.detailed_analysis, "service", service_name)
             analysis_type = 'detailed'
             
         elif context.user_data.get('conversation_state') == 'awaiting_hiring_service':
-            result, plot_path = analyzer.hiring_service_analysis(service_name)
+            result, plot_path = await executor.run_query(analyzer.hiring_service_analysis, service_name)
             analysis_type = 'hiring'
         
         if result is None:
@@ -246,7 +251,8 @@ async def handle_callback_service_selection(query, context, analyzer, end_const)
             await query.message.reply_text(result)
             return context.user_data.get('conversation_state')
         
-        context.user_data['plot_path'] = plot_path
+        context.user_data.pop('plot_key', None)
+        context.user_data.pop('plot_spec', None)
         context.user_data['last_analysis_type'] = analysis_type
         
         await delete_message(query, loading_message_id)
@@ -267,26 +273,21 @@ async def handle_callback_service_selection(query, context, analyzer, end_const)
         await query.message.reply_text(f"❌ Произошла ошибка при анализе сервиса '{service_name}'.")
         return context.user_data.get('conversation_state')
 
-async def send_graphs(update: Update, context: ContextTypes.DEFAULT_TYPE):
+async def send_graphs(update: Update, context: ContextTypes.DEFAULT_TYPE, renderer):
     try:
-        plot_path = context.user_data.get('plot_path')
-        if plot_path:
+        plot_key = context.user_data.pop('plot_key', None)
+        spec = context.user_data.pop('plot_spec', None)
+        plots = renderer.cached(spec) if plot_key else None
+        if plots:
+            renderer.cancel(plot_key[0])
+            await send_plots(update, plots)
+        elif plot_key:
             await show_typing(update)
-            
-            if isinstance(plot_path, list):
-                for path in plot_path:
-                    if path and os.path.exists(path):
-                        with open(path, 'rb') as photo:
-                            await update.message.reply_photo(photo=photo)
-                        os.remove(path)
-                        await asyncio.sleep(0.5)
-            elif plot_path and os.path.exists(plot_path):
-                with open(plot_path, 'rb') as photo:
-                    await update.message.reply_photo(photo=photo)
-                os.remove(plot_path)
-            
-            context.user_data.pop('plot_path', None)
-            
+            plots = await renderer.get(plot_key, spec)
+            if plots:
+                renderer.remember(spec, await send_plots(update, plots))
+        
+        if plots:
             # ИСПРАВЛЕНИЕ: Возвращаем правильную клавиатуру для возврата в меню
             await update.message.reply_text(
                 "✅ Графики загружены!",
@@ -308,5 +309,3 @@ async def send_graphs(update: Update, context: ContextTypes.DEFAULT_TYPE):
             reply_markup=create_main_keyboard()
         )
         return SELECT_ACTION
-
-SELECT_ACTION, SELECT_DETAILED, SELECT_HIRING_SERVICE, AI_ASSISTANT = range(4)
\ No newline at end of file
@@ -5,18 +5,120 @@ import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from database import DatabaseManager
+from storage.aggregates import (AGGREGATES_TABLE, AGGREGATE_DATES_TABLE, DYNAMICS_TABLE, DATE_CHECKSUM_QUERY,
+                                checksums_from_rows, month_checksums)
+from storage.schema import (HR_VIEW, PARTITION_TEMPLATE, UNDATED_PARTITION, WRITES_TABLE, partition_name,
+                            union_partitions)
+from storage.reporting_calendar import ReportingCalendar
+from storage.value_resolver import SERVICE_ALIASES, ValueResolver
 
 logger = logging.getLogger(__name__)
 
 class HRDataRepository:
     def __init__(self, db_path):
         self.db = DatabaseManager(db_path)
-    
+        self.calendar = ReportingCalendar.for_database(self.db)
+        self.resolver = ValueResolver.for_database(self.db)
+        self._memo = {}
+
+    def _memoized(self, key, build):
+        """Результат build() на ключ и версию данных; без кэша запросов версия неизвестна - build() каждый раз"""
+        version = self.db.data_version()
+        cached = self._memo.get(key)
+        if cached is not None and version is not None and cached[0] == version:
+            return cached[1]
+        result = build()
+        if version is not None:
+            # данные изменились - результаты прежней версии больше не нужны
+            self._memo = {name: entry for name, entry in self._memo.items() if entry[0] == version}
+            self._memo[key] = (version, result)
+        return result
+
+    def _source(self, *report_dates):
+        """Источник FROM для запроса по срезам: только партиции их месяцев, а не все представление"""
+        partitions = self.db.partitions()
+        if not partitions:
+            return HR_VIEW
+        tables = sorted({partition_name(report_date) for report_date in report_dates} & set(partitions))
+        if not tables:
+            # срезов нет: пустой шаблон дает пустой результат с теми же колонками
+            return PARTITION_TEMPLATE
+        if len(tables) == 1:
+            return tables[0]
+        return '(' + ' UNION ALL '.join(f"SELECT * FROM {table}" for table in tables) + ')'
+
+    def _live_checksums(self):
+        """Контрольные суммы дат по текущим данным (как storage.aggregates.date_checksums), на версию данных"""
+        def build():
+            query, params = union_partitions(DATE_CHECKSUM_QUERY, (), self.db.partitions())
+            rows = self.db.execute_rows(query, params)
+            try:
+                writes = dict(self.db.execute_rows(f"SELECT report_date, writes FROM {WRITES_TABLE}"))
+            except Exception as e:
+                logger.debug(f"Счетчик записей недоступен: {e}")
+                writes = {}
+            return checksums_from_rows(rows, writes)
+        return self._memoized('checksums', build)
+
+    def _dynamics_fresh(self):
+        """Совпадают ли число строк и контрольная сумма каждого месяца помесячной динамики с данными"""
+        def build():
+            try:
+                stored = {month: (row_count, checksum) for month, row_count, checksum in self.db.execute_rows(
+                    f"SELECT month, row_count, checksum FROM {DYNAMICS_TABLE}"
+                )}
+            except Exception as e:
+                logger.debug(f"Помесячная динамика недоступна, считаем по hr_data_clean: {e}")
+                return False
+            live = month_checksums(self._live_checksums())
+            stale = sorted(month for month in set(stored) | set(live) if stored.get(month) != live.get(month))
+            if stale and stored:
+                logger.warning(f"Помесячная динамика устарела за {len(stale)} месяцев ({', '.join(stale[:5])}): "
+                               f"считаем по hr_data_clean до пересчета (python -m storage.aggregates)")
+            return bool(stored) and not stale
+        return self._memoized('dynamics_fresh', build)
+
     def get_last_report_date(self):
-        query = "SELECT MAX(report_date) as last_date FROM hr_data_clean"
-        result = self.db.execute_query(query)
-        return result['last_date'].iloc[0]
+        return self.calendar.latest()
+
+    def get_service_last_date(self, service):
+        """Последняя дата среза с сервисом; None, если сервиса нет в базе"""
+        return self.calendar.service_latest(service)
     
+    def _aggregate_dates(self):
+        """{report_date: статус агрегатов} дат, агрегаты которых совпадают с данными.
+
+        Число строк и контрольная сумма из учета дат сверяются с текущими на каждую версию данных:
+        дата, измененная после AggregateStore.refresh (правка на месте, подмена файла), читается
+        из сырых строк до следующего пересчета"""
+        def build():
+            try:
+                ledger = self.db.execute_rows(
+                    f"SELECT report_date, row_count, checksum, employee_count, additive FROM {AGGREGATE_DATES_TABLE}"
+                )
+            except Exception as e:
+                logger.debug(f"Агрегаты недоступны, читаем hr_data_clean: {e}")
+                return {}
+            live = self._live_checksums()
+            fresh = {}
+            for report_date, row_count, checksum, employee_count, additive in ledger:
+                if live.get(report_date) == (row_count, checksum):
+                    fresh[report_date] = {'employee_count': employee_count, 'additive': additive}
+            stale = sorted(str(row[0]) for row in ledger if row[0] not in fresh)
+            if stale:
+                logger.warning(f"Агрегаты устарели за {len(stale)} дат ({', '.join(stale[:5])}): "
+                               f"читаем hr_data_clean до пересчета (python -m storage.aggregates)")
+            return fresh
+        return self._memoized('aggregate_dates', build)
+
+    def _aggregate_date_info(self, report_date):
+        """Статус агрегатов за дату или None, если агрегатов нет или они устарели и читать нужно сырые строки"""
+        return self._aggregate_dates().get(report_date)
+
+    def _has_additive_aggregates(self, report_date):
+        info = self._aggregate_date_info(report_date)
+        return info is not None and bool(info['additive'])
+
     def get_employee_id(self, row):
         return (
             f"{row['hire_to_company']}_"
@@ -29,97 +131,169 @@ class HRDataRepository:
             f"{row['department_6']}"
         )
     
-    def _get_employee_id_expression(self):
-        return (
-            "hire_to_company || '_' || sex || '_' || fullyears || '_' || "
-            "location_name || '_' || department_3 || '_' || "
-            "department_4 || '_' || department_5 || '_' || department_6"
-        )
-    
-    def get_demographics_data(self, report_date):
+    def _demographics_frame(self, report_date, info):
+        if info is not None and info['additive']:
+            query = f"""
+            SELECT 
+                age_category,
+                sex,
+                experience_category,
+                SUM(employee_count) as count
+            FROM {AGGREGATES_TABLE} 
+            WHERE report_date = ?
+            GROUP BY age_category, sex, experience_category
+            ORDER BY age_category, sex, experience_category
+            """
+            return self.db.execute_query(query, (report_date,))
+
         query = f"""
         SELECT 
             age_category,
             sex,
             experience_category,
-            COUNT(DISTINCT {self._get_employee_id_expression()}) as count
-        FROM hr_data_clean 
+            COUNT(DISTINCT employee_key) as count
+        FROM {self._source(report_date)} 
         WHERE report_date = ?
         GROUP BY age_category, sex, experience_category
+        ORDER BY age_category, sex, experience_category
         """
         return self.db.execute_query(query, (report_date,))
     
+    def get_snapshot_bundle(self, report_date):
+        """Данные дашбордов "Демография", "Анализ сервисов" и "Оценка рисков" за дату.
+
+        Считаются вместе и запоминаются на дату и версию данных: три отчета по одному срезу
+        берут их отсюда"""
+        def build():
+            info = self._aggregate_date_info(report_date)
+            return {
+                'demographics': self._demographics_frame(report_date, info),
+                'service_stats': self._service_stats_frame(report_date, info),
+                'risk_assessment': self._risk_assessment_frame(report_date, info)
+            }
+        return self._memoized(('bundle', report_date), build)
+
+    def get_demographics_data(self, report_date):
+        return self.get_snapshot_bundle(report_date)['demographics'].copy()
+    
     def get_company_dynamics(self):
+        # Месяцы пересчитываются при загрузке и старте бота (AggregateStore.refresh). Если строки с тех пор
+        # изменились мимо загрузки (правка базы, подмена файла), динамика считается по hr_data_clean
+        if self._dynamics_fresh():
+            try:
+                return self.db.execute_query(
+                    f"SELECT month, hires, fires, total_employees FROM {DYNAMICS_TABLE} ORDER BY month"
+                )
+            except Exception as e:
+                logger.debug(f"Помесячная динамика недоступна, считаем по hr_data_clean: {e}")
+
+        partitions = self.db.partitions()
+        if partitions and UNDATED_PARTITION not in partitions:
+            # Партиция - ровно один месяц: месяц считается в своей партиции, без прохода по всему представлению
+            query = ' UNION ALL '.join(f"""
+            SELECT 
+                substr(report_date, 1, 7) as month,
+                SUM(hirecount) as hires,
+                SUM(firecount) as fires,
+                COUNT(DISTINCT employee_key) as total_employees
+            FROM {partition} 
+            GROUP BY substr(report_date, 1, 7)""" for partition in partitions) + "\n        ORDER BY month"
+            return self.db.execute_query(query)
+
         query = f"""
         SELECT 
-            strftime('%Y-%m', report_date) as month,
+            substr(report_date, 1, 7) as month,
             SUM(hirecount) as hires,
             SUM(firecount) as fires,
-            COUNT(DISTINCT {self._get_employee_id_expression()}) as total_employees
+            COUNT(DISTINCT employee_key) as total_employees
         FROM hr_data_clean 
-        GROUP BY strftime('%Y-%m', report_date)
+        GROUP BY substr(report_date, 1, 7)
         ORDER BY month
         """
         return self.db.execute_query(query)
     
-    def get_service_stats(self, report_date):
+    def _service_stats_frame(self, report_date, info):
+        if info is not None and info['additive']:
+            query = f"""
+            SELECT 
+                service,
+                SUM(employee_count) as employees,
+                SUM(hires) as hires,
+                SUM(fires) as fires
+            FROM {AGGREGATES_TABLE} 
+            WHERE report_date = ?
+            GROUP BY service
+            ORDER BY employees DESC, service
+            """
+            return self.db.execute_query(query, (report_date,))
+
         query = f"""
         SELECT 
             service,
-            COUNT(DISTINCT {self._get_employee_id_expression()}) as employees,
+            COUNT(DISTINCT employee_key) as employees,
             SUM(hirecount) as hires,
             SUM(firecount) as fires
-        FROM hr_data_clean 
+        FROM {self._source(report_date)} 
         WHERE report_date = ?
         GROUP BY service
-        ORDER BY employees DESC
+        ORDER BY employees DESC, service
         """
         return self.db.execute_query(query, (report_date,))
     
-    def get_risk_assessment_data(self, report_date):
+    def _risk_assessment_frame(self, report_date, info):
+        if info is not None:
+            # Общая численность берется из учета дат: она точная даже для неаддитивного среза
+            query = f"""
+            SELECT 
+                ? as total_employees,
+                SUM(hires) as total_hires,
+                SUM(fires) as total_fires,
+                SUM(zero_fte_count) as zero_fte_count,
+                SUM(CASE WHEN cluster = 'Не определен Кластер' OR cluster = 'Другое' THEN row_count ELSE 0 END) as undefined_cluster_count,
+                SUM(CASE WHEN service = 'Не определен Сервис' THEN row_count ELSE 0 END) as undefined_service_count,
+                SUM(recent_hires_count) as recent_hires_count
+            FROM {AGGREGATES_TABLE} 
+            WHERE report_date = ?
+            """
+            return self.db.execute_query(query, (int(info['employee_count']), report_date))
+
         query = f"""
         SELECT 
-            COUNT(DISTINCT {self._get_employee_id_expression()}) as total_employees,
+            COUNT(DISTINCT employee_key) as total_employees,
             SUM(hirecount) as total_hires,
             SUM(firecount) as total_fires,
             SUM(CASE WHEN fte = 0 THEN 1 ELSE 0 END) as zero_fte_count,
             SUM(CASE WHEN cluster = 'Не определен Кластер' OR cluster = 'Другое' THEN 1 ELSE 0 END) as undefined_cluster_count,
             SUM(CASE WHEN service = 'Не определен Сервис' THEN 1 ELSE 0 END) as undefined_service_count,
             SUM(CASE WHEN experience < 3 THEN 1 ELSE 0 END) as recent_hires_count
-        FROM hr_data_clean 
+        FROM {self._source(report_date)} 
         WHERE report_date = ?
         """
         return self.db.execute_query(query, (report_date,))
     
+    def get_service_stats(self, report_date):
+        return self.get_snapshot_bundle(report_date)['service_stats'].copy()
+    
+    def get_risk_assessment_data(self, report_date):
+        return self.get_snapshot_bundle(report_date)['risk_assessment'].copy()
+    
     def get_hiring_recommendations_data(self):
         """Получить данные для рекомендаций по найму"""
         try:
-            # Берем данные за июль и август 2025 года
+            # Берем данные за два последних полных месяца
+            report_dates = self.calendar.reporting_dates()
             query = f"""
             SELECT 
                 service,
                 SUM(firecount) as monthly_fires,
-                COUNT(DISTINCT {self._get_employee_id_expression()}) as total_employees
-            FROM hr_data_clean 
-            WHERE report_date IN ('2025-07-31', '2025-08-31')
+                COUNT(DISTINCT employee_key) as total_employees
+            FROM {self._source(*report_dates)} 
+            WHERE report_date IN ({', '.join('?' * len(report_dates))})
             GROUP BY service
             HAVING total_employees > 0  -- Только сервисы с сотрудниками
+            ORDER BY service
             """
-            data = self.db.execute_query(query)
-            
-            # Если данных нет, пробуем альтернативный формат дат (с временем)
-            if len(data) == 0:
-                query_alt = f"""
-                SELECT 
-                    service,
-                    SUM(firecount) as monthly_fires,
-                    COUNT(DISTINCT {self._get_employee_id_expression()}) as total_employees
-                FROM hr_data_clean 
-                WHERE report_date LIKE '2025-07-31%' OR report_date LIKE '2025-08-31%'
-                GROUP BY service
-                HAVING total_employees > 0
-                """
-                data = self.db.execute_query(query_alt)
+            data = self.db.execute_query(query, report_dates)
             
             logger.info(f"Данные для рекомендаций по найму: {len(data)} строк")
             if len(data) > 0:
@@ -131,74 +305,121 @@ class HRDataRepository:
             logger.error(f"Ошибка получения данных для рекомендаций по найму: {e}")
             return pd.DataFrame()
     
+    def get_all_services_detailed(self, report_date):
+        """Детальный разрез (возраст × пол × опыт) всех сервисов за дату одним запросом: {сервис: DataFrame}"""
+        def build():
+            if self._has_additive_aggregates(report_date):
+                query = f"""
+                SELECT 
+                    service,
+                    age_category,
+                    sex,
+                    experience_category,
+                    SUM(employee_count) as employees,
+                    SUM(fires) as fires,
+                    SUM(age_sum) * 1.0 / SUM(age_count) as avg_age,
+                    SUM(experience_sum) * 1.0 / SUM(experience_count) as avg_experience
+                FROM {AGGREGATES_TABLE} 
+                WHERE report_date = ?
+                GROUP BY service, age_category, sex, experience_category
+                ORDER BY service, employees DESC, age_category, sex, experience_category
+                """
+            else:
+                query = f"""
+                SELECT 
+                    service,
+                    age_category,
+                    sex,
+                    experience_category,
+                    COUNT(DISTINCT employee_key) as employees,
+                    SUM(firecount) as fires,
+                    AVG(fullyears) as avg_age,
+                    AVG(experience) as avg_experience
+                FROM {self._source(report_date)} 
+                WHERE report_date = ?
+                GROUP BY service, age_category, sex, experience_category
+                ORDER BY service, employees DESC, age_category, sex, experience_category
+                """
+            data = self.db.execute_query(query, (report_date,))
+            logger.info(f"Детальный анализ всех сервисов за {report_date}: {len(data)} строк")
+            return {
+                service: rows.drop(columns='service').reset_index(drop=True)
+                for service, rows in data.groupby('service', sort=False)
+            }
+        return self._memoized(('detailed', report_date), build)
+
     def get_detailed_service_analysis(self, service_name, report_date):
         """Получить детальный анализ сервиса"""
         try:
-            query = f"""
-            SELECT 
-                age_category,
-                sex,
-                experience_category,
-                COUNT(DISTINCT {self._get_employee_id_expression()}) as employees,
-                SUM(firecount) as fires,
-                AVG(fullyears) as avg_age,
-                AVG(experience) as avg_experience
-            FROM hr_data_clean 
-            WHERE service = ? AND report_date = ?
-            GROUP BY age_category, sex, experience_category
-            ORDER BY employees DESC
-            """
-            return self.db.execute_query(query, (service_name, report_date))
+            data = self.get_all_services_detailed(report_date).get(service_name)
+            if data is None:
+                return pd.DataFrame(columns=['age_category', 'sex', 'experience_category',
+                                             'employees', 'fires', 'avg_age', 'avg_experience'])
+            return data.copy()
         except Exception as e:
             logger.error(f"Ошибка получения детального анализа для сервиса {service_name}: {e}")
             return pd.DataFrame()
     
-    def get_service_hiring_analysis(self, service_name):
-        """Получить анализ найма для конкретного сервиса"""
-        try:
-            query_basic = f"""
-            SELECT 
-                COUNT(DISTINCT {self._get_employee_id_expression()}) as total_employees,
-                SUM(firecount) as total_fires,
-                AVG(fullyears) as avg_age,
-                AVG(experience) as avg_experience
-            FROM hr_data_clean 
-            WHERE service = ? AND report_date = '2025-08-31'
-            """
-            
-            query_hiring = f"""
-            SELECT 
-                SUM(firecount) as monthly_fires
-            FROM hr_data_clean 
-            WHERE service = ? 
-            AND report_date IN ('2025-07-31', '2025-08-31')
-            """
-            
-            basic_stats = self.db.execute_query(query_basic, (service_name,))
-            hiring_stats = self.db.execute_query(query_hiring, (service_name,))
-            
-            # Если нет данных с точными датами, пробуем с LIKE
-            if len(basic_stats) == 0:
-                query_basic_alt = f"""
+    def get_all_services_hiring_analysis(self):
+        """Карточки найма всех сервисов одним запросом: {сервис: строка с total_employees, total_fires,
+        avg_age, avg_experience за отчетную дату и monthly_fires за два последних полных месяца}"""
+        report_dates = self.calendar.reporting_dates()
+        report_date = self.calendar.reporting_date()
+
+        def build():
+            if not report_dates:
+                return {}
+            in_dates = ', '.join('?' * len(report_dates))
+            aggregated = self._has_additive_aggregates(report_date) and all(
+                self._aggregate_date_info(date) is not None for date in report_dates
+            )
+            if aggregated:
+                query = f"""
                 SELECT 
-                    COUNT(DISTINCT {self._get_employee_id_expression()}) as total_employees,
-                    SUM(firecount) as total_fires,
-                    AVG(fullyears) as avg_age,
-                    AVG(experience) as avg_experience
-                FROM hr_data_clean 
-                WHERE service = ? AND report_date LIKE '2025-08-31%'
+                    service,
+                    COALESCE(SUM(CASE WHEN report_date = ? THEN employee_count END), 0) as total_employees,
+                    SUM(CASE WHEN report_date = ? THEN fires END) as total_fires,
+                    SUM(CASE WHEN report_date = ? THEN age_sum END) * 1.0
+                        / SUM(CASE WHEN report_date = ? THEN age_count END) as avg_age,
+                    SUM(CASE WHEN report_date = ? THEN experience_sum END) * 1.0
+                        / SUM(CASE WHEN report_date = ? THEN experience_count END) as avg_experience,
+                    SUM(fires) as monthly_fires
+                FROM {AGGREGATES_TABLE} 
+                WHERE report_date IN ({in_dates})
+                GROUP BY service
                 """
-                basic_stats = self.db.execute_query(query_basic_alt, (service_name,))
-            
-            if len(hiring_stats) == 0:
-                query_hiring_alt = f"""
+            else:
+                query = f"""
                 SELECT 
+                    service,
+                    COUNT(DISTINCT CASE WHEN report_date = ? THEN employee_key END) as total_employees,
+                    SUM(CASE WHEN report_date = ? THEN firecount END) as total_fires,
+                    AVG(CASE WHEN report_date = ? THEN fullyears END) as avg_age,
+                    AVG(CASE WHEN report_date = ? THEN experience END) as avg_experience,
                     SUM(firecount) as monthly_fires
-                FROM hr_data_clean 
-                WHERE service = ? 
-                AND (report_date LIKE '2025-07-31%' OR report_date LIKE '2025-08-31%')
+                FROM {self._source(*report_dates)} 
+                WHERE report_date IN ({in_dates})
+                GROUP BY service
                 """
-                hiring_stats = self.db.execute_query(query_hiring_alt, (service_name,))
+            params = (report_date,) * (6 if aggregated else 4) + tuple(report_dates)
+            data = self.db.execute_query(query, params)
+            logger.info(f"Анализ найма всех сервисов: {len(data)} сервисов")
+            return {row.service: row for row in data.itertuples(index=False)}
+        return self._memoized(('hiring', tuple(report_dates)), build)
+
+    def get_service_hiring_analysis(self, service_name):
+        """Получить анализ найма для конкретного сервиса"""
+        try:
+            row = self.get_all_services_hiring_analysis().get(service_name)
+            if row is None:
+                # как запрос по одному сервису без строк: COUNT дает 0, SUM и AVG - NULL
+                basic = {'total_employees': 0, 'total_fires': None, 'avg_age': None, 'avg_experience': None}
+                monthly_fires = None
+            else:
+                basic = {name: getattr(row, name) for name in ('total_employees', 'total_fires', 'avg_age', 'avg_experience')}
+                monthly_fires = row.monthly_fires
+            basic_stats = pd.DataFrame([basic])
+            hiring_stats = pd.DataFrame([{'monthly_fires': monthly_fires}])
             
             logger.info(f"Анализ найма для сервиса {service_name}: basic_stats={len(basic_stats)}, hiring_stats={len(hiring_stats)}")
             
@@ -212,69 +433,24 @@ class HRDataRepository:
             return {'basic_stats': pd.DataFrame(), 'hiring_stats': pd.DataFrame()}
     
     def get_all_services(self):
-        query = """
-        SELECT DISTINCT service 
-        FROM hr_data_clean 
-        WHERE service IS NOT NULL AND service != '' AND service != 'Не определен Сервис'
-        ORDER BY service
-        """
-        result = self.db.execute_query(query)
-        return result['service'].tolist()
+        services = self.calendar.current().service_dates
+        return sorted(service for service in services if service not in ('', 'Не определен Сервис'))
     
     def get_service_mapping(self):
-        return {
-            'такси': 'Такси',
-            'маркет': 'Маркет', 
-            'крауд': 'Крауд',
-            'лавка': 'Лавка',
-            'финтех': 'Финтех',
-            'еда': 'Еда',
-            'доставка': 'Доставка',
-            'беспилотники': 'Беспилотники',
-            'беспилотные автомобили': 'Беспилотные автомобили',
-            'вертикали': 'Вертикали',
-            'коммерческий департамент': 'Коммерческий департамент',
-            'облако': 'Облако',
-            'образовательные инициативы': 'Образовательные инициативы',
-            'общие подразделения': 'Общие подразделения',
-            'плюс и фантех': 'Плюс и Фантех',
-            'поисковый портал': 'Поисковый портал',
-            'не определен сервис': 'Не определен Сервис'
-        }
+        return dict(SERVICE_ALIASES)
     
     def find_service_by_alias(self, service_name):
-        service_mapping = self.get_service_mapping()
-        
-        if service_name in service_mapping.values():
-            return service_name
-        
-        normalized_name = service_name.lower()
-        if normalized_name in service_mapping:
-            return service_mapping[normalized_name]
-        
-        query = f"""
-        SELECT DISTINCT service 
-        FROM hr_data_clean 
-        WHERE service LIKE '%{service_name}%' 
-        OR service LIKE '%{service_name.capitalize()}%'
-        LIMIT 1
-        """
-        
-        try:
-            result = self.db.execute_query(query)
-            if len(result) > 0:
-                return result['service'].iloc[0]
-        except:
-            pass
-        
-        return None
+        """Сервис как в базе по названию, псевдониму или словоформе ("облаке"); None, если не найден"""
+        return self.resolver.resolve_service(service_name)
 
     def debug_service_data(self, service_name):
         """Диагностика данных по сервису"""
         try:
             # Проверим, какие сервисы вообще есть в базе
-            all_services_query = "SELECT DISTINCT service FROM hr_data_clean ORDER BY service"
-            all_services = self.db.execute_query(all_services_query)
+            all_services_query, params = union_partitions(
+                "SELECT DISTINCT service FROM hr_data_clean ORDER BY service", (), self.db.partitions(), 'UNION'
+            )
+            all_services = self.db.execute_query(all_services_query, params)
             logger.info(f"Все сервисы в базе: {all_services['service'].tolist()}")
             
             # Проверим данные по конкретному сервису
@@ -0,0 +1,99 @@
+# lazy_plots.py
+import asyncio
+import logging
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from menu.plot_store import PlotStore
+from config import PLOT_PREFETCH_DELAY
+
+logger = logging.getLogger(__name__)
+
+
+class LazyPlotRenderer:
+    """Графики отчетов по описанию (menu.plotting.plot_spec): рендерятся (menu.chart_renderer)
+    по кнопке "Показать графики".
+
+    После отчета графики начинают строиться заранее: в фоне через PLOT_PREFETCH_DELAY секунд (или
+    сразу по кнопке), результат - в PlotStore. Если пользователь ушел в другой раздел раньше,
+    фоновый рендеринг отменяется (cancel). Ключ - (пользователь, отчет).
+
+    Графики, уже загруженные в Telegram (ChartCache), не рендерятся: отправляются их file_id"""
+
+    def __init__(self, renderer, store=None, cache=None, prefetch_delay=PLOT_PREFETCH_DELAY):
+        self.renderer = renderer
+        self.store = store or PlotStore()
+        self.cache = cache
+        self.prefetch_delay = prefetch_delay
+        self._tasks = {}   # пользователь -> (ключ, задача фонового рендеринга, событие "не ждать задержку")
+        self.metrics = {'prefetched': 0, 'cancelled': 0, 'on_demand': 0, 'prefetch_hits': 0}
+
+    def prefetch(self, key, spec):
+        """Запланировать фоновый рендеринг; прошлый фоновый рендеринг пользователя отменяется"""
+        self.cancel(key[0])
+        if spec is None or self.prefetch_delay is None or self.cached(spec):
+            return
+        requested = asyncio.Event()
+        task = asyncio.create_task(self._prefetch(key, spec, requested))
+        self._tasks[key[0]] = (key, task, requested)
+        task.add_done_callback(lambda done, user_id=key[0]: self._forget(user_id, done))
+
+    async def _prefetch(self, key, spec, requested):
+        try:
+            await asyncio.wait_for(requested.wait(), self.prefetch_delay)
+        except asyncio.TimeoutError:
+            pass
+        plots = await self.renderer.render(spec)
+        self.store.put(key, plots)
+        self.metrics['prefetched'] += 1
+        return plots
+
+    def _forget(self, user_id, task):
+        entry = self._tasks.get(user_id)
+        if entry is not None and entry[1] is task:
+            del self._tasks[user_id]
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Ошибка фонового рендеринга графиков: {task.exception()}")
+
+    def cancel(self, user_id):
+        """Пользователь ушел из отчета: фоновый рендеринг больше не нужен"""
+        entry = self._tasks.pop(user_id, None)
+        if entry is not None and not entry[1].done():
+            entry[1].cancel()
+            self.metrics['cancelled'] += 1
+
+    def cached(self, spec):
+        """file_id графиков, уже отправленных кому-либо, или None"""
+        return self.cache.get(spec) if self.cache is not None else None
+
+    def remember(self, spec, file_ids):
+        if self.cache is not None:
+            self.cache.put(spec, file_ids)
+
+    async def get(self, key, spec):
+        """Графики отчета: готовые из хранилища, из идущего фонового рендеринга или построенные сейчас"""
+        entry = self._tasks.get(key[0])
+        if entry is not None and entry[0] == key:
+            key, task, requested = entry
+            requested.set()
+            try:
+                plots = await asyncio.shield(task)
+                self.store.discard(key)
+                self.metrics['prefetch_hits'] += 1
+                return plots
+            except asyncio.CancelledError:
+                if asyncio.current_task().cancelling():
+                    raise
+            except Exception:
+                pass   # ошибка уже в журнале; пробуем построить заново
+        plots = self.store.pop(key)
+        if plots:
+            self.metrics['prefetch_hits'] += 1
+            return plots
+        if spec is None:
+            return []
+        self.metrics['on_demand'] += 1
+        return await self.renderer.render(spec)
+
+    def stats(self):
+        return dict(self.metrics, pending=len(self._tasks), store=self.store.stats())
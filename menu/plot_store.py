@@ -0,0 +1,61 @@
+# plot_store.py
+import time
+import logging
+from collections import OrderedDict
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import PLOT_STORE_TTL, PLOT_STORE_MAX_BYTES
+
+logger = logging.getLogger(__name__)
+
+
+class PlotStore:
+    """Графики отчетов в памяти до нажатия "Показать графики": ключ - (пользователь, отчет).
+
+    Записи старше ttl и самые старые сверх max_bytes удаляются при каждом обращении, поэтому
+    графики, которые так и не запросили, не копятся ни в памяти, ни на диске"""
+
+    def __init__(self, ttl=PLOT_STORE_TTL, max_bytes=PLOT_STORE_MAX_BYTES):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()   # key -> (время сохранения, [байты PNG])
+        self._bytes = 0
+        self.metrics = {'stored': 0, 'served': 0, 'expired': 0, 'evicted': 0}
+
+    def put(self, key, images):
+        self.discard(key)
+        images = [image for image in images or [] if image]
+        if not images:
+            return
+        self._entries[key] = (time.monotonic(), images)
+        self._bytes += sum(len(image) for image in images)
+        self.metrics['stored'] += 1
+        self.purge()
+
+    def pop(self, key):
+        """Графики отчета (их отдают один раз); пустой список, если их нет или срок истек"""
+        self.purge()
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return []
+        self._bytes -= sum(len(image) for image in entry[1])
+        self.metrics['served'] += 1
+        return entry[1]
+
+    def discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= sum(len(image) for image in entry[1])
+
+    def purge(self):
+        deadline = time.monotonic() - self.ttl
+        while self._entries:
+            key, (stored_at, images) = next(iter(self._entries.items()))
+            if stored_at >= deadline and self._bytes <= self.max_bytes:
+                break
+            self.discard(key)
+            self.metrics['expired' if stored_at < deadline else 'evicted'] += 1
+
+    def stats(self):
+        return dict(self.metrics, entries=len(self._entries), bytes=self._bytes)
@@ -0,0 +1,237 @@
+# plotting.py
+import io
+import os
+import logging
+import threading
+import matplotlib
+matplotlib.use('Agg')
+import numpy as np
+import pandas as pd
+import seaborn as sns
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import EXPERIENCE_ORDER, PLOT_DPI, PLOT_FIGSIZE, PLOT_FORMAT
+
+logger = logging.getLogger(__name__)
+
+# Функции уровня модуля, чтобы их можно было выполнять в пуле процессов. Графики рендерятся
+# в память и возвращаются как байты изображения: без файлов в plots/ и без их удаления после отправки.
+# Рисуется через Figure/Agg без pyplot: глобальное состояние pyplot не потокобезопасно
+
+PLOT_FORMATS = ('png', 'webp', 'jpeg')
+
+
+def create_demographic_plots(plot_data, experience_order=EXPERIENCE_ORDER):
+    plots = []
+
+    try:
+        if 'age_data' in plot_data and len(plot_data['age_data']) > 0:
+            age_plot = create_plot(
+                plot_data['age_data'], 'age_category', 'count',
+                'Распределение по возрастным группам', 'bar',
+                'Возрастная группа', 'Количество сотрудников'
+            )
+            if age_plot:
+                plots.append(age_plot)
+
+        if 'gender_data' in plot_data and len(plot_data['gender_data']) > 0:
+            gender_plot = create_plot(
+                plot_data['gender_data'], 'sex', 'count',
+                'Гендерное распределение', 'pie'
+            )
+            if gender_plot:
+                plots.append(gender_plot)
+
+        if 'exp_data' in plot_data and len(plot_data['exp_data']) > 0:
+            exp_data = plot_data['exp_data'].copy()
+            exp_data['order'] = exp_data['experience_category'].apply(
+                lambda x: experience_order.index(x) if x in experience_order else len(experience_order)
+            )
+            exp_data = exp_data.sort_values('order')
+
+            exp_plot = create_plot(
+                exp_data, 'experience_category', 'count',
+                'Распределение по опыту работы', 'bar',
+                'Опыт работы', 'Количество сотрудников'
+            )
+            if exp_plot:
+                plots.append(exp_plot)
+
+    except Exception as e:
+        logger.error(f"Ошибка при создании демографических графиков: {e}")
+
+    return plots
+
+
+def create_dynamics_plots(plot_data):
+    plots = []
+
+    try:
+        if plot_data is not None and len(plot_data) > 0:
+            dynamics_plot = create_plot(
+                plot_data, 'month', 'value',
+                'Динамика наймов и увольнений', 'bar',
+                'Месяц', 'Количество', 'type'
+            )
+            if dynamics_plot:
+                plots.append(dynamics_plot)
+
+    except Exception as e:
+        logger.error(f"Ошибка при создании графиков динамики: {e}")
+
+    return plots
+
+
+def create_service_plots(plot_data):
+    plots = []
+
+    try:
+        if plot_data is not None and len(plot_data) > 0:
+            large_services = plot_data[plot_data['employees'] > 100]
+
+            if len(large_services) > 0:
+                size_plot = create_plot(
+                    large_services, 'service', 'employees',
+                    'Количество сотрудников по сервисам', 'bar',
+                    'Сервис', 'Количество сотрудников'
+                )
+                if size_plot:
+                    plots.append(size_plot)
+
+                attrition_plot = create_plot(
+                    large_services, 'service', 'attrition_rate',
+                    'Текучесть кадров по сервисам', 'bar',
+                    'Сервис', 'Текучесть (%)'
+                )
+                if attrition_plot:
+                    plots.append(attrition_plot)
+
+    except Exception as e:
+        logger.error(f"Ошибка при создании графиков сервисов: {e}")
+
+    return plots
+
+
+# Отчеты меню возвращают описание графиков (тип и данные), а рендерятся они только по кнопке
+# "Показать графики" (menu.lazy_plots)
+PLOT_BUILDERS = {
+    'dynamics': create_dynamics_plots,
+    'demographics': create_demographic_plots,
+    'services': create_service_plots,
+}
+
+
+def plot_spec(kind, plot_data, **options):
+    """Описание графиков отчета без рендеринга; None, если данных для графиков нет"""
+    if plot_data is None or len(plot_data) == 0:
+        return None
+    return {'kind': kind, 'data': plot_data, 'options': options}
+
+
+def render_plot_spec(spec):
+    return PLOT_BUILDERS[spec['kind']](spec['data'], **spec['options'])
+
+
+def _draw_bar(ax, data, x_col, y_col, hue, colors):
+    bars = ax.bar(data[x_col], data[y_col], color=colors, alpha=0.8)
+    ax.bar_label(bars, fmt='%.1f', padding=3)
+
+
+def _draw_grouped_bar(ax, data, x_col, y_col, hue, colors):
+    bar_width = 0.35
+    x_values = data[x_col].unique()
+    x_pos = np.arange(len(x_values))
+    for i, category in enumerate(data[hue].unique()):
+        category_data = data[data[hue] == category]
+        bars = ax.bar(x_pos + i * bar_width, category_data[y_col], bar_width, label=category, alpha=0.8)
+        ax.bar_label(bars, fmt='%.0f', padding=3)
+    ax.set_xticks(x_pos + bar_width / 2, x_values)
+    ax.legend()
+
+
+def _draw_line(ax, data, x_col, y_col, hue, colors):
+    ax.plot(data[x_col], data[y_col], marker='o', linewidth=3, markersize=8, color=colors[0])
+
+
+def _draw_pie(ax, data, x_col, y_col, hue, colors):
+    filtered_data = data[data[y_col] > 0]
+    if len(filtered_data) > 0:
+        ax.pie(filtered_data[y_col], labels=filtered_data[x_col], autopct='%1.1f%%',
+               colors=colors, startangle=90)
+    ax.axis('equal')
+
+
+CHART_TEMPLATES = {
+    'bar': _draw_bar,
+    'grouped_bar': _draw_grouped_bar,
+    'line': _draw_line,
+    'pie': _draw_pie,
+}
+
+# Вывод графиков; в процессах рендеринга задается через configure (menu.chart_renderer)
+_output = {'dpi': PLOT_DPI, 'format': PLOT_FORMAT}
+# Фигура с осями на тип графика: создается один раз на поток процесса и очищается перед каждым графиком
+_layouts = threading.local()
+
+
+def configure(dpi=PLOT_DPI, image_format=PLOT_FORMAT):
+    if image_format not in PLOT_FORMATS:
+        raise ValueError(f"Формат графиков {image_format!r} не поддерживается: {', '.join(PLOT_FORMATS)}")
+    _output.update(dpi=dpi, format=image_format)
+
+
+def _layout(template):
+    layouts = _layouts.__dict__
+    layout = layouts.get(template)
+    if layout is None:
+        figure = Figure(figsize=PLOT_FIGSIZE)
+        FigureCanvasAgg(figure)
+        layout = layouts[template] = (figure, figure.add_subplot())
+    figure, ax = layout
+    ax.clear()
+    return figure, ax
+
+
+def warm_up(dpi=PLOT_DPI, image_format=PLOT_FORMAT):
+    """Подготовить процесс рендеринга: шрифты, палитры и макеты всех шаблонов загружаются заранее,
+    а не на первом графике пользователя"""
+    configure(dpi, image_format)
+    sample = pd.DataFrame({'x': ['а', 'б'], 'y': [1.0, 2.0], 'type': ['Найм', 'Найм']})
+    for template in CHART_TEMPLATES:
+        figure, ax = _layout(template)
+        CHART_TEMPLATES[template](ax, sample, 'x', 'y', 'type', sns.color_palette("husl", len(sample)))
+        ax.set_title('Прогрев', fontsize=16, fontweight='bold', pad=20)
+        figure.canvas.draw()
+        ax.clear()
+
+
+def create_plot(data, x_col, y_col, title, plot_type='bar', x_label=None, y_label=None, hue=None):
+    try:
+        template = 'grouped_bar' if plot_type == 'bar' and hue else plot_type
+        figure, ax = _layout(template)
+        CHART_TEMPLATES[template](ax, data, x_col, y_col, hue, sns.color_palette("husl", len(data)))
+
+        ax.set_title(title, fontsize=16, fontweight='bold', pad=20)
+        if x_label:
+            ax.set_xlabel(x_label, fontsize=12)
+        if y_label:
+            ax.set_ylabel(y_label, fontsize=12)
+
+        ax.grid(True, alpha=0.3)
+        ax.tick_params(axis='x', labelrotation=45)
+        for label in ax.get_xticklabels():
+            label.set_horizontalalignment('right')
+        figure.tight_layout()
+
+        buffer = io.BytesIO()
+        figure.savefig(buffer, format=_output['format'], dpi=_output['dpi'])
+        ax.clear()
+
+        logger.info(f"График создан: {title} ({buffer.tell() // 1024} КБ)")
+        return buffer.getvalue()
+
+    except Exception as e:
+        logger.error(f"Ошибка при создании графика: {e}")
+        return None
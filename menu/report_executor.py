@@ -0,0 +1,101 @@
+# report_executor.py
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import REPORT_MAX_CONCURRENT, REPORT_QUERY_WORKERS, REPORT_JOB_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+
+class ReportTimeoutError(TimeoutError):
+    pass
+
+
+class ReportExecutor:
+    """Выполняет отчеты меню вне event loop: SQL и pandas в потоках (графики - menu.chart_renderer).
+
+    Таймаут задачи только прекращает ожидание: поток дорабатывает отчет, и до его завершения задача
+    занимает слот REPORT_MAX_CONCURRENT и учитывается в running (и в abandoned)"""
+
+    def __init__(self, max_concurrent=REPORT_MAX_CONCURRENT, query_workers=REPORT_QUERY_WORKERS,
+                 timeout=REPORT_JOB_TIMEOUT):
+        self.max_concurrent = max_concurrent
+        self.timeout = timeout
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self._threads = ThreadPoolExecutor(max_workers=query_workers, thread_name_prefix='report-query')
+        self.metrics = {
+            'queued': 0,
+            'running': 0,
+            'completed': 0,
+            'failed': 0,
+            'timed_out': 0,
+            'abandoned': 0,   # превысили таймаут, но поток еще выполняет их (входят в running)
+            'max_queue_depth': 0
+        }
+
+    async def run_query(self, func, *args):
+        """Выполнить построение отчета (запросы к БД, pandas) в пуле потоков"""
+        return await self._submit(self._threads, func, args)
+
+    async def _submit(self, pool, func, args):
+        name = getattr(func, '__name__', str(func))
+        self.metrics['queued'] += 1
+        self.metrics['max_queue_depth'] = max(self.metrics['max_queue_depth'], self.metrics['queued'])
+        queued_at = time.monotonic()
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.metrics['queued'] -= 1
+
+        self.metrics['running'] += 1
+        started_at = time.monotonic()
+        loop = asyncio.get_running_loop()
+        try:
+            future = loop.run_in_executor(pool, func, *args)
+        except Exception:
+            self.metrics['running'] -= 1
+            self.metrics['failed'] += 1
+            self._semaphore.release()
+            raise
+        timed_out = False
+
+        def release(done):
+            # поток нельзя прервать: слот освобождается, когда задача действительно закончилась
+            self.metrics['running'] -= 1
+            self._semaphore.release()
+            if timed_out:
+                self.metrics['abandoned'] -= 1
+                error = None if done.cancelled() else done.exception()
+                logger.warning(f"Задача {name} после таймаута завершилась через "
+                               f"{time.monotonic() - started_at:.1f} с" + (f" с ошибкой: {error}" if error else ""))
+
+        future.add_done_callback(release)
+        try:
+            # shield: таймаут и отмена запроса перестают ждать, но не снимают задачу с учета
+            result = await asyncio.wait_for(asyncio.shield(future), self.timeout)
+            self.metrics['completed'] += 1
+            return result
+        except asyncio.TimeoutError:
+            timed_out = True
+            self.metrics['timed_out'] += 1
+            self.metrics['abandoned'] += 1
+            logger.error(f"Задача {name} превысила таймаут {self.timeout} с и продолжает занимать поток")
+            raise ReportTimeoutError(f"Отчет формируется дольше {self.timeout} с, попробуйте позже")
+        except Exception:
+            self.metrics['failed'] += 1
+            raise
+        finally:
+            logger.info(
+                f"Задача {name}: ожидание {started_at - queued_at:.2f} с, "
+                f"выполнение {time.monotonic() - started_at:.2f} с, очередь {self.metrics['queued']}"
+            )
+
+    def stats(self):
+        return dict(self.metrics, max_concurrent=self.max_concurrent)
+
+    def shutdown(self):
+        self._threads.shutdown(wait=False, cancel_futures=True)
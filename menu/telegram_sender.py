@@ -0,0 +1,83 @@
+# telegram_sender.py
+import asyncio
+import logging
+import sys
+import os
+from telegram import InputMediaPhoto
+from telegram.error import RetryAfter, TimedOut
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import TELEGRAM_CHAT_INTERVAL, TELEGRAM_GLOBAL_RATE, TELEGRAM_SEND_RETRIES
+
+logger = logging.getLogger(__name__)
+
+# Больше 10 фото в одном альбоме Telegram не принимает
+MEDIA_GROUP_LIMIT = 10
+
+
+def _seconds(retry_after):
+    return retry_after.total_seconds() if hasattr(retry_after, 'total_seconds') else float(retry_after)
+
+
+class TelegramSender:
+    """Отправка графиков с учетом лимитов Telegram: набор графиков - одним альбомом (send_media_group).
+
+    Запросы разносятся во времени: не чаще TELEGRAM_GLOBAL_RATE в секунду на бота и с интервалом
+    TELEGRAM_CHAT_INTERVAL на каждое сообщение в чате. На RetryAfter (flood control) чат ждет
+    указанное Telegram время и запрос повторяется, вместо фиксированных пауз между фото"""
+
+    def __init__(self, chat_interval=TELEGRAM_CHAT_INTERVAL, global_rate=TELEGRAM_GLOBAL_RATE,
+                 retries=TELEGRAM_SEND_RETRIES):
+        self.chat_interval = chat_interval
+        self.global_interval = 1 / global_rate
+        self.retries = retries
+        self._next_global = 0.0
+        self._next_chat = {}
+        self.metrics = {'requests': 0, 'throttled': 0, 'retry_after': 0, 'timeouts': 0}
+
+    async def _wait_turn(self, chat_id, messages):
+        # слот резервируется до ожидания: в одном event loop это атомарно
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        slot = max(now, self._next_global, self._next_chat.get(chat_id, 0.0))
+        self._next_global = slot + self.global_interval
+        self._next_chat[chat_id] = slot + self.chat_interval * messages
+        if slot > now:
+            self.metrics['throttled'] += 1
+            await asyncio.sleep(slot - now)
+
+    async def call(self, chat_id, send, messages=1):
+        """Выполнить send() в свой слот; messages - сколько сообщений появится в чате"""
+        for attempt in range(self.retries + 1):
+            await self._wait_turn(chat_id, messages)
+            self.metrics['requests'] += 1
+            try:
+                return await send()
+            except RetryAfter as e:
+                if attempt == self.retries:
+                    raise
+                delay = _seconds(e.retry_after)
+                self.metrics['retry_after'] += 1
+                logger.warning(f"Flood control в чате {chat_id}: повтор через {delay:.0f} с")
+                loop = asyncio.get_running_loop()
+                # неотправленный запрос слот не занял: чат ждет ровно столько, сколько сказал Telegram
+                self._next_chat[chat_id] = loop.time() + delay
+            except TimedOut:
+                # альбом мог уйти, но ответа нет: повтор дал бы дубликат
+                self.metrics['timeouts'] += 1
+                raise
+
+    async def send_photos(self, message, plots):
+        """Отправить графики (байты PNG или file_id) ответом на message; file_id отправленных по порядку"""
+        file_ids = []
+        for start in range(0, len(plots), MEDIA_GROUP_LIMIT):
+            chunk = plots[start:start + MEDIA_GROUP_LIMIT]
+            if len(chunk) == 1:
+                sent = [await self.call(message.chat_id, lambda: message.reply_photo(photo=chunk[0]))]
+            else:
+                media = [InputMediaPhoto(media=image) for image in chunk]
+                sent = await self.call(message.chat_id, lambda: message.reply_media_group(media=media), len(chunk))
+            file_ids.extend(item.photo[-1].file_id if item and item.photo else None for item in sent)
+        return file_ids
+
+    def stats(self):
+        return dict(self.metrics)
@@ -1,6 +1,12 @@
 # report_services/company_dynamics_service.py
 import pandas as pd
 from datetime import datetime
+from storage.reporting_calendar import is_month_end
+
+MONTH_NAMES = {
+    '01': 'Январь', '02': 'Февраль', '03': 'Март', '04': 'Апрель', '05': 'Май', '06': 'Июнь',
+    '07': 'Июль', '08': 'Август', '09': 'Сентябрь', '10': 'Октябрь', '11': 'Ноябрь', '12': 'Декабрь',
+}
 
 class CompanyDynamicsService:
     def __init__(self, data_repository):
@@ -25,10 +31,10 @@ class CompanyDynamicsService:
         
         # Добавляем детальную статистику по месяцам
         text += "📊 ДЕТАЛЬНАЯ СТАТИСТИКА ПО МЕСЯЦАМ:\n"
-        month_names = {'2025-07': 'Июль', '2025-08': 'Август', '2025-09': 'Сентябрь'}
+        several_years = data['month'].str[:4].nunique() > 1
         
         for _, row in data.iterrows():
-            month_name = month_names.get(row['month'], row['month'])
+            month_name = self._month_name(row['month'], several_years)
             net_growth = row['hires'] - row['fires']
             trend = "▲" if net_growth > 0 else "▼"
             
@@ -38,10 +44,8 @@ class CompanyDynamicsService:
             text += f"  Увольнения: {int(row['fires'])} чел.\n"
             text += f"  Чистый прирост: {trend} {abs(int(net_growth))} чел.\n\n"
         
-        # Добавляем примечание про сентябрь
-        text += "📝 Примечание: Данные за сентябрь актуальны на 3-е число месяца, \n"
-        text += "в то время как данные за июль и август - на конец месяца. \n"
-        text += "Это объясняет разницу в абсолютных показателях.\n\n"
+        # Примечание про промежуточные срезы (не на конец месяца)
+        text += self._partial_months_note(data, several_years)
         
         # Итоги за период
         total_hires = data['hires'].sum()
@@ -78,6 +82,32 @@ class CompanyDynamicsService:
         
         return text
     
+    def _month_name(self, month, with_year=False):
+        """'2025-08' -> 'Август' (с годом, если в данных несколько лет)"""
+        name = MONTH_NAMES.get(month[5:7], month)
+        return f"{name} {month[:4]}" if with_year and name != month else name
+
+    def _partial_months_note(self, data, several_years):
+        """Примечание о месяцах с промежуточным срезом: их показатели не сравнимы с полными месяцами"""
+        calendar = self.repo.calendar.current()
+        partial = {}
+        for month in data['month']:
+            report_date = calendar.month_date(month)
+            if report_date is not None and not is_month_end(report_date):
+                partial[month] = report_date
+        if not partial:
+            return ""
+        text = "📝 Примечание: " + "; ".join(
+            f"Данные за {self._month_name(month, several_years).lower()} актуальны на {int(report_date[8:])}-е число месяца"
+            for month, report_date in partial.items()
+        ) + ", \n"
+        full = [self._month_name(month, several_years).lower() for month in data['month'] if month not in partial]
+        if full:
+            others = ' и '.join(full) if len(full) <= 2 else "остальные месяцы"
+            text += f"в то время как данные за {others} - на конец месяца. \n"
+        text += "Это объясняет разницу в абсолютных показателях.\n\n"
+        return text
+
     def _prepare_plot_data(self, data):
         """Подготовка данных для графика"""
         if len(data) == 0:
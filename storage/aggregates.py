@@ -0,0 +1,313 @@
+# aggregates.py
+import hashlib
+import logging
+import sqlite3
+import sys
+import os
+from datetime import datetime
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database import DatabaseManager
+
+logger = logging.getLogger(__name__)
+
+AGGREGATES_TABLE = 'hr_snapshot_aggregates'
+AGGREGATE_DATES_TABLE = 'hr_snapshot_aggregate_dates'
+# Помесячная динамика компании ("📈 Динамика компании"): месяц пересчитывается, только когда изменились его строки
+DYNAMICS_TABLE = 'hr_monthly_dynamics'
+
+# Зерно агрегата: report_date × эти измерения
+AGGREGATE_DIMENSIONS = ('service', 'age_category', 'sex', 'experience_category', 'cluster')
+
+# Суммы и счетчики хранятся отдельно, чтобы средние можно было пересобрать на любом уровне
+AGGREGATE_MEASURES = {
+    'row_count': 'COUNT(*)',
+    'employee_count': 'COUNT(DISTINCT employee_key)',
+    'hires': 'SUM(hirecount)',
+    'fires': 'SUM(firecount)',
+    'age_sum': 'SUM(fullyears)',
+    'age_count': 'COUNT(fullyears)',
+    'experience_sum': 'SUM(experience)',
+    'experience_count': 'COUNT(experience)',
+    'fte_sum': 'SUM(fte)',
+    'fte_count': 'COUNT(fte)',
+    'zero_fte_count': 'SUM(CASE WHEN fte = 0 THEN 1 ELSE 0 END)',
+    'recent_hires_count': 'SUM(CASE WHEN experience < 3 THEN 1 ELSE 0 END)',
+}
+
+
+def create_aggregate_tables(conn):
+    dimensions = ',\n            '.join(f"{name} TEXT" for name in AGGREGATE_DIMENSIONS)
+    measures = ',\n            '.join(
+        f"{name} {'INTEGER' if name.endswith('count') or name in ('hires', 'fires') else 'REAL'}"
+        for name in AGGREGATE_MEASURES
+    )
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {AGGREGATES_TABLE} (
+            report_date TEXT NOT NULL,
+            {dimensions},
+            {measures}
+        )
+    """)
+    conn.execute(
+        f"CREATE INDEX IF NOT EXISTS idx_{AGGREGATES_TABLE}_date_service "
+        f"ON {AGGREGATES_TABLE} (report_date, service)"
+    )
+    # Учет пересчитанных дат: по row_count и checksum (date_checksums) видно, что строки даты перезалили
+    # или изменили на месте. additive = 1, если сотрудник попадает ровно в одну группу среза и численности
+    # можно суммировать
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {AGGREGATE_DATES_TABLE} (
+            report_date TEXT PRIMARY KEY,
+            row_count INTEGER NOT NULL,
+            employee_count INTEGER NOT NULL,
+            additive INTEGER NOT NULL,
+            refreshed_at TEXT NOT NULL,
+            checksum INTEGER
+        )
+    """)
+    if not any(row[1] == 'checksum' for row in conn.execute(f"PRAGMA table_info({AGGREGATE_DATES_TABLE})")):
+        # учет старых баз: даты без контрольной суммы устарели и пересчитаются при следующем refresh
+        conn.execute(f"ALTER TABLE {AGGREGATE_DATES_TABLE} ADD COLUMN checksum INTEGER")
+    # row_count и checksum месяца (month_checksums) - по ним видно, что строки месяца изменились
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {DYNAMICS_TABLE} (
+            month TEXT PRIMARY KEY,
+            hires INTEGER,
+            fires INTEGER,
+            total_employees INTEGER NOT NULL,
+            row_count INTEGER NOT NULL,
+            checksum INTEGER NOT NULL,
+            refreshed_at TEXT NOT NULL
+        )
+    """)
+
+
+# Число строк и суммы по датам: читаются из покрывающего индекса (report_date, employee_key, hirecount, firecount)
+DATE_CHECKSUM_QUERY = """
+    SELECT report_date, COUNT(*), SUM(employee_key), SUM(hirecount), SUM(firecount)
+    FROM hr_data_clean
+    GROUP BY report_date
+"""
+
+
+def _number(value):
+    """Сумма как целое, если она целая: SQLite и DuckDB возвращают суммы разных типов"""
+    return int(value) if value is not None and float(value).is_integer() else value
+
+
+def _checksum(*parts):
+    digest = hashlib.blake2b(repr(parts).encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big', signed=True)
+
+
+def checksums_from_rows(rows, writes):
+    """{report_date: (число строк, контрольная сумма)} по строкам DATE_CHECKSUM_QUERY и счетчику записей дат.
+
+    Сумма меняется, если изменились employee_key, наймы или увольнения среза, а счетчик записей
+    (storage.schema.WRITES_TABLE) - при любой правке строк даты, в том числе других колонок"""
+    return {
+        report_date: (count, _checksum(_number(keys), _number(hires), _number(fires), writes.get(report_date, 0)))
+        for report_date, count, keys, hires, fires in rows
+    }
+
+
+def date_checksums(conn):
+    """{report_date: (число строк, контрольная сумма)} по индексам партиций"""
+    from storage.schema import date_writes, partition_tables, union_partitions
+
+    query, params = union_partitions(DATE_CHECKSUM_QUERY, (), partition_tables(conn))
+    return checksums_from_rows(conn.execute(query, params), date_writes(conn) or {})
+
+
+def month_checksums(checksums):
+    """{месяц: (число строк, контрольная сумма)} из date_checksums; месяц - первые 7 символов report_date"""
+    months = {}
+    for report_date, state in sorted((date, state) for date, state in checksums.items() if date is not None):
+        months.setdefault(report_date[:7], []).append((report_date, state))
+    return {month: (sum(count for _, (count, _) in dates), _checksum(*dates)) for month, dates in months.items()}
+
+
+def stale_report_dates(conn, checksums=None):
+    """Даты, которых нет в агрегатах или у которых изменились число строк или контрольная сумма;
+    и даты, которых больше нет в данных"""
+    if checksums is None:
+        checksums = date_checksums(conn)
+    done = {report_date: (row_count, checksum) for report_date, row_count, checksum in
+            conn.execute(f"SELECT report_date, row_count, checksum FROM {AGGREGATE_DATES_TABLE}")}
+    stale = sorted(date for date, state in checksums.items() if done.get(date) != state)
+    removed = sorted(date for date in done if date not in checksums)
+    return stale, removed
+
+
+def refresh_aggregates(conn, report_dates=None, changed_dates=(), checksums=None):
+    """Пересчитать агрегаты за указанные даты (по умолчанию только новые и измененные).
+
+    changed_dates - даты, перезаписанные загрузкой: пересчитываются, даже если число строк не изменилось"""
+    if checksums is None:
+        checksums = date_checksums(conn)
+    if report_dates is None:
+        report_dates, removed = stale_report_dates(conn, checksums)
+        report_dates = sorted(set(report_dates) | set(changed_dates))
+    else:
+        removed = []
+
+    for report_date in removed:
+        conn.execute(f"DELETE FROM {AGGREGATES_TABLE} WHERE report_date = ?", (report_date,))
+        conn.execute(f"DELETE FROM {AGGREGATE_DATES_TABLE} WHERE report_date = ?", (report_date,))
+
+    dimensions = ', '.join(AGGREGATE_DIMENSIONS)
+    measures = ', '.join(AGGREGATE_MEASURES)
+    expressions = ', '.join(AGGREGATE_MEASURES.values())
+    for report_date in report_dates:
+        conn.execute(f"DELETE FROM {AGGREGATES_TABLE} WHERE report_date = ?", (report_date,))
+        conn.execute(f"""
+            INSERT INTO {AGGREGATES_TABLE} (report_date, {dimensions}, {measures})
+            SELECT report_date, {dimensions}, {expressions}
+            FROM hr_data_clean
+            WHERE report_date = ?
+            GROUP BY {dimensions}
+        """, (report_date,))
+        row_count, employee_count = conn.execute(
+            "SELECT COUNT(*), COUNT(DISTINCT employee_key) FROM hr_data_clean WHERE report_date = ?",
+            (report_date,)
+        ).fetchone()
+        grouped_employees = conn.execute(
+            f"SELECT COALESCE(SUM(employee_count), 0) FROM {AGGREGATES_TABLE} WHERE report_date = ?",
+            (report_date,)
+        ).fetchone()[0]
+        additive = int(grouped_employees == employee_count)
+        if not additive:
+            logger.warning(
+                f"Агрегаты за {report_date}: сотрудники попадают в несколько групп "
+                f"({grouped_employees} против {employee_count}), численность будет считаться по сырым данным"
+            )
+        conn.execute(f"""
+            INSERT OR REPLACE INTO {AGGREGATE_DATES_TABLE}
+                (report_date, row_count, employee_count, additive, refreshed_at, checksum)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (report_date, row_count, employee_count, additive, datetime.now().isoformat(timespec='seconds'),
+              checksums.get(report_date, (None, None))[1]))
+
+    if report_dates or removed:
+        logger.info(f"Агрегаты пересчитаны за {len(report_dates)} дат, удалены за {len(removed)}")
+    return list(report_dates)
+
+
+def refresh_dynamics(conn, changed_dates=(), full=False, checksums=None):
+    """Пересчитать помесячную динамику за месяцы, у которых изменились число строк или контрольная сумма.
+
+    Месяц - первые 7 символов report_date, как в прежнем GROUP BY substr(report_date, 1, 7);
+    changed_dates (перезалитые загрузкой даты) пересчитывают свои месяцы всегда"""
+    from storage.schema import HR_VIEW, partition_name, partition_tables
+
+    if checksums is None:
+        checksums = date_checksums(conn)
+    months = month_checksums(checksums)
+
+    done = {month: (row_count, checksum) for month, row_count, checksum in
+            conn.execute(f"SELECT month, row_count, checksum FROM {DYNAMICS_TABLE}")}
+    changed_months = {report_date[:7] for report_date in changed_dates if report_date is not None}
+    stale = sorted(month for month, state in months.items()
+                   if full or month in changed_months or done.get(month) != state)
+    removed = sorted(month for month in done if month not in months)
+
+    for month in removed:
+        conn.execute(f"DELETE FROM {DYNAMICS_TABLE} WHERE month = ?", (month,))
+
+    partitions = set(partition_tables(conn))
+    for month in stale:
+        # месяц - одна партиция; диапазон по report_date идет по индексу, substr отсекает лишнее
+        table = partition_name(f"{month}-01")
+        hires, fires, total_employees = conn.execute(f"""
+            SELECT SUM(hirecount), SUM(firecount), COUNT(DISTINCT employee_key)
+            FROM {table if table in partitions else HR_VIEW}
+            WHERE report_date >= ? AND report_date < ? AND substr(report_date, 1, 7) = ?
+        """, (month, month + '~', month)).fetchone()
+        row_count, checksum = months[month]
+        conn.execute(f"""
+            INSERT OR REPLACE INTO {DYNAMICS_TABLE}
+                (month, hires, fires, total_employees, row_count, checksum, refreshed_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, (month, hires, fires, total_employees, row_count, checksum,
+              datetime.now().isoformat(timespec='seconds')))
+
+    if stale or removed:
+        logger.info(f"Динамика пересчитана за {len(stale)} месяцев, удалена за {len(removed)}")
+    return stale
+
+
+class AggregateStore:
+    def __init__(self, db_path):
+        self.db = DatabaseManager(db_path)
+
+    def refresh(self, full=False, changed_dates=()):
+        """Инкрементально обновить агрегаты и помесячную динамику; full=True пересчитывает все даты"""
+        conn = self.db.get_connection()
+        try:
+            with conn:
+                create_aggregate_tables(conn)
+                checksums = date_checksums(conn)
+                refresh_dynamics(conn, changed_dates, full, checksums)
+                if full:
+                    from storage.schema import partition_tables, union_partitions
+
+                    query, params = union_partitions(
+                        "SELECT DISTINCT report_date FROM hr_data_clean ORDER BY report_date",
+                        (), partition_tables(conn), 'UNION'
+                    )
+                    report_dates = [row[0] for row in conn.execute(query, params)]
+                    conn.execute(f"DELETE FROM {AGGREGATES_TABLE}")
+                    conn.execute(f"DELETE FROM {AGGREGATE_DATES_TABLE}")
+                    return refresh_aggregates(conn, report_dates)
+                return refresh_aggregates(conn, changed_dates=changed_dates, checksums=checksums)
+        finally:
+            conn.close()
+
+    def status(self):
+        conn = self.db.get_connection()
+        try:
+            return conn.execute(f"""
+                SELECT d.report_date, d.row_count, d.employee_count, d.additive, d.refreshed_at,
+                       (SELECT COUNT(*) FROM {AGGREGATES_TABLE} a WHERE a.report_date = d.report_date)
+                FROM {AGGREGATE_DATES_TABLE} d
+                ORDER BY d.report_date
+            """).fetchall()
+        except sqlite3.Error as e:
+            logger.warning(f"Агрегаты недоступны: {e}")
+            return []
+        finally:
+            conn.close()
+
+    def dynamics_status(self):
+        conn = self.db.get_connection()
+        try:
+            return conn.execute(
+                f"SELECT month, row_count, total_employees, refreshed_at FROM {DYNAMICS_TABLE} ORDER BY month"
+            ).fetchall()
+        except sqlite3.Error as e:
+            logger.warning(f"Помесячная динамика недоступна: {e}")
+            return []
+        finally:
+            conn.close()
+
+
+if __name__ == "__main__":
+    import argparse
+    from config import DB_PATH
+
+    parser = argparse.ArgumentParser(description="Материализованные агрегаты hr_data_clean")
+    parser.add_argument('command', nargs='?', default='refresh', choices=['refresh', 'rebuild', 'status'])
+    parser.add_argument('--db', default=DB_PATH)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    store = AggregateStore(args.db)
+    if args.command == 'status':
+        for report_date, rows, employees, additive, refreshed_at, groups in store.status():
+            print(f"{report_date}: {rows} строк -> {groups} групп, сотрудников {employees}, "
+                  f"{'аддитивно' if additive else 'НЕ аддитивно'}, обновлено {refreshed_at}")
+        for month, rows, employees, refreshed_at in store.dynamics_status():
+            print(f"динамика {month}: {rows} строк, сотрудников {employees}, обновлено {refreshed_at}")
+    else:
+        refreshed = store.refresh(full=args.command == 'rebuild')
+        print(f"Пересчитано дат: {len(refreshed)}")
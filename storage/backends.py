@@ -0,0 +1,427 @@
+# backends.py
+"""DuckDB как движок чтения для DatabaseManager (DB_BACKEND = 'duckdb').
+
+Источник - таблицы SQLite-файла, скопированные в память (перечитываются при изменении базы),
+или Parquet-выгрузка (python -m storage.backends export). Запросы пишутся в диалекте SQLite
+и переводятся translate_query; расхождения проверяет python -m storage.backends verify."""
+import logging
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from decimal import Decimal
+from functools import lru_cache
+from pathlib import Path
+import pandas as pd
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import DUCKDB_SOURCE, DUCKDB_PARQUET_DIR, DUCKDB_THREADS
+from storage.schema import PARTITION_PATTERN
+
+logger = logging.getLogger(__name__)
+
+# Типы SQLite -> DuckDB: REAL в SQLite 8-байтный, а REAL/FLOAT в DuckDB - 4-байтный
+_DUCKDB_TYPES = {'INTEGER': 'BIGINT', 'REAL': 'DOUBLE', 'TEXT': 'VARCHAR'}
+_ARROW_TYPES = {'BIGINT': 'int64', 'DOUBLE': 'float64', 'VARCHAR': 'string'}
+_SQLITE_TYPES = {'BIGINT': 'INTEGER', 'DOUBLE': 'REAL', 'VARCHAR': 'TEXT'}
+
+# Поведение SQLite: целочисленное деление, NULL первыми при ASC и последними при DESC
+_SESSION_SETTINGS = (
+    "SET GLOBAL integer_division = true",
+    "SET GLOBAL default_null_order = 'nulls_first_on_asc_last_on_desc'",
+)
+
+_FLOAT_CAST = re.compile(r"\bAS\s+FLOAT\b", re.IGNORECASE)
+_LIKE = re.compile(r"\b(\w+)\s+(NOT\s+)?LIKE\s+(\?|'(?:[^']|'')*')", re.IGNORECASE)
+_TABLE_INFO = re.compile(r"^\s*PRAGMA\s+table_info\s*\(\s*['\"]?(\w+)['\"]?\s*\)\s*;?\s*$", re.IGNORECASE)
+_ASCII_UPPER = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+
+
+@lru_cache(maxsize=4096)
+def translate_query(query):
+    """SQL репозитория и инструментов (диалект SQLite) -> DuckDB"""
+    match = _TABLE_INFO.match(query)
+    if match:
+        mapping = ' '.join(f"WHEN '{duck}' THEN '{lite}'" for duck, lite in _SQLITE_TYPES.items())
+        return (f"SELECT cid, name, CASE type {mapping} ELSE type END AS type, "
+                f"CAST(\"notnull\" AS INTEGER) AS \"notnull\", dflt_value, CAST(pk AS INTEGER) AS pk "
+                f"FROM pragma_table_info('{match.group(1)}')")
+    query = _FLOAT_CAST.sub('AS DOUBLE', query)
+    # LIKE в SQLite не различает регистр только для латиницы
+    return _LIKE.sub(r"sqlite_fold(\1) \2LIKE sqlite_fold(\3)", query)
+
+
+def _decimal_columns(description):
+    return [i for i, column in enumerate(description or ()) if str(column[1]).startswith('DECIMAL')]
+
+
+def _plain_rows(rows, description):
+    """DECIMAL из литералов вида 100.0 - в float, как их вернул бы SQLite"""
+    decimals = _decimal_columns(description)
+    if not decimals:
+        return tuple(rows)
+    converted = []
+    for row in rows:
+        row = list(row)
+        for i in decimals:
+            if isinstance(row[i], Decimal):
+                row[i] = float(row[i])
+        converted.append(tuple(row))
+    return tuple(converted)
+
+
+def _sqlite_tables(conn):
+    """Таблицы и представления для копирования; помесячные партиции копируются одной таблицей hr_data_clean"""
+    return [row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type IN ('table', 'view') AND name NOT LIKE 'sqlite_%' "
+        "AND name NOT LIKE ? ESCAPE '\\' ORDER BY name", (PARTITION_PATTERN,)
+    )]
+
+
+class DuckDBPool:
+    """Тот же интерфейс, что у database.ConnectionPool: connection(), read_frame/read_rows/explain, recycle"""
+
+    def __init__(self, db_path, source=None, parquet_dir=None, threads=DUCKDB_THREADS):
+        try:
+            import duckdb
+            import pyarrow
+        except ImportError:
+            raise RuntimeError("Для DB_BACKEND = 'duckdb' нужны пакеты duckdb и pyarrow: pip install duckdb pyarrow")
+        source = source or DUCKDB_SOURCE
+        if source not in ('sqlite', 'parquet'):
+            raise ValueError(f"Неизвестный источник DuckDB: {source}")
+        self.db_path = db_path
+        self.source = source
+        self.parquet_dir = parquet_dir or DUCKDB_PARQUET_DIR
+        self._duckdb = duckdb
+        self._pa = pyarrow
+        self._threads = threads
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._cursors = []
+        self._db = None
+        self._watcher = None
+        self._version = None
+        self.loads = 0
+
+    def _open(self):
+        db = self._duckdb.connect(':memory:', config={'threads': self._threads})
+        for statement in _SESSION_SETTINGS:
+            db.execute(statement)
+        db.execute(f"CREATE MACRO sqlite_fold(s) AS translate(s, '{_ASCII_UPPER}', '{_ASCII_UPPER.lower()}')")
+        return db
+
+    def _source_version(self):
+        """Версия источника: для SQLite - идентичность файла и PRAGMA data_version, для Parquet - mtime файлов"""
+        if self.source == 'parquet':
+            return tuple(sorted((path.name, path.stat().st_mtime_ns) for path in Path(self.parquet_dir).glob('*.parquet')))
+        st = os.stat(self.db_path)
+        identity = (st.st_dev, st.st_ino)
+        if self._watcher is None or self._version is None or self._version[0] != identity:
+            if self._watcher is not None:
+                self._watcher.close()
+            uri = Path(self.db_path).resolve().as_uri() + '?mode=ro'
+            self._watcher = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        return identity, st.st_mtime_ns, self._watcher.execute("PRAGMA data_version").fetchone()[0]
+
+    def _load_sqlite(self):
+        """Скопировать таблицы SQLite в память одной транзакцией: читатели видят либо старые данные, либо новые"""
+        source = sqlite3.connect(Path(self.db_path).resolve().as_uri() + '?mode=ro', uri=True)
+        try:
+            self._db.execute("BEGIN")
+            for table in _sqlite_tables(source):
+                info = source.execute(f"PRAGMA table_info({table})").fetchall()
+                names = [column[1] for column in info]
+                types = [_DUCKDB_TYPES.get(column[2].upper(), 'VARCHAR') for column in info]
+                columns = ', '.join(f'"{name}" {column_type}' for name, column_type in zip(names, types))
+                self._db.execute(f'CREATE OR REPLACE TABLE "{table}" ({columns})')
+                cursor = source.execute(f'SELECT {", ".join(f"{chr(34)}{name}{chr(34)}" for name in names)} FROM "{table}"')
+                while True:
+                    rows = cursor.fetchmany(200000)
+                    if not rows:
+                        break
+                    chunk = self._pa.table(
+                        [self._column(table, name, values, column_type)
+                         for name, values, column_type in zip(names, zip(*rows), types)],
+                        names=names
+                    )
+                    self._db.register('_chunk', chunk)
+                    self._db.execute(f'INSERT INTO "{table}" SELECT * FROM _chunk')
+                    self._db.unregister('_chunk')
+            self._db.execute("COMMIT")
+        except Exception:
+            self._db.execute("ROLLBACK")
+            raise
+        finally:
+            source.close()
+
+    def _column(self, table, name, values, column_type):
+        """Колонка Arrow с NULL; значения не своего типа (SQLite это допускает) приводятся"""
+        arrow_type = getattr(self._pa, _ARROW_TYPES[column_type])()
+        try:
+            return self._pa.array(values, type=arrow_type)
+        except (self._pa.ArrowInvalid, self._pa.ArrowTypeError):
+            if column_type == 'VARCHAR':
+                return self._pa.array([None if value is None else str(value) for value in values], type=arrow_type)
+            logger.warning(f"{table}.{name}: значения не приводятся к {column_type}, нечисловые станут NULL")
+            numbers = pd.to_numeric(pd.Series(values, dtype=object), errors='coerce')
+            if column_type == 'BIGINT':
+                numbers = numbers.round()
+            return self._pa.array(numbers, type=arrow_type, from_pandas=True)
+
+    def _load_parquet(self):
+        paths = sorted(Path(self.parquet_dir).glob('*.parquet'))
+        if not paths:
+            raise RuntimeError(f"Нет Parquet-выгрузки в {self.parquet_dir}: python -m storage.backends export")
+        for path in paths:
+            self._db.execute(f"CREATE OR REPLACE VIEW \"{path.stem}\" AS SELECT * FROM read_parquet('{path.as_posix()}')")
+
+    def _ensure_loaded(self):
+        with self._lock:
+            version = self._source_version()
+            if version == self._version and self._db is not None:
+                return
+            started = time.perf_counter()
+            if self._db is None:
+                self._db = self._open()
+            if self.source == 'sqlite':
+                self._load_sqlite()
+            else:
+                self._load_parquet()
+            self._version = version
+            self.loads += 1
+            logger.info(f"DuckDB: данные {self.db_path if self.source == 'sqlite' else self.parquet_dir} "
+                        f"загружены за {time.perf_counter() - started:.2f} с")
+
+    def _cursor(self):
+        cursor = getattr(self._local, 'cursor', None)
+        if cursor is None or getattr(self._local, 'db', None) is not self._db:
+            cursor = self._db.cursor()
+            self._local.cursor = cursor
+            self._local.db = self._db
+            with self._lock:
+                self._cursors.append(cursor)
+        return cursor
+
+    @contextmanager
+    def connection(self):
+        """Курсор DuckDB текущего потока; данные перед выдачей сверяются с источником"""
+        self._ensure_loaded()
+        yield self._cursor()
+
+    @staticmethod
+    def read_frame(conn, query, params):
+        cursor = conn.execute(translate_query(query), list(params or ()))
+        columns = [column[0] for column in cursor.description or ()]
+        return pd.DataFrame.from_records(cursor.fetchall(), columns=columns, coerce_float=True)
+
+    @staticmethod
+    def read_rows(conn, query, params):
+        cursor = conn.execute(translate_query(query), list(params or ()))
+        rows = _plain_rows(cursor.fetchall(), cursor.description)
+        return tuple(column[0] for column in cursor.description or ()), rows
+
+    @staticmethod
+    def explain(conn, query, params):
+        return '\n'.join(row[1] for row in conn.execute(f"EXPLAIN {translate_query(query)}", list(params or ())).fetchall())
+
+    def export_parquet(self, out_dir):
+        """Выгрузить все таблицы в Parquet (файл на таблицу) для DUCKDB_SOURCE = 'parquet'"""
+        os.makedirs(out_dir, exist_ok=True)
+        with self.connection() as conn:
+            tables = [row[0] for row in conn.execute("SELECT table_name FROM duckdb_tables() ORDER BY table_name").fetchall()]
+            for table in tables:
+                path = os.path.join(out_dir, f"{table}.parquet")
+                tmp_path = f"{path}.tmp"
+                conn.execute(f"COPY \"{table}\" TO '{Path(tmp_path).as_posix()}' (FORMAT PARQUET)")
+                os.replace(tmp_path, path)
+        return tables
+
+    def recycle(self):
+        """Файл базы подменили: перечитать данные при следующем запросе"""
+        with self._lock:
+            self._version = None
+
+    def close(self):
+        with self._lock:
+            for cursor in self._cursors:
+                try:
+                    cursor.close()
+                except self._duckdb.Error:
+                    pass
+            self._cursors.clear()
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+            if self._watcher is not None:
+                self._watcher.close()
+                self._watcher = None
+            self._version = None
+
+    def stats(self):
+        return {
+            'backend': 'duckdb',
+            'source': self.source,
+            'cursors': len(self._cursors),
+            'loads': self.loads
+        }
+
+
+def _verification_calls(repo, tools, complex_tools, report_date, service):
+    """Все запросы репозитория и инструментов ИИ с типичными аргументами: (название, вызов)"""
+    calls = [
+        ('repo.last_report_date', lambda: repo.get_last_report_date()),
+        ('repo.demographics', lambda: repo.get_demographics_data(report_date)),
+        ('repo.company_dynamics', lambda: repo.get_company_dynamics()),
+        ('repo.service_stats', lambda: repo.get_service_stats(report_date)),
+        ('repo.risk_assessment', lambda: repo.get_risk_assessment_data(report_date)),
+        ('repo.hiring_recommendations', lambda: repo.get_hiring_recommendations_data()),
+        ('repo.detailed_service', lambda: repo.get_detailed_service_analysis(service, report_date)),
+        ('repo.service_hiring', lambda: repo.get_service_hiring_analysis(service)),
+        ('repo.all_services', lambda: repo.get_all_services()),
+        ('repo.service_mapping', lambda: repo.get_service_mapping()),
+        ('repo.find_service', lambda: repo.find_service_by_alias(service[:4].lower())),
+    ]
+    filter_sets = [None, {'service': service}, {'sex': 'F', 'experience': '>24'}, {'location_name': '%Москва%'}]
+    for metric in ['headcount', 'turnover_rate', 'average_experience', 'average_age', 'average_fte', 'total_fired',
+                   'total_hired', 'fte_distribution', 'remote_workers', 'full_time_ratio', 'young_workers',
+                   'experienced_workers']:
+        for filters in filter_sets:
+            calls.append((f'tools.calculate_metric {metric} {filters}',
+                          lambda m=metric, f=filters: tools.calculate_metric(m, dict(f) if f else None)))
+    for column in ['service', 'sex', 'fte', 'fullyears', 'location_name', 'age_category']:
+        calls.append((f'tools.column_statistics {column}', lambda c=column: tools.get_column_statistics(c, {'sex': 'F'})))
+        calls.append((f'tools.top_values {column}', lambda c=column: tools.get_top_values(c, 7, {'service': service})))
+        calls.append((f'tools.unique_values {column}', lambda c=column: tools.get_unique_values(c)))
+    calls.append(('tools.column_info', lambda: tools.get_column_info()))
+    for metric in ['headcount', 'turnover_rate', 'average_age', 'average_experience', 'average_fte',
+                   'total_fired', 'total_hired']:
+        calls.append((f'tools.time_series {metric}', lambda m=metric: tools.time_series_analysis(m, None, {'service': service})))
+        calls.append((f'complex.trend {metric}', lambda m=metric: complex_tools.trend_analysis(m, '3month', None)))
+        calls.append((f'complex.complex_metric {metric}', lambda m=metric: complex_tools.calculate_complex_metric(m, {'sex': 'M'})))
+        for dimension in ['service', 'sex', 'age_category', 'location_name']:
+            calls.append((f'complex.compare {metric} {dimension}',
+                          lambda m=metric, d=dimension: complex_tools.compare_metrics(m, d, None)))
+            calls.append((f'complex.compare_min {metric} {dimension}',
+                          lambda m=metric, d=dimension: complex_tools.compare_metrics_min(m, d, {'fte': '1.0'})))
+    for dimension in ['age_category', 'sex', 'cluster', 'experience_category']:
+        calls.append((f'complex.attrition {dimension}',
+                      lambda d=dimension: complex_tools.analyze_attrition_by_demography(service, d, None)))
+    for segments in (['age_category', 'experience_category'], ['service', 'sex']):
+        calls.append((f'complex.segmentation {segments}', lambda s=segments: complex_tools.deep_segmentation_analysis(
+            s, ['headcount', 'attrition_rate', 'avg_fte', 'avg_age', 'avg_experience'], None)))
+    calls.append(('complex.risk', lambda: complex_tools.attrition_risk_analysis(service, None, None)))
+    calls.append(('complex.risk_factors', lambda: complex_tools.attrition_risk_analysis(None, ['sex', 'fte'], None)))
+    calls.append(('complex.hiring_needs', lambda: complex_tools.calculate_hiring_needs(service)))
+    calls.append(('complex.hiring_needs_all', lambda: complex_tools.calculate_hiring_needs(None, 'month', {'sex': 'F'})))
+    return calls
+
+
+def _run_catalogue(db_path, backend, report_date, service):
+    import asyncio
+    from database import DatabaseManager
+    from menu.data_repository import HRDataRepository
+    from ai_core.agent_tools import AgentTools
+    from ai_core.agent_tools_complex import ComplexAgentTools
+
+    default_backend = DatabaseManager.default_backend
+    DatabaseManager.default_backend = backend
+    try:
+        repo = HRDataRepository(db_path)
+        tools = AgentTools(db_path)
+        complex_tools = ComplexAgentTools(db_path)
+    finally:
+        DatabaseManager.default_backend = default_backend
+    # снимок в памяти ответил бы одинаково на обоих движках - сравниваем именно SQL
+    tools.snapshot = complex_tools.snapshot = None
+
+    async def run():
+        results = {}
+        for name, call in _verification_calls(repo, tools, complex_tools, report_date, service):
+            try:
+                result = call()
+                results[name] = await result if asyncio.iscoroutine(result) else result
+            except Exception as e:
+                results[name] = f"исключение {type(e).__name__}: {e}"
+        return results
+
+    return asyncio.run(run())
+
+
+def _compare(expected, actual):
+    """None - совпадает; иначе описание расхождения"""
+    if isinstance(expected, pd.DataFrame) and isinstance(actual, pd.DataFrame):
+        try:
+            pd.testing.assert_frame_equal(expected, actual)
+            return None
+        except AssertionError as e:
+            key = list(expected.columns)
+            try:
+                pd.testing.assert_frame_equal(expected.sort_values(key).reset_index(drop=True),
+                                              actual.sort_values(key).reset_index(drop=True))
+                return "строки совпадают, отличается порядок"
+            except (AssertionError, TypeError):
+                return ' '.join(str(e).split())[:300]
+    if isinstance(expected, (tuple, list)) and isinstance(actual, (tuple, list)) and len(expected) == len(actual):
+        for i, (left, right) in enumerate(zip(expected, actual)):
+            difference = _compare(left, right)
+            if difference is not None:
+                return f"[{i}] {difference}"
+        return None
+    if isinstance(expected, dict) and isinstance(actual, dict) and expected.keys() == actual.keys():
+        for key in expected:
+            difference = _compare(expected[key], actual[key])
+            if difference is not None:
+                return f"[{key!r}] {difference}"
+        return None
+    if type(expected) is not type(actual) or expected != actual:
+        return f"{str(expected)[:200]!r} != {str(actual)[:200]!r}"
+    return None
+
+
+def verify_backends(db_path, source=None, parquet_dir=None):
+    """Прогнать запросы репозитория и инструментов на SQLite и DuckDB: (число запросов, [(название, расхождение)])"""
+    from database import DatabaseManager
+    global DUCKDB_SOURCE, DUCKDB_PARQUET_DIR
+    DUCKDB_SOURCE = source or DUCKDB_SOURCE
+    DUCKDB_PARQUET_DIR = parquet_dir or DUCKDB_PARQUET_DIR
+    db = DatabaseManager(db_path, backend='sqlite')
+    report_date = db.execute_scalar("SELECT MAX(report_date) FROM hr_data_clean")
+    service = db.execute_scalar(
+        "SELECT service FROM hr_data_clean WHERE report_date = ? GROUP BY service ORDER BY COUNT(*) DESC LIMIT 1",
+        (report_date,)
+    )
+    expected = _run_catalogue(db_path, 'sqlite', report_date, service)
+    actual = _run_catalogue(db_path, 'duckdb', report_date, service)
+    mismatches = []
+    for name, value in expected.items():
+        difference = _compare(value, actual[name])
+        if difference is not None:
+            mismatches.append((name, difference))
+    return len(expected), mismatches
+
+
+if __name__ == "__main__":
+    import argparse
+    from config import DB_PATH
+
+    parser = argparse.ArgumentParser(description="DuckDB как движок чтения базы HR")
+    parser.add_argument('command', choices=['verify', 'export'])
+    parser.add_argument('--db', default=DB_PATH)
+    parser.add_argument('--source', choices=['sqlite', 'parquet'], help="источник DuckDB для verify")
+    parser.add_argument('--out', default=DUCKDB_PARQUET_DIR, help="каталог Parquet-выгрузки")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+    logging.getLogger('database.slow').setLevel(logging.ERROR)
+
+    if args.command == 'export':
+        tables = DuckDBPool(args.db, source='sqlite').export_parquet(args.out)
+        print(f"Выгружено в {args.out}: {', '.join(tables)}")
+    else:
+        total, mismatches = verify_backends(args.db, args.source, args.out)
+        for name, difference in mismatches:
+            print(f"РАСХОЖДЕНИЕ {name}: {difference}")
+        print(f"Проверено запросов: {total}, расхождений: {len(mismatches)}")
+        sys.exit(1 if mismatches else 0)
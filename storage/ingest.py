@@ -0,0 +1,319 @@
+# ingest.py
+import logging
+import sqlite3
+import sys
+import os
+import time
+from datetime import date, datetime
+import numpy as np
+import pandas as pd
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import (INGEST_CHUNK_SIZE, AGE_CATEGORY_BOUNDS, EXPERIENCE_CATEGORY_BOUNDS, DB_PRAGMAS,
+                    DB_BACKEND, DUCKDB_SOURCE, DUCKDB_PARQUET_DIR)
+from storage.schema import (HR_COLUMNS, SchemaManager, create_hr_table, create_indexes, drop_indexes,
+                            employee_natural_keys, canonical_date, is_canonical_date, partition_name,
+                            ensure_partition, rebuild_view, partition_tables, union_partitions,
+                            create_write_triggers, drop_write_triggers, bump_writes)
+from storage.aggregates import AggregateStore
+
+logger = logging.getLogger(__name__)
+
+COLUMN_NAMES = [name for name, _ in HR_COLUMNS]
+REAL_COLUMNS = [name for name, column_type in HR_COLUMNS if column_type == 'REAL']
+INTEGER_COLUMNS = [name for name, column_type in HR_COLUMNS if column_type == 'INTEGER']
+DATE_COLUMNS = ('report_date', 'hire_to_company', 'fire_from_company')
+
+# Без этих колонок выгрузку не загружаем; остальные при отсутствии будут NULL
+REQUIRED_COLUMNS = ('report_date', 'service', 'sex', 'fullyears', 'experience', 'fte',
+                    'hire_to_company', 'fire_from_company', 'hirecount', 'firecount')
+
+# Так в базе помечены работающие сотрудники (дата увольнения не заполнена)
+ACTIVE_FIRE_DATE = '1970-01-01'
+
+
+def _cell_text(value):
+    """Ячейка XLSX как текст выгрузки: пусто - '', целые числа без '.0', даты - YYYY-MM-DD"""
+    if value is None:
+        return ''
+    if isinstance(value, float):
+        return str(int(value)) if value.is_integer() else str(value)
+    if isinstance(value, (datetime, date)):
+        return value.strftime('%Y-%m-%d')
+    return str(value)
+
+
+def _categorize(numbers, bounds):
+    """Категория по границам (верхняя граница не включительно); NaN - NULL"""
+    result = np.full(len(numbers), None, dtype=object)
+    remaining = ~np.isnan(numbers)
+    for upper, label in bounds:
+        hit = remaining.copy() if upper is None else remaining & (numbers < upper)
+        result[hit] = label
+        remaining &= ~hit
+    return result
+
+
+def _to_numbers(series):
+    """Числа из текста выгрузки, в том числе с десятичной запятой; пусто - NaN"""
+    text = series.str.strip().str.replace(',', '.', regex=False)
+    return pd.to_numeric(text, errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+
+
+def _to_text(series):
+    """Текст без пробелов по краям; пустая строка - NULL"""
+    return [value or None for value in series.str.strip().tolist()]
+
+
+class _EmployeeKeys:
+    """Сопоставление естественного ключа и employee_key; в памяти - только уже встреченные сотрудники"""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.known = {}
+
+    def resolve(self, natural_keys):
+        new = list({key for key in natural_keys if key is not None and key not in self.known})
+        if new:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO employee_keys (natural_key) VALUES (?)", ((key,) for key in new)
+            )
+            for start in range(0, len(new), 500):
+                batch = new[start:start + 500]
+                placeholders = ', '.join('?' * len(batch))
+                self.known.update(self.conn.execute(
+                    f"SELECT natural_key, employee_key FROM employee_keys WHERE natural_key IN ({placeholders})", batch
+                ))
+        return [None if key is None else self.known[key] for key in natural_keys]
+
+
+def read_csv_chunks(path, chunk_size=INGEST_CHUNK_SIZE, encoding='utf-8-sig', sep=','):
+    """CSV читается кусками как текст: типы приводятся при подготовке, а не угадываются pandas"""
+    yield from pd.read_csv(path, chunksize=chunk_size, dtype=str, keep_default_na=False,
+                           encoding=encoding, sep=sep)
+
+
+def read_xlsx_chunks(path, chunk_size=INGEST_CHUNK_SIZE, sheet=None):
+    """XLSX в режиме read_only: openpyxl отдает строки потоком, без загрузки всего листа"""
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise RuntimeError("Для загрузки XLSX нужен пакет openpyxl: pip install openpyxl")
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        worksheet = workbook[sheet] if sheet else workbook.active
+        rows = worksheet.iter_rows(values_only=True)
+        header = [str(cell).strip() if cell is not None else '' for cell in next(rows, ())]
+        batch = []
+        for row in rows:
+            batch.append([_cell_text(value) for value in row])
+            if len(batch) >= chunk_size:
+                yield pd.DataFrame.from_records(batch, columns=header)
+                batch = []
+        if batch:
+            yield pd.DataFrame.from_records(batch, columns=header)
+    finally:
+        workbook.close()
+
+
+def read_chunks(path, chunk_size=INGEST_CHUNK_SIZE, sheet=None, encoding='utf-8-sig', sep=','):
+    extension = os.path.splitext(path)[1].lower()
+    if extension in ('.xlsx', '.xlsm'):
+        return read_xlsx_chunks(path, chunk_size, sheet)
+    if extension in ('.csv', '.txt'):
+        return read_csv_chunks(path, chunk_size, encoding, sep)
+    raise ValueError(f"Неподдерживаемый формат выгрузки: {path} (нужен CSV или XLSX)")
+
+
+def prepare_chunk(chunk, report_date=None):
+    """Привести кусок выгрузки к колонкам hr_data_clean: {колонка: список значений}"""
+    chunk = chunk.rename(columns=lambda name: str(name).strip().lower())
+    available = set(chunk.columns)
+    if report_date is not None:
+        available.add('report_date')
+    missing = [name for name in REQUIRED_COLUMNS if name not in available]
+    if missing:
+        raise ValueError(f"В выгрузке нет обязательных колонок: {', '.join(missing)}")
+
+    size = len(chunk)
+    columns = {}
+    for name in COLUMN_NAMES:
+        if name == 'report_date' and report_date is not None:
+            columns[name] = [report_date] * size
+        elif name not in chunk.columns:
+            columns[name] = [None] * size
+        elif name in REAL_COLUMNS or name in INTEGER_COLUMNS:
+            numbers = _to_numbers(chunk[name])
+            if name in INTEGER_COLUMNS:
+                columns[name] = [None if v != v else int(v) for v in numbers.tolist()]
+            else:
+                columns[name] = [None if v != v else v for v in numbers.tolist()]
+        else:
+            values = _to_text(chunk[name])
+            if name in DATE_COLUMNS:
+                values = [None if value is None else canonical_date(value) for value in values]
+            columns[name] = values
+
+    # по report_date выбирается партиция, и запросы сравнивают его на точное равенство
+    unknown = {value for value in columns['report_date'] if not is_canonical_date(value)}
+    if unknown:
+        examples = ', '.join(sorted(str(value) for value in unknown)[:5])
+        raise ValueError(f"Не распознаны даты среза (нужен формат YYYY-MM-DD): {examples}")
+
+    columns['fire_from_company'] = [ACTIVE_FIRE_DATE if value is None else value
+                                    for value in columns['fire_from_company']]
+
+    for name, source, bounds in (('age_category', 'fullyears', AGE_CATEGORY_BOUNDS),
+                                 ('experience_category', 'experience', EXPERIENCE_CATEGORY_BOUNDS)):
+        if None in columns[name]:
+            numbers = np.array([np.nan if v is None else v for v in columns[source]], dtype=np.float64)
+            derived = _categorize(numbers, bounds)
+            columns[name] = [d if value is None else value for value, d in zip(columns[name], derived)]
+
+    return columns
+
+
+def _rows_by_partition(report_dates, rows):
+    """{партиция: строки}; обычно выгрузка - один срез, и все строки идут в одну партицию"""
+    partitions = {report_date: partition_name(report_date) for report_date in set(report_dates)}
+    if len(set(partitions.values())) == 1:
+        return {next(iter(partitions.values())): rows}
+    grouped = {}
+    for report_date, row in zip(report_dates, rows):
+        grouped.setdefault(partitions[report_date], []).append(row)
+    return grouped
+
+
+class HRDataIngestor:
+    """Потоковая загрузка месячных выгрузок в партиции hr_data_clean одной транзакцией"""
+
+    def __init__(self, db_path, chunk_size=INGEST_CHUNK_SIZE):
+        self.db_path = db_path
+        self.chunk_size = chunk_size
+
+    def _prepare_database(self):
+        conn = sqlite3.connect(self.db_path)
+        try:
+            with conn:
+                create_hr_table(conn)
+        finally:
+            conn.close()
+        SchemaManager(self.db_path).migrate()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path)
+        conn.isolation_level = None  # транзакцией управляем явно, вместе со снятием индексов
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA cache_size={DB_PRAGMAS.get('cache_size', -65536)}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        return conn
+
+    def load(self, paths, report_date=None, replace=False, sheet=None, encoding='utf-8-sig', sep=','):
+        """Загрузить файлы; replace=True заменяет уже загруженные даты. Возвращает статистику загрузки"""
+        self._prepare_database()
+        conn = self._connect()
+        started = time.perf_counter()
+        total = 0
+        loaded_dates = set()
+        try:
+            query, params = union_partitions(
+                "SELECT DISTINCT report_date FROM hr_data_clean", (), partition_tables(conn), 'UNION'
+            )
+            existing_dates = {row[0] for row in conn.execute(query, params)}
+            keys = _EmployeeKeys(conn)
+            placeholders = ', '.join('?' * (len(COLUMN_NAMES) + 1))
+            insert = f"INSERT INTO {{}} ({', '.join(COLUMN_NAMES)}, employee_key) VALUES ({placeholders})"
+            touched = []
+            created = False
+
+            conn.execute("BEGIN")
+            for path in paths:
+                logger.info(f"Загрузка {path}")
+                for chunk in read_chunks(path, self.chunk_size, sheet, encoding, sep):
+                    columns = prepare_chunk(chunk, report_date)
+                    for chunk_date in sorted(set(columns['report_date']) - loaded_dates):
+                        partition, new = ensure_partition(conn, chunk_date)
+                        created |= new
+                        if chunk_date in existing_dates and not replace:
+                            raise ValueError(f"Данные за {chunk_date} уже загружены; для замены используйте replace")
+                        if partition not in touched:
+                            # Индексы партиции строятся (а счетчик записей даты увеличивается) один раз после
+                            # загрузки, а не на каждую удаленную и вставленную строку; партиции других месяцев
+                            # не трогаются
+                            drop_indexes(conn, [partition])
+                            drop_write_triggers(conn, [partition])
+                            touched.append(partition)
+                        if chunk_date in existing_dates:
+                            conn.execute(f"DELETE FROM {partition} WHERE report_date = ?", (chunk_date,))
+                            logger.info(f"Данные за {chunk_date} будут заменены")
+                        loaded_dates.add(chunk_date)
+
+                    employee_keys = keys.resolve(employee_natural_keys(columns))
+                    rows = zip(*(columns[name] for name in COLUMN_NAMES), employee_keys)
+                    for partition, partition_rows in _rows_by_partition(columns['report_date'], rows).items():
+                        conn.executemany(insert.format(partition), partition_rows)
+
+                    total += len(employee_keys)
+                    elapsed = time.perf_counter() - started
+                    logger.info(f"Загружено {total} строк, {total / elapsed:.0f} строк/с")
+
+            index_started = time.perf_counter()
+            create_indexes(conn, touched)
+            create_write_triggers(conn, touched)
+            bump_writes(conn, loaded_dates)
+            if created:
+                rebuild_view(conn)
+            logger.info(f"Индексы {len(touched)} партиций построены за {time.perf_counter() - index_started:.1f} с")
+            conn.execute("COMMIT")
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+        elapsed = time.perf_counter() - started
+        SchemaManager(self.db_path).analyze()
+        # перезалитые даты пересчитываются всегда, даже если число строк и контрольная сумма совпали
+        refreshed = AggregateStore(self.db_path).refresh(changed_dates=loaded_dates)
+        if DB_BACKEND == 'duckdb' and DUCKDB_SOURCE == 'parquet':
+            from storage.backends import DuckDBPool
+            pool = DuckDBPool(self.db_path, source='sqlite')
+            try:
+                pool.export_parquet(DUCKDB_PARQUET_DIR)
+            finally:
+                pool.close()
+            logger.info(f"Parquet-выгрузка для DuckDB обновлена: {DUCKDB_PARQUET_DIR}")
+        stats = {
+            'rows': total,
+            'seconds': round(elapsed, 2),
+            'rows_per_second': round(total / elapsed) if elapsed > 0 else total,
+            'report_dates': sorted(loaded_dates),
+            'aggregates_refreshed': refreshed
+        }
+        logger.info(f"Загрузка завершена: {stats}")
+        return stats
+
+
+if __name__ == "__main__":
+    import argparse
+    from config import DB_PATH
+
+    parser = argparse.ArgumentParser(description="Загрузка месячных HR-выгрузок (CSV/XLSX) в hr_data_clean")
+    parser.add_argument('paths', nargs='+', help="файлы выгрузки")
+    parser.add_argument('--db', default=DB_PATH)
+    parser.add_argument('--report-date', help="дата среза, если в выгрузке нет колонки report_date")
+    parser.add_argument('--replace', action='store_true', help="заменить уже загруженные даты")
+    parser.add_argument('--chunk-size', type=int, default=INGEST_CHUNK_SIZE)
+    parser.add_argument('--sheet', help="лист XLSX (по умолчанию активный)")
+    parser.add_argument('--encoding', default='utf-8-sig', help="кодировка CSV")
+    parser.add_argument('--sep', default=',', help="разделитель CSV")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    report_date = canonical_date(args.report_date) if args.report_date else None
+    stats = HRDataIngestor(args.db, args.chunk_size).load(
+        args.paths, report_date, args.replace, args.sheet, args.encoding, args.sep
+    )
+    print(f"Загружено {stats['rows']} строк за {stats['seconds']} с ({stats['rows_per_second']} строк/с), "
+          f"даты: {', '.join(stats['report_dates'])}")
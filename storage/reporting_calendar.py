@@ -0,0 +1,154 @@
+# reporting_calendar.py
+"""Календарь отчетных срезов hr_data_clean: какие даты есть в базе, последняя дата, отчетная дата
+и последняя дата каждого сервиса.
+
+Держится в памяти на версию данных (DatabaseManager.data_version) и перечитывается одним запросом
+после изменения базы, вместо SELECT MAX(report_date) на каждое нажатие в меню и вместо дат,
+зашитых в код ИИ-инструментов."""
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+from datetime import date, timedelta
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from storage.schema import is_canonical_date, union_partitions
+
+logger = logging.getLogger(__name__)
+
+
+def is_month_end(report_date):
+    """Срез на последний день месяца (полный месяц), а не промежуточный"""
+    if not is_canonical_date(report_date):
+        return False
+    day = date.fromisoformat(report_date)
+    return (day + timedelta(days=1)).month != day.month
+
+
+class CalendarState:
+    """Даты срезов на одну версию данных; не изменяется после создания"""
+
+    def __init__(self, version, rows):
+        self.version = version
+        self.dates = sorted({report_date for report_date, _ in rows if report_date is not None})
+        self.latest = self.dates[-1] if self.dates else None
+
+        # Отчетная дата ИИ-инструментов и рекомендаций - последний полный месяц: промежуточный срез
+        # в начале месяца (например, на 3-е число) неполон по увольнениям и найму
+        month_ends = [report_date for report_date in self.dates if is_month_end(report_date)]
+        self.reporting_date = month_ends[-1] if month_ends else self.latest
+        earlier = [report_date for report_date in month_ends if report_date < self.reporting_date]
+        self.previous_date = earlier[-1] if earlier else None
+
+        self.service_dates = {}
+        for report_date, service in rows:
+            if service is not None and report_date is not None:
+                if report_date > self.service_dates.get(service, ''):
+                    self.service_dates[service] = report_date
+        # даты отсортированы: у месяца остается последний срез
+        self._month_dates = {report_date[:7]: report_date for report_date in self.dates
+                             if is_canonical_date(report_date)}
+
+    def service_latest(self, service):
+        """Последняя дата среза с сервисом; None, если сервиса нет в базе"""
+        return self.service_dates.get(service)
+
+    def month_date(self, month):
+        """Последний срез месяца 'YYYY-MM'; None, если срезов за месяц нет"""
+        return self._month_dates.get(month)
+
+    def reporting_dates(self):
+        """Предыдущий и текущий полные месяцы (для месячных сумм увольнений); без предыдущего - только текущий"""
+        return [report_date for report_date in (self.previous_date, self.reporting_date) if report_date is not None]
+
+
+class ReportingCalendar:
+    """Календарь на файл базы. Без кэша запросов версия данных неизвестна, и календарь
+    перечитывается при каждом обращении - как запросы MAX(report_date) раньше"""
+    _calendars = {}
+    _calendars_lock = threading.Lock()
+
+    def __init__(self, db):
+        self.db = db
+        self._state = None
+        self._load_lock = threading.Lock()
+        self.loads = 0
+
+    @classmethod
+    def for_database(cls, db):
+        """Общий календарь на файл базы и движок: меню и ИИ-инструменты читают даты один раз"""
+        key = (db.backend, os.path.abspath(db.db_path))
+        with cls._calendars_lock:
+            calendar = cls._calendars.get(key)
+            if calendar is None:
+                calendar = cls(db)
+                cls._calendars[key] = calendar
+            return calendar
+
+    def _fresh(self, version):
+        state = self._state
+        return state if state is not None and version is not None and state.version == version else None
+
+    def current(self):
+        state = self._fresh(self.db.data_version())
+        if state is not None:
+            return state
+        with self._load_lock:
+            version = self.db.data_version()
+            state = self._fresh(version)
+            if state is not None:
+                return state
+            started = time.perf_counter()
+            # report_date входит в GROUP BY: по партиции - покрывающий индекс (service, report_date)
+            query, params = union_partitions(
+                "SELECT report_date, service FROM hr_data_clean GROUP BY report_date, service",
+                (), self.db.partitions()
+            )
+            state = CalendarState(version, self.db.execute_rows(query, params, use_cache=False))
+            self._state = state
+            self.loads += 1
+            logger.info(f"Календарь срезов загружен за {(time.perf_counter() - started) * 1000:.0f} мс: "
+                        f"{len(state.dates)} дат, последняя {state.latest}, отчетная {state.reporting_date}")
+            return state
+
+    async def current_async(self):
+        """current() для ИИ-инструментов: перечитывание идет в пуле потоков, а не в event loop"""
+        state = self._fresh(self.db.data_version())
+        if state is not None:
+            return state
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.current)
+
+    def latest(self):
+        return self.current().latest
+
+    def reporting_date(self):
+        return self.current().reporting_date
+
+    def reporting_dates(self):
+        return self.current().reporting_dates()
+
+    def service_latest(self, service):
+        return self.current().service_latest(service)
+
+
+if __name__ == "__main__":
+    import argparse
+    from config import DB_PATH
+    from database import DatabaseManager
+
+    parser = argparse.ArgumentParser(description="Календарь отчетных срезов")
+    parser.add_argument('--db', default=DB_PATH)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    state = ReportingCalendar.for_database(DatabaseManager(args.db)).current()
+    print(f"Срезов: {len(state.dates)}, последний: {state.latest}")
+    print(f"Отчетная дата: {state.reporting_date}, предыдущая: {state.previous_date}")
+    for report_date in state.dates:
+        print(f"  {report_date}{'' if is_month_end(report_date) else '  (промежуточный)'}")
+    stale = sorted(service for service, last in state.service_dates.items() if last != state.latest)
+    if stale:
+        print(f"Сервисы без последнего среза: {', '.join(stale)}")
+    DatabaseManager.close_all()
@@ -0,0 +1,520 @@
+# schema.py
+import logging
+import re
+import sqlite3
+import sys
+import os
+from datetime import datetime
+from functools import lru_cache
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database import DatabaseManager
+from storage.aggregates import create_aggregate_tables, refresh_aggregates
+
+logger = logging.getLogger(__name__)
+
+# Исторический "идентификатор" сотрудника: в выгрузке нет табельного номера
+EMPLOYEE_NATURAL_KEY_SQL = (
+    "hire_to_company || '_' || sex || '_' || fullyears || '_' || "
+    "location_name || '_' || department_3 || '_' || "
+    "department_4 || '_' || department_5 || '_' || department_6"
+)
+
+
+# Колонки выгрузки в порядке таблицы; employee_key проставляется при загрузке
+HR_COLUMNS = [
+    ('report_date', 'TEXT'), ('service', 'TEXT'), ('location_name', 'TEXT'), ('cluster', 'TEXT'),
+    ('sex', 'TEXT'), ('fullyears', 'REAL'), ('experience', 'REAL'), ('fte', 'REAL'),
+    ('hire_to_company', 'TEXT'), ('fire_from_company', 'TEXT'), ('hirecount', 'INTEGER'),
+    ('firecount', 'INTEGER'), ('department_3', 'TEXT'), ('department_4', 'TEXT'),
+    ('department_5', 'TEXT'), ('department_6', 'TEXT'), ('age_category', 'TEXT'),
+    ('experience_category', 'TEXT'), ('real_day', 'REAL'),
+]
+
+NATURAL_KEY_COLUMNS = ('hire_to_company', 'sex', 'fullyears', 'location_name',
+                       'department_3', 'department_4', 'department_5', 'department_6')
+
+
+# Помесячные партиции: hr_data_clean - представление UNION ALL над таблицами hr_data_clean_YYYY_MM.
+# Пустая таблица-шаблон хранит колонки (порядок и типы исходной таблицы); партиции создаются по ней
+HR_VIEW = 'hr_data_clean'
+PARTITION_PREFIX = 'hr_data_clean_'
+PARTITION_TEMPLATE = 'hr_data_clean_template'
+UNDATED_PARTITION = 'hr_data_clean_undated'
+PARTITION_PATTERN = PARTITION_PREFIX.replace('_', '\\_') + '%'  # для LIKE ... ESCAPE '\'
+
+_DATE_FORMATS = ('%Y-%m-%d', '%Y-%m-%d %H:%M:%S', '%Y-%m-%dT%H:%M:%S', '%d.%m.%Y', '%d.%m.%Y %H:%M:%S', '%d/%m/%Y')
+_CANONICAL_DATE = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+
+
+@lru_cache(maxsize=65536)
+def canonical_date(text):
+    """Дата в каноническом виде YYYY-MM-DD; нераспознанное значение остается как есть"""
+    if not isinstance(text, str):
+        return text
+    for date_format in _DATE_FORMATS:
+        try:
+            return datetime.strptime(text, date_format).strftime('%Y-%m-%d')
+        except ValueError:
+            continue
+    return text
+
+
+def is_canonical_date(value):
+    return isinstance(value, str) and _CANONICAL_DATE.match(value) is not None
+
+
+def partition_name(report_date):
+    """Партиция среза - месяц даты; нераспознанные даты (только из старых баз) - в отдельной партиции"""
+    if is_canonical_date(report_date):
+        return f"{PARTITION_PREFIX}{report_date[:4]}_{report_date[5:7]}"
+    return UNDATED_PARTITION
+
+
+def _sqlite_text(value):
+    """Текстовое представление значения, как его дает оператор || в SQLite"""
+    if isinstance(value, float):
+        text = '%.15g' % value
+        if not any(ch in text for ch in '.enN'):
+            text += '.0'
+        return text
+    return str(value)
+
+
+def employee_natural_keys(columns):
+    """Естественные ключи как в EMPLOYEE_NATURAL_KEY_SQL для столбцов {колонка: список значений}; NULL дает None"""
+    parts = []
+    for name in NATURAL_KEY_COLUMNS:
+        values = columns[name]
+        texts = {value: _sqlite_text(value) for value in set(values) if value is not None}
+        parts.append([texts.get(value) for value in values])
+    return [None if None in row else '_'.join(row) for row in zip(*parts)]
+
+
+def create_hr_table(conn):
+    """Создать hr_data_clean в пустой базе (раньше база поставлялась готовым файлом)"""
+    columns = ', '.join(f"{name} {column_type}" for name, column_type in HR_COLUMNS)
+    conn.execute(f"CREATE TABLE IF NOT EXISTS hr_data_clean ({columns}, employee_key INTEGER)")
+
+
+def is_partitioned(conn):
+    row = conn.execute("SELECT type FROM sqlite_master WHERE name = ?", (HR_VIEW,)).fetchone()
+    return row is not None and row[0] == 'view'
+
+
+def partition_tables(conn):
+    """Партиции по порядку месяцев (нераспознанные даты последними)"""
+    return [row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE ? ESCAPE '\\' AND name != ? ORDER BY name",
+        (PARTITION_PATTERN, PARTITION_TEMPLATE)
+    )]
+
+
+def data_tables(conn):
+    """Таблицы со строками hr_data_clean: партиции или сама таблица, если миграция 4 еще не применена"""
+    return partition_tables(conn) if is_partitioned(conn) else [HR_VIEW]
+
+
+def data_table(conn, report_date):
+    """Таблица со строками среза; None, если партиции этого месяца нет"""
+    if not is_partitioned(conn):
+        return HR_VIEW
+    name = partition_name(report_date)
+    return name if name in partition_tables(conn) else None
+
+
+def latest_partition(conn):
+    dated = [name for name in data_tables(conn) if name != UNDATED_PARTITION]
+    return dated[-1] if dated else HR_VIEW
+
+
+_FROM_VIEW = re.compile(rf"\bFROM\s+{HR_VIEW}\b")
+
+
+def union_partitions(query, params, partitions, union='UNION ALL'):
+    """(запрос, параметры) по всей истории с копией запроса на каждую партицию.
+
+    Каждая копия читает индексы своей партиции, а представление под агрегатом или DISTINCT
+    вычитывается построчно. UNION ALL - для GROUP BY, включающего report_date: срез целиком лежит
+    в одной партиции, и группы частей не пересекаются. UNION - для SELECT DISTINCT: повторы между
+    партициями убирает сам UNION. Завершающий ORDER BY (и LIMIT) применяется ко всему объединению"""
+    if not partitions:
+        return query, params
+    body, order, order_columns = query.rpartition('ORDER BY')
+    if not order:
+        body, order_columns = query, ''
+    combined = f'\n        {union}\n'.join(_FROM_VIEW.sub(f"FROM {partition}", body) for partition in partitions)
+    if order:
+        combined += f"\n        ORDER BY {order_columns.strip()}"
+    return combined, list(params or ()) * len(partitions)
+
+
+def ensure_partition(conn, report_date):
+    """(имя, создана ли) партиции среза; новая создается по шаблону без индексов - их строит create_indexes"""
+    name = partition_name(report_date)
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)).fetchone():
+        return name, False
+    template = conn.execute(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (PARTITION_TEMPLATE,)
+    ).fetchone()[0]
+    conn.execute(template.replace(PARTITION_TEMPLATE, name, 1))
+    return name, True
+
+
+def rebuild_view(conn):
+    """Пересоздать hr_data_clean над текущими партициями; шаблон - первая, всегда пустая ветка"""
+    tables = [PARTITION_TEMPLATE] + partition_tables(conn)
+    conn.execute(f"DROP VIEW IF EXISTS {HR_VIEW}")
+    conn.execute(f"CREATE VIEW {HR_VIEW} AS " + " UNION ALL ".join(f"SELECT * FROM {table}" for table in tables))
+
+
+def _column_exists(conn, table, column):
+    return any(row[1] == column for row in conn.execute(f"PRAGMA table_info({table})"))
+
+
+def assign_employee_keys(conn, table='hr_data_clean'):
+    """Проставить employee_key строкам, у которых его еще нет; ключи стабильны между загрузками"""
+    conn.execute(f"""
+        INSERT OR IGNORE INTO employee_keys (natural_key)
+        SELECT DISTINCT {EMPLOYEE_NATURAL_KEY_SQL}
+        FROM {table}
+        WHERE employee_key IS NULL
+    """)
+    cursor = conn.execute(f"""
+        UPDATE {table}
+        SET employee_key = (
+            SELECT k.employee_key FROM employee_keys k
+            WHERE k.natural_key = {EMPLOYEE_NATURAL_KEY_SQL}
+        )
+        WHERE employee_key IS NULL
+    """)
+    return cursor.rowcount
+
+
+def _migration_employee_key(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS employee_keys (
+            employee_key INTEGER PRIMARY KEY,
+            natural_key TEXT NOT NULL UNIQUE
+        )
+    """)
+    if not _column_exists(conn, 'hr_data_clean', 'employee_key'):
+        conn.execute("ALTER TABLE hr_data_clean ADD COLUMN employee_key INTEGER")
+    updated = assign_employee_keys(conn)
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_hr_data_clean_date_employee "
+        "ON hr_data_clean (report_date, employee_key)"
+    )
+    logger.info(f"employee_key проставлен для {updated} строк")
+
+
+# Индексы под реальные формы запросов: почти все фильтруют report_date + одно измерение.
+# Строятся на каждой партиции: idx_<таблица>_<суффикс>
+INDEXES = [
+    # get_demographics_data: покрывающий, читается без обращения к таблице
+    ('demographics', ('report_date', 'age_category', 'sex', 'experience_category', 'employee_key')),
+    # get_detailed_service_analysis, фильтры service в AgentTools/ComplexAgentTools
+    ('date_service', ('report_date', 'service', 'fire_from_company')),
+    # календарь срезов (ReportingCalendar): даты по сервисам читаются из индекса
+    ('service_date', ('service', 'report_date')),
+    ('date_location', ('report_date', 'location_name')),
+    ('date_cluster', ('report_date', 'cluster')),
+    ('date_sex', ('report_date', 'sex')),
+    # создается миграцией 1, расширен миграцией 6; здесь - чтобы загрузка данных снимала и возвращала его
+    # вместе с остальными. Покрывает контрольные суммы дат (storage.aggregates.date_checksums)
+    ('date_employee', ('report_date', 'employee_key', 'hirecount', 'firecount')),
+]
+
+# Горячие запросы для проверки EXPLAIN QUERY PLAN: (название, SQL, имена параметров)
+# {partition} - последняя партиция: туда такие запросы направляет HRDataRepository,
+# а календарь срезов читает каждую партицию отдельно
+HOT_QUERIES = [
+    ('reporting_calendar', "SELECT report_date, service FROM {partition} GROUP BY report_date, service", ()),
+    ('demographics',
+     "SELECT age_category, sex, experience_category, COUNT(DISTINCT employee_key) FROM hr_data_clean "
+     "WHERE report_date = ? GROUP BY age_category, sex, experience_category", ('report_date',)),
+    ('detailed_service',
+     "SELECT age_category, sex, experience_category, COUNT(DISTINCT employee_key), SUM(firecount) "
+     "FROM hr_data_clean WHERE service = ? AND report_date = ? GROUP BY age_category, sex, experience_category",
+     ('service', 'report_date')),
+    ('calculate_metric_service',
+     "SELECT COUNT(*) FROM hr_data_clean WHERE report_date = ? AND service = ? "
+     "AND fire_from_company = '1970-01-01'", ('report_date', 'service')),
+    ('compare_by_location',
+     "SELECT location_name, COUNT(*) FROM hr_data_clean WHERE report_date = ? AND location_name = ? "
+     "GROUP BY location_name", ('report_date', 'location_name')),
+    ('filter_by_cluster', "SELECT COUNT(*) FROM hr_data_clean WHERE report_date = ? AND cluster = ?",
+     ('report_date', 'cluster')),
+    ('filter_by_sex', "SELECT AVG(fte) FROM hr_data_clean WHERE report_date = ? AND sex = ?",
+     ('report_date', 'sex')),
+]
+
+
+def create_indexes(conn, tables=None):
+    """Индексы INDEXES на таблицах данных (по умолчанию - на всех партициях)"""
+    for table in data_tables(conn) if tables is None else tables:
+        for suffix, columns in INDEXES:
+            conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_{suffix} ON {table} ({', '.join(columns)})")
+
+
+def drop_indexes(conn, tables=None):
+    """Снять индексы перед массовой загрузкой; create_indexes вернет их после"""
+    for table in data_tables(conn) if tables is None else tables:
+        for suffix, _ in INDEXES:
+            conn.execute(f"DROP INDEX IF EXISTS idx_{table}_{suffix}")
+
+
+# Счетчик записей по датам среза: триггеры таблиц данных увеличивают его на каждую вставку,
+# изменение и удаление строки. По нему файлы снимков и агрегаты замечают правки на месте
+# (UPDATE ... SET service = ...), которые не меняют ни число строк, ни employee_key
+WRITES_TABLE = 'hr_data_writes'
+_WRITE_EVENTS = (('insert', 'INSERT', ('NEW',)), ('update', 'UPDATE', ('OLD', 'NEW')), ('delete', 'DELETE', ('OLD',)))
+
+
+def create_write_triggers(conn, tables=None):
+    """Триггеры счетчика записей на таблицах данных (по умолчанию - на всех партициях)"""
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {WRITES_TABLE} (
+            report_date TEXT PRIMARY KEY,
+            writes INTEGER NOT NULL
+        )
+    """)
+    for table in data_tables(conn) if tables is None else tables:
+        for suffix, event, rows in _WRITE_EVENTS:
+            body = ' '.join(
+                f"INSERT INTO {WRITES_TABLE} (report_date, writes) SELECT {row}.report_date, 1 "
+                f"WHERE {row}.report_date IS NOT NULL "
+                f"ON CONFLICT (report_date) DO UPDATE SET writes = writes + 1;"
+                for row in rows
+            )
+            conn.execute(f"CREATE TRIGGER IF NOT EXISTS trg_{table}_writes_{suffix} "
+                         f"AFTER {event} ON {table} BEGIN {body} END")
+
+
+def drop_write_triggers(conn, tables=None):
+    """Снять триггеры перед массовой загрузкой: счетчик дат увеличит bump_writes, а не каждая строка"""
+    for table in data_tables(conn) if tables is None else tables:
+        for suffix, _, _ in _WRITE_EVENTS:
+            conn.execute(f"DROP TRIGGER IF EXISTS trg_{table}_writes_{suffix}")
+
+
+def bump_writes(conn, report_dates):
+    conn.executemany(
+        f"INSERT INTO {WRITES_TABLE} (report_date, writes) VALUES (?, 1) "
+        f"ON CONFLICT (report_date) DO UPDATE SET writes = writes + 1",
+        ((report_date,) for report_date in report_dates if report_date is not None)
+    )
+
+
+def date_writes(conn):
+    """{report_date: счетчик записей}; None, если миграция 5 еще не применена"""
+    try:
+        return dict(conn.execute(f"SELECT report_date, writes FROM {WRITES_TABLE}"))
+    except sqlite3.Error:
+        return None
+
+
+def analyze(conn):
+    """ANALYZE без статистики партиций.
+
+    В партиции обычно одна report_date, и по статистике условие report_date = ? неизбирательно:
+    планировщик сканировал бы каждую партицию представления целиком. Без статистики SQLite
+    считает равенство по индексу избирательным, и партиции других месяцев отсекаются одним поиском"""
+    conn.execute("ANALYZE")
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'").fetchone():
+        conn.execute("DELETE FROM sqlite_stat1 WHERE tbl LIKE ? ESCAPE '\\'", (PARTITION_PATTERN,))
+
+
+def _migration_indexes(conn):
+    create_indexes(conn, [HR_VIEW])
+    conn.execute("ANALYZE")
+
+
+def _migration_aggregates(conn):
+    create_aggregate_tables(conn)
+    refresh_aggregates(conn)
+
+
+def _migration_partitions(conn):
+    """hr_data_clean -> шаблон + помесячные партиции + представление; report_date приводится к YYYY-MM-DD"""
+    if is_partitioned(conn):
+        return
+    conn.create_function('canonical_date', 1, canonical_date, deterministic=True)
+    conn.execute(f"ALTER TABLE {HR_VIEW} RENAME TO {PARTITION_TEMPLATE}")
+    columns = [row[1] for row in conn.execute(f"PRAGMA table_info({PARTITION_TEMPLATE})")]
+    select = ', '.join('canonical_date(report_date)' if name == 'report_date' else name for name in columns)
+
+    months = {}
+    for (raw_date,) in conn.execute(f"SELECT DISTINCT report_date FROM {PARTITION_TEMPLATE}").fetchall():
+        months.setdefault(partition_name(canonical_date(raw_date)), []).append(raw_date)
+    moved = 0
+    for name, raw_dates in sorted(months.items()):
+        table, _ = ensure_partition(conn, canonical_date(raw_dates[0]))
+        conditions = ' OR '.join('report_date IS ?' for _ in raw_dates)
+        moved += conn.execute(
+            f"INSERT INTO {table} ({', '.join(columns)}) SELECT {select} FROM {PARTITION_TEMPLATE} "
+            f"WHERE {conditions} ORDER BY rowid", raw_dates
+        ).rowcount
+
+    conn.execute(f"DELETE FROM {PARTITION_TEMPLATE}")
+    drop_indexes(conn, [HR_VIEW])  # индексы переименованной таблицы сохранили прежние имена
+    create_indexes(conn, partition_tables(conn))
+    rebuild_view(conn)
+    # агрегаты за даты, записанные не в каноническом виде, пересчитываются под новыми датами;
+    # учет дат мог быть создан до колонки checksum
+    create_aggregate_tables(conn)
+    refresh_aggregates(conn)
+    analyze(conn)
+    logger.info(f"hr_data_clean разбита на {len(months)} партиций, перенесено {moved} строк")
+
+
+def _migration_write_counters(conn):
+    create_write_triggers(conn)
+
+
+def _migration_checksum_index(conn):
+    """idx_*_date_employee с hirecount и firecount: контрольные суммы дат читаются без обращения к таблице"""
+    tables = data_tables(conn)
+    for table in tables:
+        conn.execute(f"DROP INDEX IF EXISTS idx_{table}_date_employee")
+    create_indexes(conn, tables)
+
+
+# (версия, описание, функция); версия хранится в PRAGMA user_version
+MIGRATIONS = [
+    (1, 'Суррогатный ключ сотрудника employee_key', _migration_employee_key),
+    (2, 'Индексы hr_data_clean под горячие запросы', _migration_indexes),
+    (3, 'Материализованные агрегаты срезов', _migration_aggregates),
+    (4, 'Помесячные партиции hr_data_clean', _migration_partitions),
+    (5, 'Счетчик записей по датам среза', _migration_write_counters),
+    (6, 'Контрольные суммы дат по индексу date_employee', _migration_checksum_index),
+]
+
+
+class SchemaManager:
+    def __init__(self, db_path):
+        self.db = DatabaseManager(db_path)
+
+    def current_version(self):
+        conn = self.db.get_connection()
+        try:
+            return conn.execute("PRAGMA user_version").fetchone()[0]
+        finally:
+            conn.close()
+
+    def migrate(self):
+        """Применить недостающие миграции; повторный запуск ничего не делает"""
+        conn = self.db.get_connection()
+        conn.isolation_level = None  # транзакциями управляем явно, DDL тоже должен откатываться
+        try:
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            for target, description, migration in MIGRATIONS:
+                if target <= version:
+                    continue
+                logger.info(f"Миграция схемы {target}: {description}")
+                conn.execute("BEGIN")
+                try:
+                    migration(conn)
+                    conn.execute(f"PRAGMA user_version = {target}")
+                    conn.execute("COMMIT")
+                except Exception:
+                    conn.execute("ROLLBACK")
+                    raise
+                version = target
+            return version
+        finally:
+            conn.close()
+
+    def ensure_indexes(self):
+        """Идемпотентно досоздать индексы (например, после ручной правки базы) и обновить статистику"""
+        conn = self.db.get_connection()
+        try:
+            with conn:
+                create_indexes(conn)
+                analyze(conn)
+        finally:
+            conn.close()
+
+    def analyze(self):
+        conn = self.db.get_connection()
+        try:
+            with conn:
+                analyze(conn)
+        finally:
+            conn.close()
+
+    def _sample_params(self, conn):
+        partition = latest_partition(conn)
+        row = conn.execute(f"""
+            SELECT report_date, service, location_name, cluster, sex
+            FROM {partition}
+            WHERE report_date = (SELECT MAX(report_date) FROM {partition})
+            LIMIT 1
+        """).fetchone()
+        names = ('report_date', 'service', 'location_name', 'cluster', 'sex')
+        return dict(zip(names, row)) if row else {name: '' for name in names}
+
+    def explain(self):
+        """План выполнения горячих запросов: {название: (строки плана, есть ли полный скан)}"""
+        conn = self.db.get_connection()
+        try:
+            sample = self._sample_params(conn)
+            partition = latest_partition(conn)
+            plans = {}
+            for name, query, param_names in HOT_QUERIES:
+                params = tuple(sample[param] for param in param_names)
+                try:
+                    details = [row[3] for row in conn.execute(
+                        f"EXPLAIN QUERY PLAN {query.format(partition=partition)}", params
+                    )]
+                except sqlite3.Error as e:
+                    plans[name] = ([f"ошибка: {e} (выполните migrate)"], True)
+                    continue
+                # SCAN самого представления (выдача UNION ALL) и пустого шаблона - не чтение данных
+                full_scan = any(
+                    detail.startswith('SCAN') and 'INDEX' not in detail
+                    and detail.split()[1].startswith(HR_VIEW)
+                    and detail.split()[1] not in (HR_VIEW, PARTITION_TEMPLATE)
+                    for detail in details
+                )
+                plans[name] = (details, full_scan)
+            return plans
+        finally:
+            conn.close()
+
+    def verify(self):
+        """Проверить, что горячие запросы не делают полный скан hr_data_clean"""
+        plans = self.explain()
+        for name, (details, full_scan) in plans.items():
+            if full_scan:
+                logger.warning(f"Полный скан hr_data_clean в запросе {name}: {'; '.join(details)}")
+        return all(not full_scan for _, full_scan in plans.values())
+
+
+if __name__ == "__main__":
+    import argparse
+    from config import DB_PATH
+
+    parser = argparse.ArgumentParser(description="Миграции и индексы hr_data_clean")
+    parser.add_argument('command', nargs='?', default='migrate',
+                        choices=['migrate', 'indexes', 'analyze', 'verify', 'status'])
+    parser.add_argument('--db', default=DB_PATH)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    manager = SchemaManager(args.db)
+    if args.command == 'migrate':
+        print(f"Версия схемы: {manager.migrate()}")
+    elif args.command == 'indexes':
+        manager.ensure_indexes()
+        print("Индексы созданы, статистика обновлена")
+    elif args.command == 'analyze':
+        manager.analyze()
+        print("ANALYZE выполнен")
+    elif args.command == 'status':
+        print(f"Версия схемы: {manager.current_version()} из {MIGRATIONS[-1][0]}")
+    else:
+        for name, (details, full_scan) in manager.explain().items():
+            print(f"{'❌' if full_scan else '✅'} {name}")
+            for detail in details:
+                print(f"     {detail}")
+        sys.exit(0 if manager.verify() else 1)
@@ -0,0 +1,178 @@
+# snapshot_cache.py
+"""Файлы снимков срезов hr_data_clean (Arrow IPC) для быстрого холодного старта.
+
+Снимок за report_date записывается один раз, а после перезапуска отображается в память
+(memory map) вместо повторного чтения строк из SQLite. В метаданных файла хранится отпечаток
+данных среза (source_fingerprint) со счетчиком записей даты: если он не совпадает с базой,
+файл пересобирается, в том числе после правки строк на месте."""
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import sys
+import tempfile
+from pathlib import Path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import SNAPSHOT_CACHE_DIR
+from storage.schema import data_table, date_writes, union_partitions
+
+logger = logging.getLogger(__name__)
+
+# Увеличивается при изменении формата файла: старые файлы перестают совпадать по отпечатку
+FORMAT_VERSION = 1
+FINGERPRINT_KEY = b'hr_snapshot_fingerprint'
+
+
+def source_fingerprint(conn, report_date):
+    """Отпечаток данных среза; None, если в базе нет счетчика записей (миграция 5) и свежесть файла
+    не проверить. Число строк и employee_key читаются по покрывающему индексу партиции (report_date,
+    employee_key), а счетчик записей меняется при любой вставке, правке и удалении строк даты"""
+    writes = date_writes(conn)
+    if writes is None:
+        return None
+    table = data_table(conn, report_date)
+    if table is None:
+        rows, first_rowid, last_rowid, keys = 0, None, None, 0.0
+    else:
+        rows, first_rowid, last_rowid, keys = conn.execute(
+            f"SELECT COUNT(*), MIN(rowid), MAX(rowid), TOTAL(employee_key) FROM {table} WHERE report_date = ?",
+            (report_date,)
+        ).fetchone()
+    return {
+        'format': FORMAT_VERSION,
+        'rows': rows,
+        'rowids': [first_rowid, last_rowid],
+        'keys': keys,
+        'writes': writes.get(report_date, 0),
+    }
+
+
+class SnapshotCache:
+    """Каталог файлов {report_date}.arrow одной базы"""
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    @classmethod
+    def for_database(cls, db_path, root=None):
+        """Отдельный подкаталог на файл базы, чтобы снимки разных баз не вытесняли друг друга"""
+        absolute = os.path.abspath(db_path)
+        digest = hashlib.md5(absolute.encode('utf-8')).hexdigest()[:8]
+        return cls(os.path.join(root or SNAPSHOT_CACHE_DIR, f"{Path(absolute).stem}_{digest}"))
+
+    def path(self, report_date):
+        return os.path.join(self.directory, f"{report_date}.arrow")
+
+    def fingerprint(self, db_path, report_date):
+        conn = sqlite3.connect(db_path)
+        try:
+            return source_fingerprint(conn, report_date)
+        finally:
+            conn.close()
+
+    def read(self, report_date, fingerprint):
+        """Таблица pyarrow, отображенная в память; None, если файла нет или он устарел"""
+        import pyarrow as pa
+
+        path = self.path(report_date)
+        if not os.path.exists(path):
+            return None
+        try:
+            reader = pa.ipc.open_file(pa.memory_map(path))
+            stored = (reader.schema.metadata or {}).get(FINGERPRINT_KEY)
+            if stored is None or json.loads(stored) != fingerprint:
+                logger.info(f"Файл снимка {report_date} устарел, будет пересобран")
+                return None
+            return reader.read_all()
+        except (OSError, ValueError, pa.ArrowException) as e:
+            logger.warning(f"Файл снимка {path} не читается, будет пересобран: {e}")
+            return None
+
+    def write(self, report_date, table, fingerprint):
+        """Атомарно записать снимок: читатели видят либо старый файл, либо новый целиком"""
+        import pyarrow as pa
+
+        metadata = dict(table.schema.metadata or {})
+        metadata[FINGERPRINT_KEY] = json.dumps(fingerprint).encode('utf-8')
+        table = table.replace_schema_metadata(metadata)
+        os.makedirs(self.directory, exist_ok=True)
+        handle, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        os.close(handle)
+        try:
+            with pa.OSFile(temp_path, 'wb') as sink:
+                with pa.ipc.new_file(sink, table.schema) as writer:
+                    writer.write_table(table)
+            os.replace(temp_path, self.path(report_date))
+        except Exception:
+            os.remove(temp_path)
+            raise
+
+    def status(self):
+        """[(report_date, строк, байт, отпечаток)] по файлам каталога"""
+        import pyarrow as pa
+
+        result = []
+        if not os.path.isdir(self.directory):
+            return result
+        for name in sorted(os.listdir(self.directory)):
+            if not name.endswith('.arrow'):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                reader = pa.ipc.open_file(pa.memory_map(path))
+                stored = (reader.schema.metadata or {}).get(FINGERPRINT_KEY)
+                rows = sum(reader.get_batch(i).num_rows for i in range(reader.num_record_batches))
+                fingerprint = json.loads(stored) if stored else None
+            except (OSError, ValueError, pa.ArrowException):
+                rows, fingerprint = None, None
+            result.append((name[:-len('.arrow')], rows, os.path.getsize(path), fingerprint))
+        return result
+
+    def clear(self):
+        """Удалить все файлы снимков базы; возвращает число удаленных"""
+        removed = 0
+        if not os.path.isdir(self.directory):
+            return removed
+        for name in os.listdir(self.directory):
+            if name.endswith(('.arrow', '.tmp')):
+                os.remove(os.path.join(self.directory, name))
+                removed += 1
+        return removed
+
+
+if __name__ == "__main__":
+    import argparse
+    from config import DB_PATH
+
+    parser = argparse.ArgumentParser(description="Файлы снимков срезов для холодного старта")
+    parser.add_argument('command', nargs='?', default='status', choices=['status', 'build', 'clear'])
+    parser.add_argument('--db', default=DB_PATH)
+    parser.add_argument('--date', action='append', help="дата среза для build (по умолчанию все)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    cache = SnapshotCache.for_database(args.db)
+    if args.command == 'clear':
+        print(f"Удалено файлов: {cache.clear()}")
+    elif args.command == 'build':
+        import asyncio
+        from database import DatabaseManager
+        from ai_core.snapshot_engine import SnapshotEngine
+
+        engine = SnapshotEngine(DatabaseManager(args.db))
+        query, params = union_partitions(
+            "SELECT DISTINCT report_date FROM hr_data_clean ORDER BY report_date", (), engine.db.partitions(), 'UNION'
+        )
+        report_dates = args.date or [row[0] for row in engine.db.execute_rows(query, params, use_cache=False)]
+        for report_date in report_dates:
+            asyncio.run(engine.preload(report_date))
+        print(f"Снимков в {cache.directory}: {len(cache.status())}")
+    else:
+        conn = sqlite3.connect(args.db)
+        try:
+            for report_date, rows, size, fingerprint in cache.status():
+                fresh = fingerprint is not None and fingerprint == source_fingerprint(conn, report_date)
+                print(f"{'✅' if fresh else '❌'} {report_date}: {rows} строк, {size / 1024:.0f} КБ")
+        finally:
+            conn.close()
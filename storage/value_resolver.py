@@ -0,0 +1,337 @@
+# value_resolver.py
+"""Сопоставление пользовательских названий сервисов и локаций со значениями hr_data_clean.
+
+Индекс строится в памяти один раз на версию данных (DatabaseManager.data_version) из различных
+значений колонок: точное совпадение без учета регистра, псевдонимы, основы слов без падежных
+окончаний ("облаке" -> "Облако") и триграммы для подстрок и опечаток. Разрешение - поиск по
+словарям, без SQL и без LIKE по таблице."""
+import asyncio
+import logging
+import math
+import os
+import re
+import sys
+import threading
+import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from storage.reporting_calendar import ReportingCalendar
+from storage.schema import union_partitions
+
+logger = logging.getLogger(__name__)
+
+# Псевдонимы сервисов (ключ - в нижнем регистре). Раньше были разбросаны по HRDataRepository,
+# DataNormalizer и ComplexQueryParser
+SERVICE_ALIASES = {
+    'такси': 'Такси',
+    'маркет': 'Маркет',
+    'крауд': 'Крауд',
+    'лавка': 'Лавка',
+    'финтех': 'Финтех',
+    'еда': 'Еда',
+    'доставка': 'Доставка',
+    'облако': 'Облако',
+    'cloud': 'Облако',
+    'беспилотники': 'Беспилотники',
+    'беспилотные автомобили': 'Беспилотные автомобили',
+    'вертикали': 'Вертикали',
+    'коммерческий': 'Коммерческий департамент',
+    'коммерческий департамент': 'Коммерческий департамент',
+    'образовательные инициативы': 'Образовательные инициативы',
+    'общие': 'Общие подразделения',
+    'общие подразделения': 'Общие подразделения',
+    'плюс и фантех': 'Плюс и Фантех',
+    'поисковый портал': 'Поисковый портал',
+    'не определен сервис': 'Не определен Сервис',
+}
+
+# Локации, которые ищутся шаблоном LIKE, а не одним значением: (части слов запроса, шаблон)
+REMOTE_LOCATION = '%Дистанционщик%'
+CANONICAL_LOCATIONS = (
+    (('дистан', 'удален', 'remote'), REMOTE_LOCATION),
+    (('москв',), '%Москва%'),
+    (('питер', 'петербург', 'спб'), '%Санкт-Петербург%'),
+)
+
+# Падежные и числовые окончания, самые длинные первыми; основа короче двух букв не обрезается
+_ENDINGS = sorted((
+    'ами', 'ями', 'ого', 'его', 'ому', 'ему', 'ыми', 'ими', 'ых', 'их', 'ах', 'ях', 'ов', 'ев', 'ей',
+    'ой', 'ом', 'ем', 'ам', 'ям', 'ую', 'юю', 'ая', 'яя', 'ое', 'ее', 'ые', 'ие', 'ый', 'ий',
+    'а', 'я', 'о', 'е', 'ы', 'и', 'у', 'ю', 'ь',
+), key=len, reverse=True)
+_WORD = re.compile(r'\w+')
+_NUMBER = re.compile(r'\d+')
+
+# Доля общих триграмм (Жаккар), начиная с которой похожее название считается опечаткой
+FUZZY_THRESHOLD = 0.4
+
+
+def stem(word):
+    word = word.lower().replace('ё', 'е')
+    for ending in _ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= 2:
+            return word[:-len(ending)]
+    return word
+
+
+def stem_key(text):
+    """Основы слов фразы через пробел: "в облаке" и "Облако" дают разные ключи, "облаке" и "Облако" - один"""
+    return ' '.join(stem(word) for word in _WORD.findall(text.lower()))
+
+
+def trigrams(text):
+    padded = f"  {text.lower().replace('ё', 'е')} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class ValueIndex:
+    """Индекс значений одной колонки; resolve и find_in_text возвращают значение как в базе или None"""
+
+    def __init__(self, values, aliases=None):
+        self.values = sorted({value for value in values if isinstance(value, str) and value})
+        self.exact = {}
+        self.stems = {}
+        for value in self.values:
+            self.exact.setdefault(value.lower(), value)
+            self.stems.setdefault(stem_key(value), value)
+        # в свободном тексте по основам слов ищутся только сами значения
+        self.value_stems = dict(self.stems)
+        # псевдонимы ведут только на существующие значения (если значений нет - на любые)
+        present = set(self.values)
+        for alias, value in (aliases or {}).items():
+            if present and value not in present:
+                continue
+            self.exact.setdefault(alias, value)
+            self.stems.setdefault(stem_key(alias), value)
+        self._longest_phrase = max((len(key.split()) for key in list(self.stems) + list(self.exact)), default=0)
+
+        # триграмма -> номера значений; строчные значения - для проверки подстроки
+        self._lower = [value.lower().replace('ё', 'е') for value in self.values]
+        self._grams = [trigrams(value) for value in self.values]
+        self._numbers = [_NUMBER.findall(value) for value in self._lower]
+        postings = {}
+        for position, grams in enumerate(self._grams):
+            for gram in grams:
+                postings.setdefault(gram, []).append(position)
+        self.trigram_index = {gram: frozenset(positions) for gram, positions in postings.items()}
+
+    def _rarest(self, grams):
+        """Триграммы от редких к частым; отсутствующие в индексе - первыми"""
+        return sorted(grams, key=lambda gram: len(self.trigram_index.get(gram, ())))
+
+    def contains(self, text):
+        """Значения, содержащие text как подстроку (без учета регистра), по алфавиту"""
+        needle = text.lower().replace('ё', 'е')
+        if len(needle) < 3:
+            return [value for value, lower in zip(self.values, self._lower) if needle in lower]
+        # у подстроки все внутренние триграммы есть и у значения: пересекаем списки, начиная с самого короткого
+        candidates = None
+        for gram in self._rarest({needle[i:i + 3] for i in range(len(needle) - 2)}):
+            positions = self.trigram_index.get(gram, frozenset())
+            candidates = positions if candidates is None else candidates & positions
+            if not candidates:
+                return []
+        return [self.values[position] for position in sorted(candidates) if needle in self._lower[position]]
+
+    def similar(self, text, threshold=FUZZY_THRESHOLD):
+        """Самое похожее по триграммам значение или None; числа в названии (номер офиса) должны совпадать"""
+        grams = trigrams(text)
+        numbers = _NUMBER.findall(text)
+        # при сходстве выше threshold значение делит с запросом хотя бы одну из
+        # len - ceil(threshold * len) + 1 самых редких триграмм: частые не перебираем
+        prefix = len(grams) - math.ceil(threshold * len(grams)) + 1
+        candidates = set()
+        for gram in self._rarest(grams)[:prefix]:
+            candidates.update(self.trigram_index.get(gram, ()))
+        best, best_score = None, threshold
+        for position in sorted(candidates):
+            if self._numbers[position] != numbers:
+                continue
+            common = len(grams & self._grams[position])
+            score = common / (len(grams) + len(self._grams[position]) - common)
+            if score > best_score:
+                best, best_score = position, score
+        return self.values[best] if best is not None else None
+
+    def resolve(self, text, fuzzy=True):
+        """Точное совпадение -> псевдоним -> основы слов -> подстрока -> упоминание во фразе -> опечатка"""
+        if not isinstance(text, str) or not text.strip():
+            return None
+        lower = text.strip().lower()
+        value = self.exact.get(lower) or self.stems.get(stem_key(lower))
+        if value is not None:
+            return value
+        matches = self.contains(lower)
+        if matches:
+            return matches[0]
+        value = self.find_in_text(lower)
+        if value is not None or not fuzzy:
+            return value
+        return self.similar(lower)
+
+    def find_in_text(self, text):
+        """Значение, упомянутое в свободном тексте: сначала самые длинные фразы ("общие подразделения").
+
+        Словоформы находятся только для самих значений ("в облаке" -> "Облако"), псевдонимы - лишь
+        целыми словами: по основе псевдонима "общие" "в общем" и "общая текучесть" стали бы сервисом"""
+        words = _WORD.findall(text.lower())
+        stems = [stem(word) for word in words]
+        for size in range(min(self._longest_phrase, len(words)), 0, -1):
+            for start in range(len(words) - size + 1):
+                value = (self.value_stems.get(' '.join(stems[start:start + size]))
+                         or self.exact.get(' '.join(words[start:start + size])))
+                if value is not None:
+                    return value
+        return None
+
+
+class LocationIndex(ValueIndex):
+    """Индекс локаций: шаблоны LIKE остаются как есть, удаленка, Москва и Петербург - заранее
+    заданными шаблонами, остальное - через resolve"""
+
+    def __init__(self, values):
+        super().__init__(values)
+        # порядок важен: "удаленно из Москвы" - это удаленка
+        self.canonical = [(keyword, pattern) for keywords, pattern in CANONICAL_LOCATIONS for keyword in keywords]
+
+    def canonical_pattern(self, text):
+        lower = text.lower()
+        return next((pattern for keyword, pattern in self.canonical if keyword in lower), None)
+
+    def match(self, text):
+        """Значение для фильтра location_name; нераспознанный текст возвращается без изменений"""
+        if not isinstance(text, str) or '%' in text:
+            return text
+        return self.canonical_pattern(text) or self.resolve(text) or text
+
+
+# Сервисы без базы - для разбора текста, когда индекс по данным недоступен
+DEFAULT_SERVICE_INDEX = ValueIndex(SERVICE_ALIASES.values(), SERVICE_ALIASES)
+
+# Фразы вопросов и сервис, который find_in_text должен в них найти (python -m storage.value_resolver --check).
+# Прилагательные "общий" и "коммерческий" сами по себе вопрос к сервису не сводят
+SERVICE_TEXT_CASES = (
+    ('риски в общем по компании', None),
+    ('отток по возрасту в общем', None),
+    ('общая текучесть кадров за месяц', None),
+    ('общее количество сотрудников', None),
+    ('покажи общую численность', None),
+    ('коммерческие предложения по найму', None),
+    ('текучесть в облаке', 'Облако'),
+    ('численность cloud', 'Облако'),
+    ('общие подразделения: средний возраст', 'Общие подразделения'),
+    ('сотрудники в общих подразделениях', 'Общие подразделения'),
+    ('сколько людей в общие', 'Общие подразделения'),
+    ('текучесть в коммерческом департаменте', 'Коммерческий департамент'),
+    ('коммерческий: средний стаж', 'Коммерческий департамент'),
+    ('сколько уволилось из доставки', 'Доставка'),
+)
+
+
+def check_text_cases(index, cases=SERVICE_TEXT_CASES):
+    """[(фраза, ожидалось, найдено)] для фраз, где find_in_text ошибся"""
+    return [(text, expected, index.find_in_text(text)) for text, expected in cases
+            if index.find_in_text(text) != expected]
+
+
+class ResolverState:
+    """Индексы сервисов и локаций на одну версию данных"""
+
+    def __init__(self, version, services, locations):
+        self.version = version
+        self.services = ValueIndex(services, SERVICE_ALIASES)
+        self.locations = LocationIndex(locations)
+
+
+class ValueResolver:
+    """Индексы на файл базы; перестраиваются после изменения данных, как ReportingCalendar"""
+    _resolvers = {}
+    _resolvers_lock = threading.Lock()
+
+    def __init__(self, db):
+        self.db = db
+        self.calendar = ReportingCalendar.for_database(db)
+        self._state = None
+        self._load_lock = threading.Lock()
+        self.loads = 0
+
+    @classmethod
+    def for_database(cls, db):
+        key = (db.backend, os.path.abspath(db.db_path))
+        with cls._resolvers_lock:
+            resolver = cls._resolvers.get(key)
+            if resolver is None:
+                resolver = cls(db)
+                cls._resolvers[key] = resolver
+            return resolver
+
+    def _fresh(self, version):
+        state = self._state
+        return state if state is not None and version is not None and state.version == version else None
+
+    def current(self):
+        state = self._fresh(self.db.data_version())
+        if state is not None:
+            return state
+        with self._load_lock:
+            version = self.db.data_version()
+            state = self._fresh(version)
+            if state is not None:
+                return state
+            started = time.perf_counter()
+            # сервисы уже есть в календаре срезов; локации - одним DISTINCT по партициям
+            services = self.calendar.current().service_dates
+            query, params = union_partitions(
+                "SELECT DISTINCT location_name FROM hr_data_clean WHERE location_name IS NOT NULL",
+                (), self.db.partitions(), 'UNION'
+            )
+            locations = [row[0] for row in self.db.execute_rows(query, params, use_cache=False)]
+            state = ResolverState(version, services, locations)
+            self._state = state
+            self.loads += 1
+            logger.info(f"Индекс значений построен за {(time.perf_counter() - started) * 1000:.0f} мс: "
+                        f"{len(state.services.values)} сервисов, {len(state.locations.values)} локаций")
+            return state
+
+    async def current_async(self):
+        state = self._fresh(self.db.data_version())
+        if state is not None:
+            return state
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.current)
+
+    def resolve_service(self, text):
+        return self.current().services.resolve(text)
+
+    def resolve_location(self, text):
+        return self.current().locations.match(text)
+
+
+if __name__ == "__main__":
+    import argparse
+    from config import DB_PATH
+    from database import DatabaseManager
+
+    parser = argparse.ArgumentParser(description="Разрешение названий сервисов и локаций")
+    parser.add_argument('names', nargs='*')
+    parser.add_argument('--db', default=DB_PATH)
+    parser.add_argument('--column', choices=['service', 'location_name'], default='service')
+    parser.add_argument('--check', action='store_true', help="проверить поиск сервисов во фразах SERVICE_TEXT_CASES")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    state = ValueResolver.for_database(DatabaseManager(args.db)).current()
+    if args.check:
+        failures = []
+        for name, service_index in (('без базы', DEFAULT_SERVICE_INDEX), ('по базе', state.services)):
+            for text, expected, found in check_text_cases(service_index):
+                failures.append(text)
+                print(f"❌ {name}: {text!r} -> {found!r}, ожидалось {expected!r}")
+        print(f"Проверено фраз: {len(SERVICE_TEXT_CASES) * 2}, ошибок: {len(failures)}")
+        DatabaseManager.close_all()
+        sys.exit(1 if failures else 0)
+    index = state.services if args.column == 'service' else state.locations
+    for name in args.names:
+        started = time.perf_counter()
+        value = index.resolve(name) if args.column == 'service' else index.match(name)
+        print(f"{name!r} -> {value!r} за {(time.perf_counter() - started) * 1e6:.0f} мкс")
+    DatabaseManager.close_all()
@@ -10,6 +10,12 @@ import sys
 import os
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 from menu.advanced_core import AdvancedHRAnalyzer
+from menu.report_executor import ReportExecutor
+from menu.chart_renderer import ChartRenderer
+from menu.lazy_plots import LazyPlotRenderer
+from menu.chart_cache import ChartCache
+from storage.schema import SchemaManager
+from storage.aggregates import AggregateStore
 from config import DB_PATH, BOT_TOKEN
 from ai_assistant import AIAssistant
 from menu.core_handlers import *
@@ -21,13 +27,16 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-SELECT_ACTION, SELECT_DETAILED, SELECT_HIRING_SERVICE, AI_ASSISTANT = range(4)
-
 class HRTelegramBot:
     def __init__(self):
+        SchemaManager(DB_PATH).migrate()
+        AggregateStore(DB_PATH).refresh()
         self.analyzer = AdvancedHRAnalyzer(DB_PATH)
+        self.executor = ReportExecutor()
+        self.chart_renderer = ChartRenderer()
+        self.plots = LazyPlotRenderer(self.chart_renderer, cache=ChartCache.for_database(self.analyzer.repo.db))
         self.ai_assistant = AIAssistant(DB_PATH)
-        self.application = Application.builder().token(BOT_TOKEN).build()
+        self.application = Application.builder().token(BOT_TOKEN).post_init(self.post_init).build()
         self.menu_commands = [
             "📈 Динамика компании", "👥 Демография", "🌐 Анализ сервисов", 
             "⚠️  Оценка рисков", "🎯 Рекомендации по найму", "🔍 Детальный анализ",
@@ -40,9 +49,14 @@ class HRTelegramBot:
             show_main_menu_func=self.show_main_menu,
             select_detailed_const=SELECT_DETAILED,
             select_hiring_const=SELECT_HIRING_SERVICE,
-            end_const=ConversationHandler.END
+            end_const=ConversationHandler.END,
+            executor=self.executor
         )
         
+    async def post_init(self, application: Application):
+        await self.ai_assistant.warm_up()
+        await self.chart_renderer.start()
+
     async def start(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         context.user_data.clear()
         return await self.show_main_menu(update, MAIN_MENU_TEXT)
@@ -59,7 +73,7 @@ class HRTelegramBot:
 
     async def get_all_services(self):
         try:
-            return self.analyzer.get_all_services()
+            return await self.executor.run_query(self.analyzer.get_all_services)
         except Exception as e:
             logger.error(f"Ошибка при получении списка сервисов: {e}")
             return ["Такси", "Маркет", "Крауд", "Лавка", "Финтех", "Еда", "Доставка", "Облако"]
@@ -69,6 +83,7 @@ class HRTelegramBot:
         await query.answer()
         
         if query.data == 'back_to_menu':
+            self.plots.cancel(update.effective_user.id)
             context.user_data.clear()
             try:
                 await query.message.delete()
@@ -108,11 +123,11 @@ class HRTelegramBot:
             return SELECT_ACTION
     
         elif query.data.startswith('service_'):
-            return await handle_callback_service_selection(query, context, self.analyzer, SELECT_ACTION)
+            return await handle_callback_service_selection(query, context, self.analyzer, self.executor, SELECT_ACTION)
         
         elif query.data.startswith('graphs_'):
             await query.message.delete()
-            return await send_graphs(query, context)
+            return await send_graphs(query, context, self.plots)
         
         elif query.data == 'choose_another':
             current_analysis_type = context.user_data.get('last_analysis_type')
@@ -132,6 +147,8 @@ class HRTelegramBot:
 
     async def handle_action(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         user_text = update.message.text
+        # пользователь ушел из отчета: графики, если понадобятся, построятся по кнопке
+        self.plots.cancel(update.effective_user.id)
         
         # Обработка команды возврата в меню - ДОБАВЛЕНА КНОПКА "◀️ В меню"
         if user_text in ["◀️ Главное меню", "/menu", "меню", "◀️ В меню"]:
@@ -146,21 +163,25 @@ class HRTelegramBot:
                     await show_typing(update)
                     
                     result = None
-                    plot_path = None
                     
+                    # Данные отчета считаются в потоке; графики - только описание, рендерятся они
+                    # в отдельном процессе в фоне или по кнопке "Показать графики"
                     if user_text == "📈 Динамика компании":
-                        result, plot_path = self.analyzer.company_dynamics()
+                        result, spec = await self.executor.run_query(self.analyzer.company_dynamics, False)
                     elif user_text == "👥 Демография":
-                        result, plot_path = self.analyzer.demographic_dashboard()
+                        result, spec = await self.executor.run_query(self.analyzer.demographic_dashboard, False)
                     elif user_text == "🌐 Анализ сервисов":
-                        result, plot_path = self.analyzer.service_analysis()
+                        result, spec = await self.executor.run_query(self.analyzer.service_analysis, False)
                     
                     if result is None:
                         await update.message.reply_text("❌ Не удалось получить данные для анализа")
                         return await self.show_main_menu(update)
                     
-                    context.user_data['plot_path'] = plot_path
-                    context.user_data['last_analysis_type'] = user_text.lower().replace(' ', '_')
+                    analysis_type = user_text.lower().replace(' ', '_')
+                    plot_key = (update.effective_user.id, analysis_type)
+                    context.user_data['plot_key'] = plot_key
+                    context.user_data['plot_spec'] = spec
+                    context.user_data['last_analysis_type'] = analysis_type
                     
                     await send_analysis_result(update, result, None, loading_message_id)
                     
@@ -169,6 +190,7 @@ class HRTelegramBot:
                         "Хотите увидеть графики?",
                         reply_markup=graphs_keyboard
                     )
+                    self.plots.prefetch(plot_key, spec)
                     
                     return SELECT_ACTION
                 
@@ -191,7 +213,7 @@ class HRTelegramBot:
                     await show_typing(update)
                     
                     if user_text == "⚠️  Оценка рисков":
-                        result, plot_path = self.analyzer.risk_assessment()
+                        result, plot_path = await self.executor.run_query(self.analyzer.risk_assessment)
                         if result is None:
                             await update.message.reply_text("❌ Не удалось оценить риски")
                             return await self.show_main_menu(update)
@@ -200,7 +222,7 @@ class HRTelegramBot:
                         return await self.show_main_menu(update, NEXT_ACTION_TEXT)
                         
                     elif user_text == "🎯 Рекомендации по найму":
-                        result, hiring_data = self.analyzer.hiring_recommendations()
+                        result, hiring_data = await self.executor.run_query(self.analyzer.hiring_recommendations)
                         
                         if hiring_data is None or not hiring_data:
                             await send_analysis_result(update, "❌ Нет данных для рекомендаций по найму", None, loading_message_id)
@@ -338,7 +360,11 @@ class HRTelegramBot:
         self.application.add_handler(conv_handler)
         
         logger.info("HR бот c Эйчариком запущен 💡")
-        self.application.run_polling()
+        try:
+            self.application.run_polling()
+        finally:
+            self.executor.shutdown()
+            self.chart_renderer.shutdown()
 
 if __name__ == "__main__":
     bot = HRTelegramBot()